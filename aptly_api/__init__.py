@@ -8,13 +8,25 @@
 # explicit exports for mypy
 from aptly_api.client import Client as Client
 from aptly_api.base import AptlyAPIException as AptlyAPIException
-from aptly_api.parts.packages import Package as Package
+from aptly_api.parts.packages import Package as Package, PackageLookup as PackageLookup, PackageKey as PackageKey
+from aptly_api.parts.files import UploadError as UploadError
 from aptly_api.parts.publish import PublishEndpoint as PublishEndpoint
 from aptly_api.parts.repos import Repo as Repo, FileReport as FileReport
 from aptly_api.parts.snapshots import Snapshot as Snapshot
+from aptly_api.retry import RetryPolicy as RetryPolicy
+from aptly_api.cache import ResponseCache as ResponseCache, SnapshotPackageCache as SnapshotPackageCache
+from aptly_api.store import PackageStore as PackageStore
+from aptly_api.index import PackageIndex as PackageIndex
+from aptly_api.diff import DiffSummary as DiffSummary
+from aptly_api.transfer import TransferMeter as TransferMeter, UploadProgress as UploadProgress, \
+    FileTiming as FileTiming, RateLimiter as RateLimiter
+from aptly_api.instrumentation import RequestInstrumentation as RequestInstrumentation, \
+    RequestRecord as RequestRecord, EndpointStats as EndpointStats
 
 version = "0.3.0"
 
 
-__all__ = ['Client', 'AptlyAPIException', 'version', 'Package', 'PublishEndpoint', 'Repo', 'FileReport',
-           'Snapshot']
+__all__ = ['Client', 'AptlyAPIException', 'version', 'Package', 'PackageLookup', 'PackageKey', 'PublishEndpoint',
+           'Repo', 'FileReport', 'UploadError', 'Snapshot', 'RetryPolicy', 'RequestInstrumentation', 'RequestRecord',
+           'EndpointStats', 'ResponseCache', 'SnapshotPackageCache', 'PackageStore', 'PackageIndex', 'DiffSummary',
+           'TransferMeter', 'UploadProgress', 'FileTiming', 'RateLimiter']
@@ -0,0 +1,14 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# The asyncio client requires the optional "httpx" dependency (pip install aptly-api-client[async]), so it's not
+# imported from aptly_api itself.
+
+# explicit exports for mypy
+from aptly_api.aio.client import AsyncClient as AsyncClient
+
+
+__all__ = ['AsyncClient']
@@ -0,0 +1,265 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import asyncio
+import functools
+import os
+import ssl
+import time
+from typing import Optional, Union, Tuple, Dict, Any, Sequence, List, BinaryIO, AsyncIterator, AsyncIterable, \
+    Callable, TypeVar, cast
+from urllib.parse import urljoin
+
+import httpx
+
+from aptly_api.base import AptlyAPIException, STREAM_CHUNK_SIZE, _rewind_body
+from aptly_api.cache import ResponseCache
+from aptly_api.instrumentation import RequestInstrumentation, RequestRecord, url_template
+from aptly_api.jsonutil import JSONArrayParser, JSONDecoder, default_json_decoder
+from aptly_api.retry import RetryPolicy
+from aptly_api.store import PackageStore
+from aptly_api.transfer import RateLimiter
+
+
+_transport_errors = (httpx.TransportError,)
+
+T_Auth = Union[Tuple[str, str], httpx.Auth, None]
+T = TypeVar("T")
+
+
+def make_ssl_context(ssl_verify: Union[str, bool, None] = None,
+                     ssl_cert: Optional[Tuple[str, str]] = None) -> Union[ssl.SSLContext, bool]:
+    """
+    Translates the ``requests`` style ``ssl_verify`` (a CA bundle file or directory, or a bool) and ``ssl_cert``
+    (client certificate and key file) arguments into httpx's ``verify``. httpx deprecated passing paths and
+    client certificates directly, so these are loaded into an ``ssl.SSLContext``.
+    """
+    if ssl_cert is None and not isinstance(ssl_verify, str):
+        return ssl_verify if ssl_verify is not None else True
+    if isinstance(ssl_verify, str):
+        if os.path.isdir(ssl_verify):
+            context = ssl.create_default_context(capath=ssl_verify)
+        else:
+            context = ssl.create_default_context(cafile=ssl_verify)
+    elif ssl_verify is False:
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    else:
+        # httpx's default trust store
+        context = httpx.create_ssl_context()
+    if ssl_cert is not None:
+        context.load_cert_chain(*ssl_cert)
+    return context
+
+
+def make_async_client(ssl_verify: Union[str, bool, None] = None, ssl_cert: Optional[Tuple[str, str]] = None,
+                      http_auth: T_Auth = None, timeout: int = 60, pool_size: int = 10) -> httpx.AsyncClient:
+    """
+    Create a ``httpx.AsyncClient`` whose connection pool keeps up to ``pool_size`` keep-alive connections.
+    ``AsyncClient`` shares one such client between all of its API sections.
+    """
+    return httpx.AsyncClient(
+        verify=make_ssl_context(ssl_verify, ssl_cert),
+        auth=http_auth,
+        timeout=timeout,
+        limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+    )
+
+
+async def in_thread(func: Callable[..., T], *args: Any) -> T:
+    """
+    Runs the blocking ``func``, e.g. reading and hashing local package files, in the event loop's default executor,
+    so other coroutines keep running meanwhile.
+    """
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args))
+
+
+class AsyncReader:
+    """
+    Adapts a seekable, readable request body like ``MultipartEncoder`` for httpx, which only streams async
+    iterables from an ``AsyncClient``. Every iteration starts from the beginning, so retries resend the whole body.
+    If a ``rate_limiter`` is given, it throttles the iteration without blocking the event loop.
+    """
+    def __init__(self, body: Any, chunk_size: int = STREAM_CHUNK_SIZE,
+                 rate_limiter: Optional[RateLimiter] = None) -> None:
+        self.body = body
+        self.chunk_size = chunk_size
+        self.rate_limiter = rate_limiter
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        self.body.seek(0)
+        while True:
+            chunk = self.body.read(self.chunk_size)
+            if not chunk:
+                return
+            if self.rate_limiter is not None:
+                delay = self.rate_limiter.reserve(len(chunk))
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield chunk
+
+
+class AsyncBaseAPIClient:
+    def __init__(self, base_url: str, ssl_verify: Union[str, bool, None] = None,
+                 ssl_cert: Optional[Tuple[str, str]] = None, http_auth: T_Auth = None,
+                 timeout: int = 60, http_client: Optional[httpx.AsyncClient] = None,
+                 retry: Optional[RetryPolicy] = None,
+                 instrumentation: Optional[RequestInstrumentation] = None,
+                 cache: Optional[ResponseCache] = None,
+                 package_store: Optional[PackageStore] = None,
+                 json_decoder: Optional[JSONDecoder] = None) -> None:
+        self.base_url = base_url
+        self.exc_class = AptlyAPIException
+        self.timeout = timeout
+        # unlike requests, httpx only supports TLS and auth settings on the client, not per request
+        self.http_client = http_client if http_client is not None else make_async_client(
+            ssl_verify=ssl_verify, ssl_cert=ssl_cert, http_auth=http_auth, timeout=timeout,
+        )
+        self.retry = retry
+        self.instrumentation = instrumentation
+        self.cache = cache
+        self.package_store = package_store
+        self.json_decoder = json_decoder if json_decoder is not None else default_json_decoder()
+
+    def decode_json(self, resp: httpx.Response) -> Any:
+        """
+        Decodes the JSON body of ``resp`` with ``json_decoder``, straight from the response bytes.
+        """
+        return self.json_decoder(resp.content)
+
+    def _error_from_response(self, resp: httpx.Response) -> str:
+        if resp.status_code == 200:
+            return "no error (status 200)"
+
+        try:
+            rcnt = self.decode_json(resp)
+        except ValueError:
+            return "%s %s %s" % (resp.status_code, resp.reason_phrase, resp.text,)
+
+        if isinstance(rcnt, dict):
+            content = rcnt
+        else:
+            content = rcnt[0]
+
+        ret = "%s - %s -" % (resp.status_code, resp.reason_phrase)
+        if "error" in content:
+            ret = "%s %s" % (ret, content["error"],)
+        if "meta" in content:
+            ret = "%s (%s)" % (ret, content["meta"],)
+        return ret
+
+    def _make_url(self, path: str) -> str:
+        return urljoin(self.base_url, path)
+
+    async def _request(self, method: str, urlpath: str, stream: bool = False, **kwargs: Any) -> httpx.Response:
+        start = time.perf_counter()
+        attempt = 1
+        resp = None  # type: Optional[httpx.Response]
+        time_to_first_byte = None  # type: Optional[float]
+        error = None  # type: Optional[Exception]
+        try:
+            while True:
+                resp = None
+                try:
+                    attempt_start = time.perf_counter()
+                    # always stream, so the time to the first byte can be measured before reading the body
+                    resp = await self.http_client.send(
+                        self.http_client.build_request(method, self._make_url(urlpath), **kwargs), stream=True,
+                    )
+                    time_to_first_byte = time.perf_counter() - attempt_start
+                    if not stream or not 200 <= resp.status_code < 300:
+                        await resp.aread()
+                except Exception as e:
+                    if self.retry is None or not self.retry.allows(method, attempt) or \
+                            not self.retry.retries_exception(e, _transport_errors):
+                        raise
+                    await asyncio.sleep(self.retry.delay(attempt))
+                else:
+                    if 200 <= resp.status_code < 300:
+                        return resp
+
+                    if self.retry is None or not self.retry.allows(method, attempt) or \
+                            not self.retry.retries_status(resp.status_code):
+                        raise AptlyAPIException(self._error_from_response(resp), status_code=resp.status_code)
+                    await asyncio.sleep(self.retry.delay(attempt, resp.headers.get("Retry-After")))
+
+                _rewind_body(kwargs)
+                attempt += 1
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if self.cache is not None and method != "GET":
+                self.cache.invalidate(urlpath)
+            if self.instrumentation is not None:
+                self._record_request(method, urlpath, start, attempt, resp, time_to_first_byte, error, stream)
+
+    def _record_request(self, method: str, urlpath: str, start: float, attempts: int,
+                        resp: Optional[httpx.Response], time_to_first_byte: Optional[float],
+                        error: Optional[Exception], stream: bool) -> None:
+        status_code = request_bytes = response_bytes = None
+        if resp is not None:
+            status_code = resp.status_code
+            if "Content-Length" in resp.request.headers:
+                request_bytes = int(resp.request.headers["Content-Length"])
+            if stream:
+                if "Content-Length" in resp.headers:
+                    response_bytes = int(resp.headers["Content-Length"])
+            else:
+                response_bytes = len(resp.content)
+        else:
+            time_to_first_byte = None
+
+        cast(RequestInstrumentation, self.instrumentation).record(RequestRecord(
+            method=method,
+            url_template=url_template(urlpath),
+            url=self._make_url(urlpath),
+            status_code=status_code,
+            duration=time.perf_counter() - start,
+            time_to_first_byte=time_to_first_byte,
+            request_bytes=request_bytes,
+            response_bytes=response_bytes,
+            retries=attempts - 1,
+            error=None if error is None else "%s: %s" % (error.__class__.__name__, error),
+        ))
+
+    async def do_get(self, urlpath: str, params: Optional[Dict[str, str]] = None,
+                     stream: bool = False) -> httpx.Response:
+        if self.cache is None or stream:
+            return await self._request("GET", urlpath, params=params, stream=stream)
+
+        cached = self.cache.get(urlpath, params)
+        if cached is not None:
+            return cast(httpx.Response, cached)
+        resp = await self._request("GET", urlpath, params=params)
+        self.cache.put(urlpath, params, resp)
+        return resp
+
+    async def do_get_json_stream(self, urlpath: str, params: Optional[Dict[str, str]] = None) -> AsyncIterator[Any]:
+        resp = await self.do_get(urlpath, params=params, stream=True)
+        try:
+            parser = JSONArrayParser(self.json_decoder)
+            async for chunk in resp.aiter_bytes(STREAM_CHUNK_SIZE):
+                for item in parser.feed(chunk):
+                    yield item
+            parser.close()
+        finally:
+            await resp.aclose()
+
+    async def do_post(self, urlpath: str, content: Union[bytes, AsyncIterable[bytes], None] = None,
+                      params: Optional[Dict[str, str]] = None,
+                      files: Optional[Sequence[Tuple[str, BinaryIO]]] = None,
+                      json: Any = None, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        return await self._request("POST", urlpath, content=content, params=params, files=files, json=json,
+                                   headers=headers)
+
+    async def do_put(self, urlpath: str, content: Optional[bytes] = None, json: Any = None) -> httpx.Response:
+        return await self._request("PUT", urlpath, content=content, json=json)
+
+    async def do_delete(self, urlpath: str, params: Optional[Dict[str, str]] = None,
+                        json: Union[List[Dict[str, Any]], Dict[str, Any], None] = None) -> httpx.Response:
+        # httpx.AsyncClient.delete() doesn't accept a body, but aptly's package deletion API requires one
+        return await self._request("DELETE", urlpath, params=params, json=json)
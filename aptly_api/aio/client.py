@@ -0,0 +1,94 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+from typing import Union, Optional, Tuple, Dict, Any  # noqa: F401
+
+from aptly_api.aio.base import make_async_client, T_Auth
+from aptly_api.aio.parts.files import AsyncFilesAPISection
+from aptly_api.aio.parts.misc import AsyncMiscAPISection
+from aptly_api.aio.parts.mirrors import AsyncMirrorsAPISection
+from aptly_api.aio.parts.packages import AsyncPackageAPISection
+from aptly_api.aio.parts.publish import AsyncPublishAPISection
+from aptly_api.aio.parts.repos import AsyncReposAPISection
+from aptly_api.aio.parts.snapshots import AsyncSnapshotAPISection
+from aptly_api.cache import ResponseCache, SnapshotPackageCache
+from aptly_api.jsonutil import JSONDecoder, default_json_decoder
+from aptly_api.instrumentation import RequestInstrumentation, EndpointStats
+from aptly_api.retry import RetryPolicy
+from aptly_api.store import PackageStore
+from aptly_api.transfer import RateLimiter
+
+
+class AsyncClient:
+    """
+    The asyncio counterpart of ``aptly_api.Client``. It exposes the same API sections and methods, all of which
+    are coroutines. Use it as an async context manager or call ``aclose()`` to release the connection pool.
+
+    Example:
+
+    .. code-block:: python
+        async with AsyncClient("http://aptly-endpoint.test/") as aptly:
+            repos = await aptly.repos.list()
+    """
+    def __init__(self, aptly_server_url: str, ssl_verify: Union[str, bool, None] = None,
+                 ssl_cert: Optional[Tuple[str, str]] = None, http_auth: T_Auth = None,
+                 timeout: int = 60, pool_size: int = 10, retry: Optional[RetryPolicy] = None,
+                 instrumentation: Optional[RequestInstrumentation] = None,
+                 cache: Optional[ResponseCache] = None,
+                 snapshot_cache: Optional[SnapshotPackageCache] = None,
+                 package_store: Optional[PackageStore] = None,
+                 upload_rate_limit: Optional[float] = None,
+                 json_decoder: Optional[JSONDecoder] = None) -> None:
+        self.__aptly_server_url = aptly_server_url
+        # all API sections share one keep-alive connection pool
+        self.http_client = make_async_client(ssl_verify=ssl_verify, ssl_cert=ssl_cert, http_auth=http_auth,
+                                             timeout=timeout, pool_size=pool_size)
+
+        self.cache = cache
+        # one token bucket for all uploads, so parallel uploads share the bandwidth instead of multiplying it
+        self.upload_rate_limiter = RateLimiter(upload_rate_limit) if upload_rate_limit is not None else None
+        self.instrumentation = instrumentation if instrumentation is not None else RequestInstrumentation()
+
+        section_args = {
+            "base_url": self.__aptly_server_url,
+            "timeout": timeout,
+            "http_client": self.http_client,
+            "retry": retry,
+            "instrumentation": self.instrumentation,
+            # opt-in read-through cache for GET requests, shared by all sections so mutations invalidate it
+            "cache": cache,
+            "package_store": package_store,
+            # decodes response bodies, orjson if it's installed and the standard library otherwise
+            "json_decoder": json_decoder if json_decoder is not None else default_json_decoder(),
+        }  # type: Dict[str, Any]
+        self.files = AsyncFilesAPISection(rate_limiter=self.upload_rate_limiter, **section_args)
+        self.misc = AsyncMiscAPISection(**section_args)
+        self.packages = AsyncPackageAPISection(**section_args)
+        self.publish = AsyncPublishAPISection(**section_args)
+        self.repos = AsyncReposAPISection(**section_args)
+        self.snapshots = AsyncSnapshotAPISection(package_cache=snapshot_cache, **section_args)
+        self.mirrors = AsyncMirrorsAPISection(**section_args)
+
+    def stats(self) -> Dict[str, EndpointStats]:
+        """
+        :return: per-endpoint request counts and latency percentiles, see ``RequestInstrumentation.stats()``
+        """
+        return self.instrumentation.stats()
+
+    @property
+    def aptly_server_url(self) -> str:
+        return self.__aptly_server_url
+
+    async def aclose(self) -> None:
+        await self.http_client.aclose()
+
+    async def __aenter__(self) -> "AsyncClient":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.aclose()
+
+    def __repr__(self) -> str:
+        return "AsyncClient (Aptly API Client) <%s>" % self.aptly_server_url
@@ -0,0 +1,122 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import asyncio
+import itertools
+from typing import Sequence, List, Tuple, cast, Optional, Iterable, Iterator, Set, Any  # noqa: F401
+from urllib.parse import quote
+
+from aptly_api.aio.base import AsyncBaseAPIClient, AsyncReader, _transport_errors, in_thread
+from aptly_api.aio.parts.packages import fetch_package_list
+from aptly_api.base import AptlyAPIException
+from aptly_api.multipart import MultipartEncoder, UploadFile, upload_name
+from aptly_api.parts.files import balanced_batches, check_readable, merge_batch_results, chunked, find_files, \
+    without_existing, expect_files, transport_failure
+from aptly_api.parts.packages import Package  # noqa: F401
+from aptly_api.transfer import TransferMeter, RateLimiter
+
+
+class AsyncFilesAPISection(AsyncBaseAPIClient):
+    def __init__(self, *args: Any, rate_limiter: Optional[RateLimiter] = None, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # throttles all uploads of this section, Client shares one limiter between all uploads
+        self.rate_limiter = rate_limiter
+
+    async def list(self, directory: Optional[str] = None) -> Sequence[str]:
+        if directory is None:
+            resp = await self.do_get("api/files")
+        else:
+            resp = await self.do_get("api/files/%s" % directory)
+
+        return cast(List[str], self.decode_json(resp))
+
+    async def _upload(self, destination: str, files: Sequence[UploadFile],
+                      meter: Optional[TransferMeter] = None) -> List[str]:
+        body = MultipartEncoder([(upload_name(f), f) for f in files], meter=meter)
+        headers = {"Content-Type": body.content_type}
+        if body.length is not None:
+            # httpx uses chunked transfer encoding for async iterables unless the length is set
+            headers["Content-Length"] = str(body.length)
+        try:
+            resp = await self.do_post("api/files/%s" % destination,
+                                      content=AsyncReader(body, rate_limiter=self.rate_limiter), headers=headers)
+        finally:
+            body.close()
+
+        return cast(List[str], self.decode_json(resp))
+
+    async def _upload_batch(self, destination: str, batch: Sequence[UploadFile],
+                            meter: Optional[TransferMeter] = None) -> Tuple[List[str], Optional[AptlyAPIException]]:
+        try:
+            return await self._upload(destination, batch, meter), None
+        except AptlyAPIException as e:
+            return [], e
+        except _transport_errors as e:
+            return [], transport_failure(e)
+
+    async def _without_existing(self, destination: str, files: Iterable[UploadFile], skip_existing: bool,
+                                skip_in_repo: Optional[str]) -> Iterator[UploadFile]:
+        remote_files = None  # type: Optional[Sequence[str]]
+        if skip_existing:
+            try:
+                remote_files = await self.list(destination)
+            except AptlyAPIException as e:
+                if e.status_code != 404:
+                    raise
+        repo_packages = None  # type: Optional[Sequence[Package]]
+        if skip_in_repo is not None:
+            repo_packages = await fetch_package_list(self, "api/repos/%s/packages" % quote(skip_in_repo),
+                                                     {"format": "details"})
+        # lazy, the files are only read and hashed as the result is consumed, which has to be done in_thread()
+        return without_existing(files, remote_files, repo_packages)
+
+    async def upload(self, destination: str, *files: UploadFile, concurrency: int = 1, skip_existing: bool = False,
+                     skip_in_repo: Optional[str] = None, meter: Optional[TransferMeter] = None) -> Sequence[str]:
+        check_readable(files)
+        if skip_existing or skip_in_repo is not None:
+            files = await in_thread(tuple, await self._without_existing(destination, files, skip_existing,
+                                                                        skip_in_repo))
+            if not files:
+                return []
+        if meter is not None:
+            expect_files(meter, files)
+        if concurrency <= 1:
+            return await self._upload(destination, files, meter)
+
+        batches = balanced_batches(files, concurrency)
+        results = await asyncio.gather(*(self._upload_batch(destination, batch, meter) for batch in batches))
+        return merge_batch_results(batches, results)
+
+    async def upload_directory(self, destination: str, path: str, pattern: Optional[str] = "*.deb",
+                               max_open: int = 1, batch_size: int = 100, skip_existing: bool = False,
+                               skip_in_repo: Optional[str] = None,
+                               meter: Optional[TransferMeter] = None) -> Sequence[str]:
+        files = find_files(path, pattern)  # type: Iterable[UploadFile]
+        if skip_existing or skip_in_repo is not None:
+            files = await self._without_existing(destination, files, skip_existing, skip_in_repo)
+        # walking the directory and checking for existing files blocks, so batches are produced in_thread()
+        batches = iter(chunked(files, batch_size))  # type: Iterator[List[UploadFile]]
+        if meter is not None:
+            batch_list = await in_thread(list, batches)  # type: List[List[UploadFile]]
+            expect_files(meter, itertools.chain(*batch_list))
+            batches = iter(batch_list)
+        workers = max(1, max_open)
+        tasks = []  # type: List[asyncio.Task[Tuple[List[str], Optional[AptlyAPIException]]]]
+        sent = []  # type: List[List[UploadFile]]
+        running = set()  # type: Set[asyncio.Task[Tuple[List[str], Optional[AptlyAPIException]]]]
+        while True:
+            batch = await in_thread(next, batches, None)
+            if batch is None:
+                break
+            if len(running) >= workers:
+                _, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            task = asyncio.ensure_future(self._upload_batch(destination, batch, meter))
+            running.add(task)
+            tasks.append(task)
+            sent.append(batch)
+        return merge_batch_results(sent, await asyncio.gather(*tasks))
+
+    async def delete(self, path: Optional[str] = None) -> None:
+        await self.do_delete("api/files/%s" % path)
@@ -0,0 +1,129 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+from typing import Sequence, Optional, List, AsyncIterator
+from urllib.parse import quote
+
+from aptly_api.aio.base import AsyncBaseAPIClient
+from aptly_api.aio.parts.packages import fetch_package_list
+from aptly_api.parts.mirrors import Mirror, MirrorsAPISection, T_BodyDict  # noqa: F401
+from aptly_api.parts.packages import Package, PackageAPISection
+
+
+class AsyncMirrorsAPISection(AsyncBaseAPIClient):
+    async def list(self) -> Sequence[Mirror]:
+        resp = await self.do_get("api/mirrors")
+
+        mirrors = []
+        for mirr in self.decode_json(resp):
+            mirrors.append(MirrorsAPISection.mirror_from_response(mirr))
+        return mirrors
+
+    async def update(self, name: str, ignore_signatures: bool = False) -> None:
+        body = {}
+        if ignore_signatures:
+            body["IgnoreSignatures"] = ignore_signatures
+        await self.do_put("api/mirrors/%s" % (quote(name)), json=body)
+
+    async def edit(self, name: str, newname: Optional[str] = None, archiveurl: Optional[str] = None,
+                   filter: Optional[str] = None, architectures: Optional[List[str]] = None,
+                   components: Optional[List[str]] = None, keyrings: Optional[List[str]] = None,
+                   filter_with_deps: bool = False, skip_existing_packages: bool = False,
+                   download_sources: bool = False, download_udebs: bool = False,
+                   skip_component_check: bool = False, ignore_checksums: bool = False,
+                   ignore_signatures: bool = False, force_update: bool = False) -> None:
+
+        body = {}  # type: T_BodyDict
+        if newname:
+            body["Name"] = newname
+        if archiveurl:
+            body["ArchiveURL"] = archiveurl
+        if filter:
+            body["Filter"] = filter
+        if architectures:
+            body["Architectures"] = architectures
+        if components:
+            body["Components"] = components
+        if keyrings:
+            body["Keyrings"] = keyrings
+        if filter_with_deps:
+            body["FilterWithDeps"] = filter_with_deps
+        if download_sources:
+            body["DownloadSources"] = download_sources
+        if download_udebs:
+            body["DownloadUdebs"] = download_udebs
+        if skip_component_check:
+            body["SkipComponentCheck"] = skip_component_check
+        if ignore_checksums:
+            body["IgnoreChecksums"] = ignore_checksums
+        if ignore_signatures:
+            body["IgnoreSignatures"] = ignore_signatures
+        if skip_existing_packages:
+            body["SkipExistingPackages"] = skip_existing_packages
+        if force_update:
+            body["ForceUpdate"] = force_update
+
+        await self.do_put("api/mirrors/%s" % (quote(name)), json=body)
+
+    async def show(self, name: str) -> Mirror:
+        resp = await self.do_get("api/mirrors/%s" % (quote(name)))
+        return MirrorsAPISection.mirror_from_response(self.decode_json(resp))
+
+    async def list_packages(self, name: str, query: Optional[str] = None, with_deps: bool = False,
+                            detailed: bool = False, fields: Optional[Sequence[str]] = None,
+                            lazy: bool = False) -> Sequence[Package]:
+        params = MirrorsAPISection._list_params(query, with_deps, detailed or fields is not None or lazy)
+        return await fetch_package_list(self, "api/mirrors/%s/packages" % quote(name), params,
+                                        fields=fields, lazy=lazy)
+
+    async def iter_packages(self, name: str, query: Optional[str] = None, with_deps: bool = False,
+                            detailed: bool = False, fields: Optional[Sequence[str]] = None) -> AsyncIterator[Package]:
+        params = MirrorsAPISection._list_params(query, with_deps, detailed or fields is not None)
+        async for rpkg in self.do_get_json_stream("api/mirrors/%s/packages" % quote(name), params=params):
+            yield PackageAPISection.package_from_response(rpkg, fields)
+
+    async def delete(self, name: str) -> None:
+        await self.do_delete("api/mirrors/%s" % quote(name))
+
+    async def create(self, name: str, archiveurl: str, distribution: Optional[str] = None,
+                     filter: Optional[str] = None, components: Optional[List[str]] = None,
+                     architectures: Optional[List[str]] = None, keyrings: Optional[List[str]] = None,
+                     download_sources: bool = False, download_udebs: bool = False,
+                     download_installer: bool = False, filter_with_deps: bool = False,
+                     skip_component_check: bool = False, skip_architecture_check: bool = False,
+                     ignore_signatures: bool = False) -> Mirror:
+        data = {
+            "Name": name,
+            "ArchiveURL": archiveurl
+        }  # type: T_BodyDict
+
+        if distribution:
+            data["Distribution"] = distribution
+        if filter:
+            data["Filter"] = filter
+        if components:
+            data["Components"] = components
+        if architectures:
+            data["Architectures"] = architectures
+        if keyrings:
+            data["Keyrings"] = keyrings
+        if download_sources:
+            data["DownloadSources"] = download_sources
+        if download_udebs:
+            data["DownloadUdebs"] = download_udebs
+        if download_installer:
+            data["DownloadInstaller"] = download_installer
+        if filter_with_deps:
+            data["FilterWithDeps"] = filter_with_deps
+        if skip_component_check:
+            data["SkipComponentCheck"] = skip_component_check
+        if skip_architecture_check:
+            data["SkipArchitectureCheck"] = skip_architecture_check
+        if ignore_signatures:
+            data["IgnoreSignatures"] = ignore_signatures
+
+        resp = await self.do_post("api/mirrors", json=data)
+
+        return MirrorsAPISection.mirror_from_response(self.decode_json(resp))
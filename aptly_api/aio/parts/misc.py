@@ -0,0 +1,22 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+from typing import cast
+
+from aptly_api.aio.base import AsyncBaseAPIClient
+from aptly_api.base import AptlyAPIException
+
+
+class AsyncMiscAPISection(AsyncBaseAPIClient):
+    async def graph(self, ext: str, layout: str = "horizontal") -> None:
+        raise NotImplementedError("The Graph API is not yet supported")
+
+    async def version(self) -> str:
+        resp = await self.do_get("api/version")
+        rcnt = self.decode_json(resp)
+        if "Version" in rcnt:
+            return cast(str, rcnt["Version"])
+        else:
+            raise AptlyAPIException("Aptly server didn't return a valid response object:\n%s" % resp.text)
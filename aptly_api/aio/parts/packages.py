@@ -0,0 +1,79 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import asyncio
+from typing import Dict, List, Optional, Iterable, Sequence
+from urllib.parse import quote
+
+from aptly_api.aio.base import AsyncBaseAPIClient
+from aptly_api.base import AptlyAPIException
+from aptly_api.parts.packages import Package, PackageAPISection, PackageLookup, packages_from_listing
+
+
+class AsyncPackageAPISection(AsyncBaseAPIClient):
+    async def show(self, key: str) -> Package:
+        if self.package_store is not None:
+            fields = self.package_store.get(key)
+            if fields is not None:
+                return PackageAPISection.package_from_response(fields)
+
+        pkg = await self._fetch(key)
+        if self.package_store is not None and pkg.fields is not None:
+            self.package_store.put(pkg.key, pkg.fields)
+        return pkg
+
+    async def _fetch(self, key: str) -> Package:
+        resp = await self.do_get("api/packages/%s" % quote(key))
+        return PackageAPISection.package_from_response(self.decode_json(resp))
+
+    async def show_many(self, keys: Iterable[str], concurrency: int = 10) -> PackageLookup:
+        unique = list(dict.fromkeys(keys))
+        found = {}  # type: Dict[str, Package]
+        if self.package_store is not None:
+            for key, fields in self.package_store.get_many(unique).items():
+                found[key] = PackageAPISection.package_from_response(fields)
+
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def lookup(key: str) -> Optional[Package]:
+            async with semaphore:
+                try:
+                    return await self._fetch(key)
+                except AptlyAPIException as e:
+                    if e.status_code == 404:
+                        return None
+                    raise
+
+        pending = [key for key in unique if key not in found]
+        for key, pkg in zip(pending, await asyncio.gather(*(lookup(key) for key in pending))):
+            if pkg is not None:
+                found[key] = pkg
+        if self.package_store is not None and pending:
+            # stored in one transaction instead of one per package
+            self.package_store.put_many((pkg.key, pkg.fields) for pkg in (found.get(key) for key in pending)
+                                        if pkg is not None and pkg.fields is not None)
+
+        return PackageLookup(
+            packages=[found[key] for key in unique if key in found],
+            missing=[key for key in unique if key not in found],
+        )
+
+
+async def fetch_package_list(section: AsyncBaseAPIClient, urlpath: str, params: Dict[str, str],
+                             fields: Optional[Sequence[str]] = None, lazy: bool = False) -> List[Package]:
+    """
+    The coroutine counterpart of ``aptly_api.parts.packages.fetch_package_list``.
+    """
+    store = section.package_store
+    detailed = params.get("format") == "details"
+    if store is not None and detailed:
+        resp = await section.do_get(urlpath, params={k: v for k, v in params.items() if k != "format"})
+        keys = section.decode_json(resp)
+        found = store.get_many(keys)
+        if len(found) == len(set(keys)):
+            return [PackageAPISection.package_from_response(found[key], fields) for key in keys]
+
+    resp = await section.do_get(urlpath, params=params)
+    return packages_from_listing(section, resp.content, detailed, fields, lazy)
@@ -0,0 +1,131 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+from typing import Sequence, Dict, Union, Optional  # noqa: F401
+from urllib.parse import quote
+
+from aptly_api.aio.base import AsyncBaseAPIClient
+from aptly_api.base import AptlyAPIException
+from aptly_api.parts.publish import PublishEndpoint, PublishAPISection, T_BodyDict  # noqa: F401
+
+
+class AsyncPublishAPISection(AsyncBaseAPIClient):
+    async def list(self) -> Sequence[PublishEndpoint]:
+        resp = await self.do_get("api/publish")
+        ret = []
+        for rpe in self.decode_json(resp):
+            ret.append(PublishAPISection.endpoint_from_response(rpe))
+        return ret
+
+    async def publish(self, *, source_kind: str = "local",
+                      sources: Sequence[Dict[str, str]],
+                      architectures: Sequence[str],
+                      prefix: Optional[str] = None, distribution: Optional[str] = None,
+                      label: Optional[str] = None, origin: Optional[str] = None, force_overwrite: bool = False,
+                      sign_skip: bool = False, sign_batch: bool = True, sign_gpgkey: Optional[str] = None,
+                      sign_keyring: Optional[str] = None, sign_secret_keyring: Optional[str] = None,
+                      sign_passphrase: Optional[str] = None, sign_passphrase_file: Optional[str] = None,
+                      acquire_by_hash: Optional[bool] = None) -> PublishEndpoint:
+        if sign_passphrase is not None and sign_passphrase_file is not None:
+            raise AptlyAPIException("Can't use sign_passphrase and sign_passphrase_file at the same time")
+
+        for source in sources:
+            if "name" not in source and "Name" not in source:
+                raise AptlyAPIException("Each source in publish() must contain the 'name' attribute")
+
+        url = "api/publish"
+        if prefix is not None and prefix != "":
+            url = "api/publish/%s" % quote(PublishAPISection.escape_prefix(prefix))
+
+        body = {
+            "SourceKind": source_kind,
+            "Sources": sources,
+        }  # type: T_BodyDict
+
+        if architectures is not None:
+            body["Architectures"] = architectures
+        if distribution is not None:
+            body["Distribution"] = distribution
+        if label is not None:
+            body["Label"] = label
+        if origin is not None:
+            body["Origin"] = origin
+        if force_overwrite:
+            body["ForceOverwrite"] = True
+        if acquire_by_hash is not None:
+            body["AcquireByHash"] = acquire_by_hash
+
+        sign_dict = {}  # type: Dict[str, Union[bool,str]]
+        if sign_skip:
+            sign_dict["Skip"] = True
+        else:
+            sign_dict["Batch"] = sign_batch
+            if sign_gpgkey is not None:
+                sign_dict["GpgKey"] = sign_gpgkey
+            if sign_keyring is not None:
+                sign_dict["Keyring"] = sign_keyring
+            if sign_secret_keyring is not None:
+                sign_dict["SecretKeyring"] = sign_secret_keyring
+            if sign_passphrase is not None:
+                sign_dict["Passphrase"] = sign_passphrase
+            if sign_passphrase_file is not None:
+                sign_dict["PassphraseFile"] = sign_passphrase_file
+        body["Signing"] = sign_dict
+
+        resp = await self.do_post(url, json=body)
+        return PublishAPISection.endpoint_from_response(self.decode_json(resp))
+
+    async def update(self, *, prefix: str, distribution: str,
+                     snapshots: Optional[Sequence[Dict[str, str]]] = None, force_overwrite: bool = False,
+                     sign_skip: bool = False, sign_batch: bool = True, sign_gpgkey: Optional[str] = None,
+                     sign_keyring: Optional[str] = None, sign_secret_keyring: Optional[str] = None,
+                     sign_passphrase: Optional[str] = None, sign_passphrase_file: Optional[str] = None,
+                     skip_contents: Optional[bool] = False,
+                     skip_cleanup: Optional[bool] = False) -> PublishEndpoint:
+        if sign_passphrase is not None and sign_passphrase_file is not None:
+            raise AptlyAPIException("Can't use sign_passphrase and sign_passphrase_file at the same time")
+
+        body = {}  # type: T_BodyDict
+
+        if snapshots is not None:
+            for source in snapshots:
+                if "name" not in source and "Name" not in source:
+                    raise AptlyAPIException("Each source in update() must contain the 'name' attribute")
+            body["Snapshots"] = snapshots
+
+        if force_overwrite:
+            body["ForceOverwrite"] = True
+        if skip_cleanup:
+            body["SkipCleanup"] = True
+        if skip_contents:
+            body["SkipContents"] = True
+
+        sign_dict = {}  # type: Dict[str, Union[bool,str]]
+        if sign_skip:
+            sign_dict["Skip"] = True
+        else:
+            sign_dict["Batch"] = sign_batch
+            if sign_gpgkey is not None:
+                sign_dict["GpgKey"] = sign_gpgkey
+            if sign_keyring is not None:
+                sign_dict["Keyring"] = sign_keyring
+            if sign_secret_keyring is not None:
+                sign_dict["SecretKeyring"] = sign_secret_keyring
+            if sign_passphrase is not None:
+                sign_dict["Passphrase"] = sign_passphrase
+            if sign_passphrase_file is not None:
+                sign_dict["PassphraseFile"] = sign_passphrase_file
+        body["Signing"] = sign_dict
+
+        resp = await self.do_put("api/publish/%s/%s" %
+                                 (quote(PublishAPISection.escape_prefix(prefix)), quote(distribution),), json=body)
+        return PublishAPISection.endpoint_from_response(self.decode_json(resp))
+
+    async def drop(self, *, prefix: str, distribution: str, force_delete: bool = False) -> None:
+        params = {}
+        if force_delete:
+            params["force"] = "1"
+        await self.do_delete("api/publish/%s/%s" %
+                             (quote(PublishAPISection.escape_prefix(prefix)), quote(distribution),), params=params)
@@ -0,0 +1,133 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+from typing import Sequence, Optional, AsyncIterator, Iterable, Dict
+from urllib.parse import quote
+
+from aptly_api.aio.base import AsyncBaseAPIClient, in_thread
+from aptly_api.aio.parts.packages import fetch_package_list
+from aptly_api.base import AptlyAPIException
+from aptly_api.parts.packages import Package, PackageAPISection
+from aptly_api.parts.repos import Repo, FileReport, ReposAPISection, files_present
+
+
+class AsyncReposAPISection(AsyncBaseAPIClient):
+    async def create(self, reponame: str, comment: Optional[str] = None, default_distribution: Optional[str] = None,
+                     default_component: Optional[str] = None) -> Repo:
+        data = {
+            "Name": reponame,
+        }
+
+        if comment:
+            data["Comment"] = comment
+        if default_distribution:
+            data["DefaultDistribution"] = default_distribution
+        if default_component:
+            data["DefaultComponent"] = default_component
+
+        resp = await self.do_post("api/repos", json=data)
+
+        return ReposAPISection.repo_from_response(self.decode_json(resp))
+
+    async def show(self, reponame: str) -> Repo:
+        resp = await self.do_get("api/repos/%s" % quote(reponame))
+        return ReposAPISection.repo_from_response(self.decode_json(resp))
+
+    async def search_packages(self, reponame: str, query: Optional[str] = None, with_deps: bool = False,
+                              detailed: bool = False, fields: Optional[Sequence[str]] = None,
+                              lazy: bool = False) -> Sequence[Package]:
+        params = ReposAPISection._search_params(query, with_deps, detailed or fields is not None or lazy)
+        return await fetch_package_list(self, "api/repos/%s/packages" % quote(reponame), params,
+                                        fields=fields, lazy=lazy)
+
+    async def iter_packages(self, reponame: str, query: Optional[str] = None, with_deps: bool = False,
+                            detailed: bool = False, fields: Optional[Sequence[str]] = None) -> AsyncIterator[Package]:
+        params = ReposAPISection._search_params(query, with_deps, detailed or fields is not None)
+        async for rpkg in self.do_get_json_stream("api/repos/%s/packages" % quote(reponame), params=params):
+            yield PackageAPISection.package_from_response(rpkg, fields)
+
+    async def files_present(self, reponame: str, files: Iterable[str]) -> Dict[str, bool]:
+        packages = await self.search_packages(reponame)
+        # parsing the files' control data reads them from disk
+        return await in_thread(files_present, files, packages)
+
+    async def edit(self, reponame: str, comment: Optional[str] = None, default_distribution: Optional[str] = None,
+                   default_component: Optional[str] = None) -> Repo:
+        if comment is None and default_component is None and default_distribution is None:
+            raise AptlyAPIException("edit requires at least one of 'comment', 'default_distribution' or "
+                                    "'default_component'.")
+
+        body = {}
+        if comment is not None:
+            body["Comment"] = comment
+        if default_distribution is not None:
+            body["DefaultDistribution"] = default_distribution
+        if default_component is not None:
+            body["DefaultComponent"] = default_component
+
+        resp = await self.do_put("api/repos/%s" % quote(reponame), json=body)
+        return ReposAPISection.repo_from_response(self.decode_json(resp))
+
+    async def list(self) -> Sequence[Repo]:
+        resp = await self.do_get("api/repos")
+
+        repos = []
+        for rdesc in self.decode_json(resp):
+            repos.append(
+                ReposAPISection.repo_from_response(rdesc)
+            )
+        return repos
+
+    async def delete(self, reponame: str, force: bool = False) -> None:
+        await self.do_delete("api/repos/%s" % quote(reponame), params={"force": "1" if force else "0"})
+
+    async def add_uploaded_file(self, reponame: str, dir: str, filename: Optional[str] = None,
+                                remove_processed_files: bool = True, force_replace: bool = False) -> FileReport:
+        params = {
+            "noRemove": "0" if remove_processed_files else "1",
+        }
+        if force_replace:
+            params["forceReplace"] = "1"
+
+        if filename is None:
+            resp = await self.do_post("api/repos/%s/file/%s" % (quote(reponame), quote(dir),), params=params)
+        else:
+            resp = await self.do_post("api/repos/%s/file/%s/%s" % (quote(reponame), quote(dir), quote(filename),),
+                                      params=params)
+
+        return ReposAPISection.filereport_from_response(self.decode_json(resp))
+
+    async def include_uploaded_file(self, reponame: str, dir: str, filename: Optional[str] = None,
+                                    remove_processed_files: bool = True, force_replace: bool = False,
+                                    accept_unsigned: bool = False, ignore_signature: bool = False) -> FileReport:
+        params = {
+            "noRemoveFiles": "0" if remove_processed_files else "1",
+        }
+        if force_replace:
+            params["forceReplace"] = "1"
+        if accept_unsigned:
+            params["acceptUnsigned"] = "1"
+        if ignore_signature:
+            params["ignoreSignature"] = "1"
+
+        if filename is None:
+            resp = await self.do_post("api/repos/%s/include/%s" % (quote(reponame), quote(dir),), params=params)
+        else:
+            resp = await self.do_post("api/repos/%s/include/%s/%s" %
+                                      (quote(reponame), quote(dir), quote(filename),), params=params)
+
+        return ReposAPISection.filereport_from_response(self.decode_json(resp))
+
+    async def add_packages_by_key(self, reponame: str, *package_keys: str) -> Repo:
+        resp = await self.do_post("api/repos/%s/packages" % quote(reponame), json={
+            "PackageRefs": package_keys,
+        })
+        return ReposAPISection.repo_from_response(self.decode_json(resp))
+
+    async def delete_packages_by_key(self, reponame: str, *package_keys: str) -> Repo:
+        resp = await self.do_delete("api/repos/%s/packages" % quote(reponame), json={
+            "PackageRefs": package_keys,
+        })
+        return ReposAPISection.repo_from_response(self.decode_json(resp))
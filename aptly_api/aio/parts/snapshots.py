@@ -0,0 +1,189 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import asyncio
+import itertools
+from typing import Sequence, Optional, Dict, Union, cast, List, AsyncIterator, Any  # noqa: F401
+from urllib.parse import quote
+
+from aptly_api.aio.base import AsyncBaseAPIClient
+from aptly_api.aio.parts.packages import fetch_package_list
+from aptly_api.base import AptlyAPIException
+from aptly_api.cache import SnapshotPackageCache
+from aptly_api.diff import DiffSummary, diff_packages, diff_summary, diff_matrix
+from aptly_api.index import PackageIndex
+from aptly_api.merge import merge_packages, pull_packages
+from aptly_api.parts.packages import Package, PackageAPISection, project_packages
+from aptly_api.parts.snapshots import Snapshot, SnapshotAPISection
+
+
+class AsyncSnapshotAPISection(AsyncBaseAPIClient):
+    def __init__(self, *args: Any, package_cache: Optional[SnapshotPackageCache] = None, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.package_cache = package_cache
+
+    async def list(self, sort: str = 'name') -> Sequence[Snapshot]:
+        if sort not in ['name', 'time']:
+            raise AptlyAPIException("Snapshot LIST only supports two sort modes: 'name' and 'time'. %s is not "
+                                    "supported." % sort)
+        resp = await self.do_get("api/snapshots", params={"sort": sort})
+        ret = []
+        for rsnap in self.decode_json(resp):
+            ret.append(SnapshotAPISection.snapshot_from_response(rsnap))
+        return ret
+
+    async def create_from_repo(self, reponame: str, snapshotname: str,
+                               description: Optional[str] = None) -> Snapshot:
+        body = {
+            "Name": snapshotname,
+        }
+        if description is not None:
+            body["Description"] = description
+
+        resp = await self.do_post("api/repos/%s/snapshots" % quote(reponame), json=body)
+        return SnapshotAPISection.snapshot_from_response(self.decode_json(resp))
+
+    async def create_from_mirror(self, mirrorname: str, snapshotname: str,
+                                 description: Optional[str] = None) -> Snapshot:
+        body = {
+            "Name": snapshotname
+        }
+        if description is not None:
+            body["Description"] = description
+
+        resp = await self.do_post("api/mirrors/%s/snapshots" %
+                                  quote(mirrorname), json=body)
+        return SnapshotAPISection.snapshot_from_response(self.decode_json(resp))
+
+    async def create_from_packages(self, snapshotname: str, description: Optional[str] = None,
+                                   source_snapshots: Optional[Sequence[str]] = None,
+                                   package_refs: Optional[Sequence[str]] = None) -> Snapshot:
+        body = {
+            "Name": snapshotname,
+        }  # type: Dict[str, Union[str, Sequence[str]]]
+        if description is not None:
+            body["Description"] = description
+
+        if source_snapshots is not None:
+            body["SourceSnapshots"] = source_snapshots
+
+        if package_refs is not None:
+            body["PackageRefs"] = package_refs
+
+        resp = await self.do_post("api/snapshots", json=body)
+        return SnapshotAPISection.snapshot_from_response(self.decode_json(resp))
+
+    async def update(self, snapshotname: str, newname: Optional[str] = None,
+                     newdescription: Optional[str] = None) -> Snapshot:
+        if newname is None and newdescription is None:
+            raise AptlyAPIException("When updating a Snapshot you must at lease provide either a new name or a "
+                                    "new description.")
+        body = {}  # type: Dict[str, Union[str, Sequence[str]]]
+        if newname is not None:
+            body["Name"] = newname
+
+        if newdescription is not None:
+            body["Description"] = newdescription
+
+        resp = await self.do_put("api/snapshots/%s" % quote(snapshotname), json=body)
+        return SnapshotAPISection.snapshot_from_response(self.decode_json(resp))
+
+    async def show(self, snapshotname: str) -> Snapshot:
+        resp = await self.do_get("api/snapshots/%s" % quote(snapshotname))
+        return SnapshotAPISection.snapshot_from_response(self.decode_json(resp))
+
+    async def list_packages(self, snapshotname: str, query: Optional[str] = None, with_deps: bool = False,
+                            detailed: bool = False, fields: Optional[Sequence[str]] = None,
+                            lazy: bool = False) -> Sequence[Package]:
+        params = SnapshotAPISection._list_params(query, with_deps, detailed or fields is not None or lazy)
+        created_at = None
+        if self.package_cache is not None:
+            snapshot = await self.show(snapshotname)
+            if snapshot.created_at_raw is not None:
+                created_at = snapshot.created_at_raw
+                cached = self.package_cache.get(snapshotname, created_at, params,
+                                                decode=PackageAPISection.package_from_response)
+                if cached is not None:
+                    return project_packages(cast(List[Package], cached), fields)
+
+        if self.package_cache is None or created_at is None:
+            return await fetch_package_list(self, "api/snapshots/%s/packages" % quote(snapshotname), params,
+                                            fields=fields, lazy=lazy)
+
+        ret = await fetch_package_list(self, "api/snapshots/%s/packages" % quote(snapshotname), params)
+        self.package_cache.put(snapshotname, created_at, params, ret,
+                               raw_items=[pkg.key if pkg.fields is None else pkg.fields for pkg in ret])
+        return project_packages(ret, fields)
+
+    async def iter_packages(self, snapshotname: str, query: Optional[str] = None, with_deps: bool = False,
+                            detailed: bool = False, fields: Optional[Sequence[str]] = None) -> AsyncIterator[Package]:
+        params = SnapshotAPISection._list_params(query, with_deps, detailed or fields is not None)
+        async for rpkg in self.do_get_json_stream("api/snapshots/%s/packages" % quote(snapshotname), params=params):
+            yield PackageAPISection.package_from_response(rpkg, fields)
+
+    async def delete(self, snapshotname: str, force: bool = False) -> None:
+        params = None
+        if force:
+            params = {
+                "force": "1",
+            }
+
+        await self.do_delete("api/snapshots/%s" % quote(snapshotname), params=params)
+
+    async def diff(self, snapshot1: str, snapshot2: str) -> Sequence[Dict[str, str]]:
+        resp = await self.do_get("api/snapshots/%s/diff/%s" %
+                                 (quote(snapshot1), quote(snapshot2),))
+        return cast(List[Dict[str, str]], self.decode_json(resp))
+
+    async def local_diff(self, snapshot1: str, snapshot2: str,
+                         only_matching: bool = False) -> Sequence[Dict[str, Optional[str]]]:
+        left, right = await asyncio.gather(self.list_packages(snapshot1), self.list_packages(snapshot2))
+        return diff_packages(left, right, only_matching)
+
+    async def diff_summary(self, snapshot1: str, snapshot2: str) -> DiffSummary:
+        left, right = await asyncio.gather(self.list_packages(snapshot1), self.list_packages(snapshot2))
+        return diff_summary(left, right)
+
+    async def diff_matrix(self, snapshotnames: Sequence[str]) -> List[List[DiffSummary]]:
+        return diff_matrix(await asyncio.gather(*(self.list_packages(name) for name in snapshotnames)))
+
+    async def merge(self, destination: str, sources: Sequence[str], description: Optional[str] = None,
+                    latest: bool = False, no_remove: bool = False) -> Snapshot:
+        if not sources:
+            raise AptlyAPIException("Merging snapshots requires at least one source snapshot.")
+        if description is None:
+            description = SnapshotAPISection._merge_description(sources)
+        listings = await asyncio.gather(*(self.list_packages(name) for name in sources))
+        packages = merge_packages(listings, latest=latest, no_remove=no_remove)
+        return await self.create_from_packages(destination, description=description, source_snapshots=sources,
+                                               package_refs=[pkg.key for pkg in packages])
+
+    async def pull(self, snapshotname: str, source: str, destination: str, queries: Sequence[str],
+                   description: Optional[str] = None, with_deps: bool = True, no_remove: bool = False,
+                   all_matches: bool = False) -> Snapshot:
+        if not queries:
+            raise AptlyAPIException("Pulling packages requires at least one package query.")
+        if description is None:
+            description = SnapshotAPISection._pull_description(snapshotname, source, queries)
+        base, *pulled = await asyncio.gather(
+            self.list_packages(snapshotname),
+            *(self.list_packages(source, query=query, with_deps=with_deps) for query in queries)
+        )
+        packages = pull_packages(base, itertools.chain(*pulled), no_remove=no_remove, all_matches=all_matches)
+        return await self.create_from_packages(destination, description=description,
+                                               source_snapshots=[snapshotname, source],
+                                               package_refs=[pkg.key for pkg in packages])
+
+    async def filter(self, source: str, destination: str, queries: Sequence[str],
+                     description: Optional[str] = None, with_deps: bool = False) -> Snapshot:
+        if not queries:
+            raise AptlyAPIException("Filtering a snapshot requires at least one package query.")
+        if description is None:
+            description = SnapshotAPISection._filter_description(source, queries)
+        listings = await asyncio.gather(*(self.list_packages(source, query=query, with_deps=with_deps)
+                                          for query in queries))
+        packages = PackageIndex(itertools.chain(*listings))
+        return await self.create_from_packages(destination, description=description, source_snapshots=[source],
+                                               package_refs=[pkg.key for pkg in packages])
@@ -2,13 +2,23 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import time
 from typing import IO, TextIO, BinaryIO, Sequence, Dict, Tuple, Optional, Union, List, Any, MutableMapping, Iterable, \
-    Mapping
+    Mapping, Iterator, cast
 from urllib.parse import urljoin
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import AuthBase
 
+from aptly_api.cache import ResponseCache
+from aptly_api.instrumentation import RequestInstrumentation, RequestRecord, url_template
+from aptly_api.jsonutil import iter_json_array, JSONDecoder, default_json_decoder
+from aptly_api.retry import RetryPolicy
+from aptly_api.store import PackageStore
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
 _filetype = Optional[
     Union[
         Dict[
@@ -45,29 +55,73 @@ _datatype = Optional[
 ]
 
 
+_transport_errors = (requests.ConnectionError, requests.Timeout)
+
+
+def _rewind_body(request_kwargs: Dict[str, Any]) -> None:
+    # file objects passed as the request body have been consumed by the failed attempt
+    data = request_kwargs.get("data")
+    if data is not None and hasattr(data, "seek"):
+        data.seek(0)
+    for f in request_kwargs.get("files") or []:
+        fh = f[1][1] if isinstance(f[1], tuple) else f[1]
+        if hasattr(fh, "seek"):
+            fh.seek(0)
+
+
 class AptlyAPIException(Exception):
     def __init__(self, *args: Any, status_code: int = 0) -> None:
         super().__init__(*args)
         self.status_code = status_code
 
 
+def make_session(pool_size: int = 10) -> requests.Session:
+    """
+    Create a ``requests.Session`` whose connection pool keeps up to ``pool_size`` keep-alive connections per host.
+    ``Client`` shares one such session between all of its API sections.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
 class BaseAPIClient:
     def __init__(self, base_url: str, ssl_verify: Union[str, bool, None] = None,
                  ssl_cert: Optional[Tuple[str, str]] = None, http_auth: Optional[AuthBase] = None,
-                 timeout: int = 60) -> None:
+                 timeout: int = 60, session: Optional[requests.Session] = None,
+                 retry: Optional[RetryPolicy] = None,
+                 instrumentation: Optional[RequestInstrumentation] = None,
+                 cache: Optional[ResponseCache] = None,
+                 package_store: Optional[PackageStore] = None,
+                 json_decoder: Optional[JSONDecoder] = None) -> None:
         self.base_url = base_url
         self.ssl_verify = ssl_verify
         self.ssl_cert = ssl_cert
         self.http_auth = http_auth
         self.exc_class = AptlyAPIException
         self.timeout = timeout
+        # sections that are instantiated standalone get their own session, Client passes a shared one
+        self.session = session if session is not None else make_session()
+        self.retry = retry
+        self.instrumentation = instrumentation
+        self.cache = cache
+        self.package_store = package_store
+        self.json_decoder = json_decoder if json_decoder is not None else default_json_decoder()
+
+    def decode_json(self, resp: requests.Response) -> Any:
+        """
+        Decodes the JSON body of ``resp`` with ``json_decoder``, straight from the response bytes.
+        """
+        return self.json_decoder(resp.content)
 
     def _error_from_response(self, resp: requests.Response) -> str:
         if resp.status_code == 200:
             return "no error (status 200)"
 
         try:
-            rcnt = resp.json()
+            rcnt = self.decode_json(resp)
         except ValueError:
             return "%s %s %s" % (resp.status_code, resp.reason, resp.text,)
 
@@ -86,48 +140,110 @@ class BaseAPIClient:
     def _make_url(self, path: str) -> str:
         return urljoin(self.base_url, path)
 
-    def do_get(self, urlpath: str, params: Optional[Dict[str, str]] = None) -> requests.Response:
-        resp = requests.get(self._make_url(urlpath), params=params, verify=self.ssl_verify,
-                            cert=self.ssl_cert, auth=self.http_auth, timeout=self.timeout)
-
-        if resp.status_code < 200 or resp.status_code >= 300:
-            raise AptlyAPIException(self._error_from_response(resp), status_code=resp.status_code)
-
+    def _request(self, method: str, urlpath: str, **kwargs: Any) -> requests.Response:
+        start = time.perf_counter()
+        attempt = 1
+        resp = None  # type: Optional[requests.Response]
+        error = None  # type: Optional[Exception]
+        try:
+            while True:
+                resp = None
+                try:
+                    resp = self.session.request(method, self._make_url(urlpath), verify=self.ssl_verify,
+                                                cert=self.ssl_cert, auth=self.http_auth, timeout=self.timeout,
+                                                **kwargs)
+                except Exception as e:
+                    if self.retry is None or not self.retry.allows(method, attempt) or \
+                            not self.retry.retries_exception(e, _transport_errors):
+                        raise
+                    time.sleep(self.retry.delay(attempt))
+                else:
+                    if 200 <= resp.status_code < 300:
+                        return resp
+
+                    if self.retry is None or not self.retry.allows(method, attempt) or \
+                            not self.retry.retries_status(resp.status_code):
+                        raise AptlyAPIException(self._error_from_response(resp), status_code=resp.status_code)
+                    resp.close()
+                    time.sleep(self.retry.delay(attempt, resp.headers.get("Retry-After")))
+
+                _rewind_body(kwargs)
+                attempt += 1
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if self.cache is not None and method != "GET":
+                self.cache.invalidate(urlpath)
+            if self.instrumentation is not None:
+                self._record_request(method, urlpath, start, attempt, resp, error, kwargs.get("stream", False))
+
+    def _record_request(self, method: str, urlpath: str, start: float, attempts: int,
+                        resp: Optional[requests.Response], error: Optional[Exception], stream: bool) -> None:
+        status_code = time_to_first_byte = request_bytes = response_bytes = None
+        if resp is not None:
+            status_code = resp.status_code
+            # requests measures the time between sending the request and parsing the response headers
+            time_to_first_byte = resp.elapsed.total_seconds()
+            if "Content-Length" in resp.request.headers:
+                request_bytes = int(resp.request.headers["Content-Length"])
+            elif resp.request.body is None:
+                request_bytes = 0
+            if stream:
+                if "Content-Length" in resp.headers:
+                    response_bytes = int(resp.headers["Content-Length"])
+            else:
+                response_bytes = len(resp.content)
+
+        cast(RequestInstrumentation, self.instrumentation).record(RequestRecord(
+            method=method,
+            url_template=url_template(urlpath),
+            url=self._make_url(urlpath),
+            status_code=status_code,
+            duration=time.perf_counter() - start,
+            time_to_first_byte=time_to_first_byte,
+            request_bytes=request_bytes,
+            response_bytes=response_bytes,
+            retries=attempts - 1,
+            error=None if error is None else "%s: %s" % (error.__class__.__name__, error),
+        ))
+
+    def do_get(self, urlpath: str, params: Optional[Dict[str, str]] = None,
+               stream: bool = False) -> requests.Response:
+        if self.cache is None or stream:
+            return self._request("GET", urlpath, params=params, stream=stream)
+
+        cached = self.cache.get(urlpath, params)
+        if cached is not None:
+            return cast(requests.Response, cached)
+        resp = self._request("GET", urlpath, params=params)
+        self.cache.put(urlpath, params, resp)
         return resp
 
-    def do_post(self, urlpath: str, data: Union[bytes, MutableMapping[str, str], IO[Any], None] = None,
+    def do_get_json_stream(self, urlpath: str, params: Optional[Dict[str, str]] = None) -> Iterator[Any]:
+        """
+        Yields the elements of the JSON array returned by a GET request while the response body is still being
+        received, without ever holding the whole body or the whole decoded list in memory.
+        """
+        resp = self.do_get(urlpath, params=params, stream=True)
+        try:
+            yield from iter_json_array(resp.iter_content(chunk_size=STREAM_CHUNK_SIZE), self.json_decoder)
+        finally:
+            resp.close()
+
+    def do_post(self, urlpath: str, data: _datatype = None,
                 params: Optional[Dict[str, str]] = None,
                 files: _filetype = None,
-                json: Optional[MutableMapping[Any, Any]] = None) -> requests.Response:
-        resp = requests.post(self._make_url(urlpath), data=data, params=params, files=files, json=json,
-                             verify=self.ssl_verify, cert=self.ssl_cert, auth=self.http_auth,
-                             timeout=self.timeout)
-
-        if resp.status_code < 200 or resp.status_code >= 300:
-            raise AptlyAPIException(self._error_from_response(resp), status_code=resp.status_code)
-
-        return resp
+                json: Optional[MutableMapping[Any, Any]] = None,
+                headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        return self._request("POST", urlpath, data=data, params=params, files=files, json=json, headers=headers)
 
     def do_put(self, urlpath: str, data: Union[bytes, MutableMapping[str, str], IO[Any], None] = None,
                files: _filetype = None,
                json: Optional[MutableMapping[Any, Any]] = None) -> requests.Response:
-        resp = requests.put(self._make_url(urlpath), data=data, files=files, json=json,
-                            verify=self.ssl_verify, cert=self.ssl_cert, auth=self.http_auth,
-                            timeout=self.timeout)
-
-        if resp.status_code < 200 or resp.status_code >= 300:
-            raise AptlyAPIException(self._error_from_response(resp), status_code=resp.status_code)
-
-        return resp
+        return self._request("PUT", urlpath, data=data, files=files, json=json)
 
     def do_delete(self, urlpath: str, params: Optional[Dict[str, str]] = None,
                   data: _datatype = None,
                   json: Union[List[Dict[str, Any]], Dict[str, Any], None] = None) -> requests.Response:
-        resp = requests.delete(self._make_url(urlpath), params=params, data=data, json=json,
-                               verify=self.ssl_verify, cert=self.ssl_cert, auth=self.http_auth,
-                               timeout=self.timeout)
-
-        if resp.status_code < 200 or resp.status_code >= 300:
-            raise AptlyAPIException(self._error_from_response(resp), status_code=resp.status_code)
-
-        return resp
+        return self._request("DELETE", urlpath, params=params, data=data, json=json)
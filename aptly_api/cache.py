@@ -0,0 +1,207 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Dict, Tuple, Callable, List, Sequence, cast  # noqa: F401
+
+_CacheKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+# the names of the files that SnapshotPackageCache writes, including the temporary files of interrupted writes
+_snapshot_filename = re.compile(r"[0-9a-f]{64}(?:\.json|\..+\.tmp)\Z")
+
+
+def _normalize_path(urlpath: str) -> str:
+    return urlpath.split("?", 1)[0].strip("/")
+
+
+class ResponseCache:
+    """
+    An opt-in, thread-safe read-through cache for the responses of GET requests with a time-to-live and LRU
+    eviction once ``maxsize`` entries are stored.
+
+    Entries are invalidated automatically when the client that owns the cache performs a mutating (POST, PUT or
+    DELETE) request on a related resource. A mutation of ``api/<collection>/<name>[/...]`` invalidates the
+    collection listing ``api/<collection>`` and every cached path of that collection that refers to ``<name>``,
+    e.g. ``repos.edit("x")`` invalidates ``api/repos``, ``api/repos/x`` and ``api/repos/x/packages``. Mutations
+    that create resources in another collection (like ``snapshots.create_from_repo``) or consume uploaded files
+    (like ``repos.add_uploaded_file``) invalidate those collections, too. Changes made by other clients are only
+    picked up when entries expire.
+    """
+    # sub-resources of a mutation that affect another collection
+    related_collections = {
+        "snapshots": "api/snapshots",
+        "file": "api/files",
+        "include": "api/files",
+    }
+
+    def __init__(self, ttl: float = 60.0, maxsize: int = 1024,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # type: OrderedDict[_CacheKey, Tuple[float, Any]]
+
+    @staticmethod
+    def make_key(urlpath: str, params: Optional[Dict[str, str]] = None) -> _CacheKey:
+        return _normalize_path(urlpath), tuple(sorted((params or {}).items()))
+
+    def get(self, urlpath: str, params: Optional[Dict[str, str]] = None) -> Any:
+        """
+        :return: the cached response or ``None``
+        """
+        key = self.make_key(urlpath, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < self.clock():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, urlpath: str, params: Optional[Dict[str, str]], response: Any) -> None:
+        key = self.make_key(urlpath, params)
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, urlpath: str) -> None:
+        """
+        Drops all entries related to a mutation of ``urlpath``.
+        """
+        segments = _normalize_path(urlpath).split("/")
+        # listings that are always dropped
+        collections = {"/".join(segments[:2])}
+        # (collection prefix, path segment identifying the mutated resource)
+        resources = []  # type: List[Tuple[str, str]]
+        if len(segments) > 2:
+            resources.append(("/".join(segments[:2]) + "/", segments[2]))
+            for ix, sub in enumerate(segments[3:], start=3):
+                if sub in self.related_collections:
+                    collections.add(self.related_collections[sub])
+                    if ix + 1 < len(segments):
+                        resources.append((self.related_collections[sub] + "/", segments[ix + 1]))
+
+        with self._lock:
+            for key in list(self._entries.keys()):
+                path = key[0]
+                if path in collections or any(path.startswith(prefix) and name in path.split("/")[2:]
+                                              for prefix, name in resources):
+                    del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SnapshotPackageCache:
+    """
+    Caches the package lists of snapshots. Snapshots are immutable, so a listing can be reused for as long as the
+    snapshot exists. Entries are keyed by snapshot name, its ``created_at`` timestamp and the listing parameters,
+    so a snapshot that has been deleted and recreated under the same name is never served stale data.
+    ``SnapshotAPISection.list_packages`` revalidates with a cheap ``snapshots.show()`` call before using an entry.
+
+    Up to ``maxsize`` listings are kept in memory. If ``directory`` is set, listings are also stored there as
+    JSON files so they survive between processes. The directory may be shared with other files, ``clear()`` only
+    removes the files that this cache writes.
+    """
+    def __init__(self, directory: Optional[str] = None, maxsize: int = 16) -> None:
+        self.directory = directory
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # type: OrderedDict[str, Sequence[Any]]
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(snapshotname: str, created_at: str, params: Optional[Dict[str, str]] = None) -> str:
+        return json.dumps([snapshotname, created_at, sorted((params or {}).items())])
+
+    def _filename(self, key: str) -> str:
+        return os.path.join(cast(str, self.directory),
+                            "%s.json" % hashlib.sha256(key.encode("utf-8")).hexdigest())
+
+    def get(self, snapshotname: str, created_at: str, params: Optional[Dict[str, str]] = None,
+            decode: Callable[[Any], Any] = lambda x: x) -> Optional[Sequence[Any]]:
+        """
+        :param decode: converts a listing element as returned by the aptly API when it's loaded from disk
+        :return: the cached listing or ``None``
+        """
+        key = self.make_key(snapshotname, created_at, params)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        if self.directory is None:
+            return None
+        try:
+            with open(self._filename(key), "rt", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if stored.get("key") != key:
+            return None
+
+        items = [decode(item) for item in stored["items"]]
+        self._remember(key, items)
+        return items
+
+    def put(self, snapshotname: str, created_at: str, params: Optional[Dict[str, str]], items: Sequence[Any],
+            raw_items: Optional[Sequence[Any]] = None) -> None:
+        """
+        :param items: the listing as it should be returned by ``get()``
+        :param raw_items: the listing as returned by the aptly API, required for storing it on disk
+        """
+        key = self.make_key(snapshotname, created_at, params)
+        self._remember(key, items)
+        if self.directory is not None and raw_items is not None:
+            # write to a temporary file first, so concurrent readers never see partial listings. It's named after
+            # the listing's file, so clear() can recognize it if the write is interrupted.
+            filename = self._filename(key)
+            fd, tmpname = tempfile.mkstemp(dir=self.directory, prefix=os.path.basename(filename) + ".",
+                                           suffix=".tmp")
+            with os.fdopen(fd, "wt", encoding="utf-8") as f:
+                json.dump({"key": key, "items": raw_items}, f)
+            try:
+                os.replace(tmpname, filename)
+            except FileNotFoundError:
+                # a concurrent clear() removed the temporary file, the listing is still cached in memory
+                pass
+
+    def _remember(self, key: str, items: Sequence[Any]) -> None:
+        with self._lock:
+            self._entries[key] = items
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.directory is not None:
+            for fn in os.listdir(self.directory):
+                if _snapshot_filename.match(fn):
+                    try:
+                        os.unlink(os.path.join(self.directory, fn))
+                    except FileNotFoundError:
+                        # removed by a concurrent clear() or renamed by a concurrent put()
+                        pass
@@ -4,8 +4,15 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 from requests.auth import AuthBase
-from typing import Union, Optional, Tuple
+from typing import Union, Optional, Tuple, Dict, Any  # noqa: F401
 
+from aptly_api.base import make_session
+from aptly_api.cache import ResponseCache, SnapshotPackageCache
+from aptly_api.jsonutil import JSONDecoder, default_json_decoder
+from aptly_api.instrumentation import RequestInstrumentation, EndpointStats
+from aptly_api.retry import RetryPolicy
+from aptly_api.store import PackageStore
+from aptly_api.transfer import RateLimiter
 from aptly_api.parts.misc import MiscAPISection
 from aptly_api.parts.packages import PackageAPISection
 from aptly_api.parts.publish import PublishAPISection
@@ -18,26 +25,64 @@ from aptly_api.parts.mirrors import MirrorsAPISection
 class Client:
     def __init__(self, aptly_server_url: str, ssl_verify: Union[str, bool, None] = None,
                  ssl_cert: Optional[Tuple[str, str]] = None, http_auth: Optional[AuthBase] = None,
-                 timeout: int = 60) -> None:
+                 timeout: int = 60, pool_size: int = 10, retry: Optional[RetryPolicy] = None,
+                 instrumentation: Optional[RequestInstrumentation] = None,
+                 cache: Optional[ResponseCache] = None,
+                 snapshot_cache: Optional[SnapshotPackageCache] = None,
+                 package_store: Optional[PackageStore] = None,
+                 upload_rate_limit: Optional[float] = None,
+                 json_decoder: Optional[JSONDecoder] = None) -> None:
         self.__aptly_server_url = aptly_server_url
-        self.files = FilesAPISection(base_url=self.__aptly_server_url, ssl_verify=ssl_verify,
-                                     ssl_cert=ssl_cert, http_auth=http_auth, timeout=timeout)
-        self.misc = MiscAPISection(base_url=self.__aptly_server_url, ssl_verify=ssl_verify,
-                                   ssl_cert=ssl_cert, http_auth=http_auth, timeout=timeout)
-        self.packages = PackageAPISection(base_url=self.__aptly_server_url, ssl_verify=ssl_verify,
-                                          ssl_cert=ssl_cert, http_auth=http_auth, timeout=timeout)
-        self.publish = PublishAPISection(base_url=self.__aptly_server_url, ssl_verify=ssl_verify,
-                                         ssl_cert=ssl_cert, http_auth=http_auth, timeout=timeout)
-        self.repos = ReposAPISection(base_url=self.__aptly_server_url, ssl_verify=ssl_verify,
-                                     ssl_cert=ssl_cert, http_auth=http_auth, timeout=timeout)
-        self.snapshots = SnapshotAPISection(base_url=self.__aptly_server_url, ssl_verify=ssl_verify,
-                                            ssl_cert=ssl_cert, http_auth=http_auth, timeout=timeout)
-        self.mirrors = MirrorsAPISection(base_url=self.__aptly_server_url, ssl_verify=ssl_verify,
-                                         ssl_cert=ssl_cert, http_auth=http_auth, timeout=timeout)
+        # all API sections share one keep-alive connection pool
+        self.session = make_session(pool_size=pool_size)
+
+        self.cache = cache
+        # one token bucket for all uploads, so parallel uploads share the bandwidth instead of multiplying it
+        self.upload_rate_limiter = RateLimiter(upload_rate_limit) if upload_rate_limit is not None else None
+        self.instrumentation = instrumentation if instrumentation is not None else RequestInstrumentation()
+
+        section_args = {
+            "base_url": self.__aptly_server_url,
+            "ssl_verify": ssl_verify,
+            "ssl_cert": ssl_cert,
+            "http_auth": http_auth,
+            "timeout": timeout,
+            "session": self.session,
+            "retry": retry,
+            "instrumentation": self.instrumentation,
+            # opt-in read-through cache for GET requests, shared by all sections so mutations invalidate it
+            "cache": cache,
+            # persistent package details by key, consulted by packages.show() and detailed listings
+            "package_store": package_store,
+            # decodes response bodies, orjson if it's installed and the standard library otherwise
+            "json_decoder": json_decoder if json_decoder is not None else default_json_decoder(),
+        }  # type: Dict[str, Any]
+        self.files = FilesAPISection(rate_limiter=self.upload_rate_limiter, **section_args)
+        self.misc = MiscAPISection(**section_args)
+        self.packages = PackageAPISection(**section_args)
+        self.publish = PublishAPISection(**section_args)
+        self.repos = ReposAPISection(**section_args)
+        self.snapshots = SnapshotAPISection(package_cache=snapshot_cache, **section_args)
+        self.mirrors = MirrorsAPISection(**section_args)
+
+    def stats(self) -> Dict[str, EndpointStats]:
+        """
+        :return: per-endpoint request counts and latency percentiles, see ``RequestInstrumentation.stats()``
+        """
+        return self.instrumentation.stats()
 
     @property
     def aptly_server_url(self) -> str:
         return self.__aptly_server_url
 
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> "Client":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
     def __repr__(self) -> str:
         return "Client (Aptly API Client) <%s>" % self.aptly_server_url
@@ -0,0 +1,171 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import hashlib
+import os
+import tarfile
+from typing import Dict, BinaryIO, Tuple, Optional, List, cast  # noqa: F401
+
+from aptly_api.base import AptlyAPIException, STREAM_CHUNK_SIZE
+
+_AR_MAGIC = b"!<arch>\n"
+_AR_HEADER_SIZE = 60
+
+
+def parse_control(text: str) -> Dict[str, str]:
+    """
+    Parses a single deb822 paragraph like a DEBIAN/control file. Continuation lines are joined with newlines, as
+    aptly does in its package details.
+    """
+    fields = {}  # type: Dict[str, str]
+    current = None  # type: Optional[str]
+    for line in text.splitlines():
+        if not line.strip():
+            if fields:
+                break
+            continue
+        if line[0] in " \t":
+            if current is not None:
+                fields[current] += "\n" + line
+            continue
+        name, sep, value = line.partition(":")
+        if not sep:
+            raise AptlyAPIException("Invalid control file line: %s" % line)
+        current = name.strip()
+        fields[current] = value.strip()
+    return fields
+
+
+class _MemberReader:
+    # exposes a single ar member as a forward-only file, so tarfile can decompress it in stream mode
+    def __init__(self, fh: BinaryIO, size: int) -> None:
+        self.fh = fh
+        self.remaining = size
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fh.read(size)
+        self.remaining -= len(data)
+        return data
+
+
+def _zstd_reader(fileobj: BinaryIO, path: str) -> BinaryIO:
+    # control.tar.zst is the default on Ubuntu since 21.10, Python only decompresses zstd since 3.14
+    try:
+        from compression import zstd
+        return cast(BinaryIO, zstd.ZstdFile(fileobj))
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise AptlyAPIException("%s uses zstd compression, which requires Python 3.14 or the zstandard module"
+                                % path)
+    return cast(BinaryIO, zstandard.ZstdDecompressor().stream_reader(fileobj))
+
+
+def read_deb_control(path: str) -> Dict[str, str]:
+    """
+    Reads the control fields of the Debian binary package at ``path``. Only the ar headers and the control
+    member are read, the (usually much larger) data member is never touched. Control members compressed with
+    zstd require Python 3.14 or the ``zstandard`` module.
+    """
+    with open(path, "rb") as fh:
+        if fh.read(len(_AR_MAGIC)) != _AR_MAGIC:
+            raise AptlyAPIException("%s is not a Debian binary package" % path)
+        while True:
+            header = fh.read(_AR_HEADER_SIZE)
+            if len(header) < _AR_HEADER_SIZE:
+                raise AptlyAPIException("%s doesn't contain a control member" % path)
+            name = header[:16].decode("ascii").strip().rstrip("/")
+            size = int(header[48:58].decode("ascii").strip())
+            if name.startswith("control.tar"):
+                compressed = cast(BinaryIO, _MemberReader(fh, size))
+                if name.endswith(".zst"):
+                    compressed = _zstd_reader(compressed, path)
+                with tarfile.open(fileobj=compressed, mode="r|*") as tar:
+                    for member in tar:
+                        if member.name in ("./control", "control"):
+                            extracted = tar.extractfile(member)
+                            if extracted is not None:
+                                return parse_control(extracted.read().decode("utf-8"))
+                raise AptlyAPIException("%s doesn't contain a control file" % path)
+            # members are padded to an even size
+            fh.seek(size + size % 2, 1)
+
+
+def strip_signature(text: str) -> str:
+    """
+    Removes the OpenPGP cleartext signature framing from signed ``.dsc`` and ``.changes`` files.
+    """
+    lines = text.splitlines()
+    if not lines or lines[0] != "-----BEGIN PGP SIGNED MESSAGE-----":
+        return text
+    start = lines.index("", 1) + 1 if "" in lines[1:] else 1
+    end = lines.index("-----BEGIN PGP SIGNATURE-----") if "-----BEGIN PGP SIGNATURE-----" in lines else len(lines)
+    return "\n".join(lines[start:end])
+
+
+def read_control_file(path: str) -> Dict[str, str]:
+    """
+    Reads the fields of a (possibly signed) ``.dsc`` or ``.changes`` file.
+    """
+    with open(path, "rt", encoding="utf-8") as fh:
+        return parse_control(strip_signature(fh.read()))
+
+
+def short_key(fields: Dict[str, str]) -> str:
+    """
+    :return: the aptly short key (``P<arch> <name> <version>``) of the package described by ``fields``
+    """
+    return "P%s %s %s" % (fields["Architecture"], fields["Package"], fields["Version"])
+
+
+def _changes_keys(fields: Dict[str, str]) -> List[str]:
+    version = fields["Version"]
+    # file names don't include the epoch, but package keys do
+    epoch = version.split(":", 1)[0] + ":" if ":" in version else ""
+    keys = []
+    for line in fields.get("Files", "").splitlines():
+        parts = line.split()
+        if not parts:
+            continue
+        filename = parts[-1]
+        if filename.endswith(".dsc"):
+            keys.append("Psource %s %s" % (fields["Source"], version))
+        elif filename.endswith((".deb", ".udeb")):
+            name, fileversion, arch = os.path.splitext(filename)[0].split("_")
+            keys.append("P%s %s %s" % (arch, name, epoch + fileversion))
+    return keys
+
+
+def package_keys(path: str) -> List[str]:
+    """
+    Computes the aptly short keys of the packages in the file at ``path`` without uploading it. Debian binary
+    packages (``.deb``, ``.udeb``) and source packages (``.dsc``) contain one package, ``.changes`` files list
+    the keys of all binary and source packages they describe.
+    """
+    if path.endswith((".deb", ".udeb")):
+        return [short_key(read_deb_control(path))]
+    elif path.endswith(".dsc"):
+        fields = read_control_file(path)
+        return ["Psource %s %s" % (fields["Source"], fields["Version"])]
+    elif path.endswith(".changes"):
+        return _changes_keys(read_control_file(path))
+    raise AptlyAPIException("Can't compute the package keys of %s" % path)
+
+
+def file_digest(path: str) -> Tuple[int, str]:
+    """
+    :return: the size and the hex SHA256 digest of the file at ``path``
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(STREAM_CHUNK_SIZE), b""):
+            digest.update(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest()
@@ -0,0 +1,168 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import functools
+import re
+from typing import Tuple, List, Dict, Iterable  # noqa: F401
+
+from aptly_api.base import AptlyAPIException
+
+VERSION_KEY_CACHE_SIZE = 1 << 17
+
+_PARTS = re.compile(r"([^0-9]*)([0-9]*)")
+
+VersionKey = Tuple[int, Tuple[int, ...], Tuple[int, ...]]
+
+
+def split_version(version: str) -> Tuple[int, str, str]:
+    """
+    Splits a Debian version into its epoch, upstream version and revision. A missing epoch is 0 and a missing
+    revision is the empty string, which is how dpkg treats them when comparing.
+    """
+    epoch = 0
+    upstream = version.strip()
+    if ":" in upstream:
+        e, upstream = upstream.split(":", 1)
+        try:
+            epoch = int(e)
+        except ValueError:
+            raise AptlyAPIException("Invalid epoch in Debian version: %s" % version)
+    revision = ""
+    if "-" in upstream:
+        upstream, revision = upstream.rsplit("-", 1)
+    return epoch, upstream, revision
+
+
+def _isdigit(c: str) -> bool:
+    return "0" <= c <= "9"
+
+
+def _order(c: str) -> int:
+    # the weight dpkg gives a character in the non-digit parts of a version
+    if c == "~":
+        return -1
+    elif c.isascii() and c.isalpha():
+        return ord(c)
+    return ord(c) + 256
+
+
+def _verrevcmp(a: str, b: str) -> int:
+    # a straight port of dpkg's verrevcmp() from lib/dpkg/version.c
+    i = j = 0
+    while i < len(a) or j < len(b):
+        first_diff = 0
+        while (i < len(a) and not _isdigit(a[i])) or (j < len(b) and not _isdigit(b[j])):
+            ac = _order(a[i]) if i < len(a) and not _isdigit(a[i]) else 0
+            bc = _order(b[j]) if j < len(b) and not _isdigit(b[j]) else 0
+            if ac != bc:
+                return ac - bc
+            i += 1
+            j += 1
+        while i < len(a) and a[i] == "0":
+            i += 1
+        while j < len(b) and b[j] == "0":
+            j += 1
+        while i < len(a) and _isdigit(a[i]) and j < len(b) and _isdigit(b[j]):
+            if not first_diff:
+                first_diff = ord(a[i]) - ord(b[j])
+            i += 1
+            j += 1
+        if i < len(a) and _isdigit(a[i]):
+            return 1
+        if j < len(b) and _isdigit(b[j]):
+            return -1
+        if first_diff:
+            return first_diff
+    return 0
+
+
+def compare_versions(a: str, b: str) -> int:
+    """
+    Compares two Debian versions the way ``dpkg --compare-versions`` does, one character at a time.
+
+    :return: a negative number if ``a`` is older than ``b``, 0 if they're equal and a positive number otherwise
+    """
+    ea, ua, ra = split_version(a)
+    eb, ub, rb = split_version(b)
+    if ea != eb:
+        return ea - eb
+    return _verrevcmp(ua, ub) or _verrevcmp(ra, rb)
+
+
+def _part_key(s: str) -> Tuple[int, ...]:
+    # Every non-digit part becomes the dpkg weights of its characters followed by 0, which is what dpkg compares
+    # the end of a part with, and every digit part becomes its numeric value. Because a non-digit part can only
+    # be empty at the start of a string, the trailing 0 makes the end of the string compare like dpkg does, too:
+    # after "1.0" anything but "~" sorts higher.
+    key = []  # type: List[int]
+    for m in _PARTS.finditer(s):
+        if not m.group(0) and key:
+            break
+        key.extend(_order(c) for c in m.group(1))
+        key.append(0)
+        key.append(int(m.group(2)) if m.group(2) else 0)
+    key.append(0)
+    return tuple(key)
+
+
+@functools.lru_cache(maxsize=VERSION_KEY_CACHE_SIZE)
+def version_key(version: str) -> VersionKey:
+    """
+    Computes a key for ``version`` that orders like ``compare_versions()``, so lists of versions can be sorted
+    with ``sorted(versions, key=version_key)``. Keys are memoized, as package lists tend to repeat versions.
+    """
+    epoch, upstream, revision = split_version(version)
+    return epoch, _part_key(upstream), _part_key(revision)
+
+
+def _split_key(key: str) -> List[str]:
+    parts = key.split(" ", 3)
+    if len(parts) < 3:
+        raise AptlyAPIException("Not an aptly package key: %s" % key)
+    return parts
+
+
+def package_version(key: str) -> str:
+    """
+    :return: the version from an aptly package key like ``Pamd64 name 1.0-1 deadbeef``
+    """
+    return _split_key(key)[2]
+
+
+def package_key_sort_key(key: str) -> Tuple[str, str, VersionKey]:
+    """
+    Sorts aptly package keys by name, then architecture and then version, oldest first.
+    """
+    parts = _split_key(key)
+    return parts[1], parts[0][1:], version_key(parts[2])
+
+
+def _grouped_by_package(keys: Iterable[str]) -> Dict[Tuple[str, str], List[str]]:
+    grouped = {}  # type: Dict[Tuple[str, str], List[str]]
+    for key in sorted(keys, key=package_key_sort_key):
+        grouped.setdefault(package_key_sort_key(key)[:2], []).append(key)
+    return grouped
+
+
+def newest_packages(keys: Iterable[str], keep: int = 1) -> List[str]:
+    """
+    :return: the keys of the ``keep`` newest versions of every package name and architecture in ``keys``, sorted
+             like ``package_key_sort_key``
+    """
+    ret = []  # type: List[str]
+    for versions in _grouped_by_package(keys).values():
+        ret.extend(versions[-keep:] if keep > 0 else [])
+    return ret
+
+
+def outdated_packages(keys: Iterable[str], keep: int = 1) -> List[str]:
+    """
+    :return: the keys that ``newest_packages()`` doesn't return, i.e. the versions that pruning to ``keep``
+             versions per package would remove
+    """
+    ret = []  # type: List[str]
+    for versions in _grouped_by_package(keys).values():
+        ret.extend(versions[:-keep] if keep > 0 else versions)
+    return ret
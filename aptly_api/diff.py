@@ -0,0 +1,130 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+from collections import Counter
+from typing import Dict, List, Tuple, Iterable, Iterator, Optional, Union, Sequence, Set, NamedTuple  # noqa: F401
+
+from aptly_api.parts.packages import Package
+
+PackageKeys = Iterable[Union[str, Package]]
+
+
+class DiffSummary(NamedTuple):
+    """
+    The number of entries of a snapshot diff. ``removed`` packages are only in the left snapshot, ``added`` packages
+    only in the right one and ``changed`` counts the entries that pair two versions of the same package.
+    """
+    removed: int
+    added: int
+    changed: int
+
+
+def _key_set(packages: PackageKeys) -> Set[str]:
+    return {pkg if isinstance(pkg, str) else pkg.key for pkg in packages}
+
+
+def _group(key: str) -> str:
+    # "P<arch> <name>", keys of the same package and architecture share it and sort next to each other
+    return key[:key.index(" ", key.index(" ") + 1)]
+
+
+def _walk(left: Set[str], right: Set[str]) -> Iterator[Tuple[Optional[str], Optional[str]]]:
+    # aptly walks both sorted reference lists in parallel and pairs the heads if they're versions of the same
+    # package. Only the keys that aren't in both lists can end up in the diff.
+    lo, ro = sorted(left - right), sorted(right - left)
+    il, ir, ll, lr = 0, 0, len(lo), len(ro)
+    while il < ll and ir < lr:
+        lkey, rkey = lo[il], ro[ir]
+        if _group(lkey) == _group(rkey):
+            yield lkey, rkey
+            il += 1
+            ir += 1
+        elif lkey < rkey:
+            yield lkey, None
+            il += 1
+        else:
+            yield None, rkey
+            ir += 1
+    for lkey in lo[il:]:
+        yield lkey, None
+    for rkey in ro[ir:]:
+        yield None, rkey
+
+
+def diff_packages(left: PackageKeys, right: PackageKeys,
+                  only_matching: bool = False) -> List[Dict[str, Optional[str]]]:
+    """
+    Computes the difference between two package lists like ``snapshots.diff()`` does on the server, as a list of
+    ``{"Left": key, "Right": key}`` entries in key order. Either side is ``None`` for a package that is only in
+    the other list.
+
+    The result equals aptly's as long as neither list holds several versions of the same package and
+    architecture. Otherwise aptly can pair a version that is in both lists with a different one, while this
+    only ever pairs versions that differ.
+
+    :param left: package keys or ``Package`` instances, e.g. the result of ``snapshots.list_packages()``
+    :param right: the same for the other side of the comparison
+    :param only_matching: only return the entries that pair two versions of the same package
+    """
+    return [{"Left": lkey, "Right": rkey} for lkey, rkey in _walk(_key_set(left), _key_set(right))
+            if not only_matching or (lkey is not None and rkey is not None)]
+
+
+def diff_summary(left: PackageKeys, right: PackageKeys) -> DiffSummary:
+    """
+    :return: the number of entries that ``diff_packages(left, right)`` would return, by kind
+    """
+    removed, added, changed = 0, 0, 0
+    for lkey, rkey in _walk(_key_set(left), _key_set(right)):
+        if rkey is None:
+            removed += 1
+        elif lkey is None:
+            added += 1
+        else:
+            changed += 1
+    return DiffSummary(removed, added, changed)
+
+
+def diff_matrix(package_lists: Sequence[PackageKeys]) -> List[List[DiffSummary]]:
+    """
+    Compares every package list to every other one. This makes one pass over all package keys, so it's much
+    cheaper than ``N * N`` calls to ``diff_summary()``.
+
+    :return: ``matrix[i][j] == diff_summary(package_lists[i], package_lists[j])``
+    """
+    count = len(package_lists)
+    # which of the lists contain each key
+    masks = {}  # type: Dict[str, int]
+    for ix, packages in enumerate(package_lists):
+        bit = 1 << ix
+        for key in _key_set(packages):
+            masks[key] = masks.get(key, 0) | bit
+
+    # diff entries never pair versions of different packages, so each package can be compared on its own. A
+    # package that's identical in all lists contributes nothing and packages whose versions are spread over the
+    # lists in the same way contribute the same, so each distinct spread only needs to be compared once.
+    groups = {}  # type: Dict[str, List[int]]
+    for key, mask in masks.items():
+        groups.setdefault(_group(key), []).append(mask)
+    everywhere = (1 << count) - 1
+    spreads = Counter(tuple(sorted(group)) for group in groups.values() if group != [everywhere])
+
+    counts = [[[0, 0, 0] for _ in range(count)] for _ in range(count)]
+    for spread, times in spreads.items():
+        for i in range(count):
+            ibit = 1 << i
+            for j in range(i + 1, count):
+                jbit = 1 << j
+                lonly = sum(1 for mask in spread if mask & ibit and not mask & jbit)
+                ronly = sum(1 for mask in spread if mask & jbit and not mask & ibit)
+                if not lonly and not ronly:
+                    continue
+                # versions of the same package pair up in key order until one of the lists runs out of them
+                paired = min(lonly, ronly)
+                for cell, removed, added in ((counts[i][j], lonly, ronly), (counts[j][i], ronly, lonly)):
+                    cell[0] += (removed - paired) * times
+                    cell[1] += (added - paired) * times
+                    cell[2] += paired * times
+    return [[DiffSummary(*cell) for cell in row] for row in counts]
@@ -0,0 +1,131 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import itertools
+from typing import Dict, List, Tuple, Iterable, Iterator, Optional, Union, Any, Set  # noqa: F401
+
+from aptly_api.debversion import version_key
+from aptly_api.parts.packages import Package
+
+
+def source_name(pkg: Package) -> str:
+    """
+    :return: the name of the source package that ``pkg`` was built from. This needs the package's fields, without
+             them (e.g. for a listing that only returned keys) a binary package's own name is assumed, which is
+             what Debian does when a package has no ``Source`` field.
+    """
+    if pkg.fields is not None and pkg.fields.get("Source"):
+        # "Source" may carry a version when it differs from the binary's, e.g. "openssl (1.1.1n-0+deb11u3)"
+        return pkg.fields["Source"].split(" ", 1)[0]
+    return pkg.parsed_key.name
+
+
+def _newest(packages: Iterable[Package]) -> Package:
+    return max(packages, key=lambda pkg: version_key(pkg.parsed_key.version))
+
+
+class PackageIndex:
+    """
+    Indexes a package listing in one pass for constant time lookups by key, by name, by name and architecture and
+    by source package. Indexes can be combined with the set operators ``|``, ``&``, ``-`` and ``^``, which compare
+    packages by their key.
+
+    :param packages: e.g. the result of ``repos.search_packages()`` or ``snapshots.list_packages()``. Repeated
+                     keys are only indexed once.
+    """
+    def __init__(self, packages: Iterable[Package] = ()) -> None:
+        self._by_key = {}  # type: Dict[str, Package]
+        self._by_name = {}  # type: Dict[str, List[Package]]
+        self._by_name_arch = {}  # type: Dict[Tuple[str, str], List[Package]]
+        self._by_source = {}  # type: Dict[str, List[Package]]
+        for pkg in packages:
+            self.add(pkg)
+
+    def add(self, pkg: Package) -> None:
+        if pkg.key in self._by_key:
+            return
+        self._by_key[pkg.key] = pkg
+        parsed = pkg.parsed_key
+        self._by_name.setdefault(parsed.name, []).append(pkg)
+        self._by_name_arch.setdefault((parsed.name, parsed.arch), []).append(pkg)
+        self._by_source.setdefault(source_name(pkg), []).append(pkg)
+
+    def __len__(self) -> int:
+        return len(self._by_key)
+
+    def __iter__(self) -> Iterator[Package]:
+        return iter(self._by_key.values())
+
+    def __contains__(self, item: Union[str, Package]) -> bool:
+        return (item if isinstance(item, str) else item.key) in self._by_key
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, PackageIndex):
+            return NotImplemented
+        return self._by_key.keys() == other._by_key.keys()
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self) -> str:
+        return "PackageIndex(<%s packages>)" % len(self)
+
+    def keys(self) -> Set[str]:
+        return set(self._by_key)
+
+    def get(self, key: str) -> Optional[Package]:
+        return self._by_key.get(key)
+
+    def names(self) -> List[str]:
+        return list(self._by_name)
+
+    def by_name(self, name: str) -> List[Package]:
+        """
+        :return: all versions of the package ``name`` on all architectures
+        """
+        return list(self._by_name.get(name, []))
+
+    def by_name_arch(self, name: str, arch: str) -> List[Package]:
+        return list(self._by_name_arch.get((name, arch), []))
+
+    def by_source(self, source: str) -> List[Package]:
+        """
+        :return: the source package ``source`` and all binary packages built from it, see ``source_name()``
+        """
+        return list(self._by_source.get(source, []))
+
+    def latest(self, name: str, arch: str) -> Optional[Package]:
+        """
+        :return: the newest version of ``name`` on ``arch`` according to dpkg's version ordering
+        """
+        versions = self._by_name_arch.get((name, arch))
+        if not versions:
+            return None
+        return _newest(versions)
+
+    def latest_per_package(self) -> List[Package]:
+        """
+        :return: the newest version of every package name and architecture
+        """
+        return [_newest(versions) for versions in self._by_name_arch.values()]
+
+    def _new(self, packages: Iterable[Package]) -> "PackageIndex":
+        return type(self)(packages)
+
+    def __or__(self, other: "PackageIndex") -> "PackageIndex":
+        return self._new(itertools.chain(self, other))
+
+    def __and__(self, other: "PackageIndex") -> "PackageIndex":
+        return self._new(pkg for pkg in self if pkg.key in other._by_key)
+
+    def __sub__(self, other: "PackageIndex") -> "PackageIndex":
+        return self._new(pkg for pkg in self if pkg.key not in other._by_key)
+
+    def __xor__(self, other: "PackageIndex") -> "PackageIndex":
+        return (self - other) | (other - self)
+
+    union = __or__
+    intersection = __and__
+    difference = __sub__
+    symmetric_difference = __xor__
@@ -0,0 +1,185 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import bisect
+import math
+import threading
+from collections import deque
+from typing import NamedTuple, Optional, Callable, List, Dict, Sequence, Tuple, Deque  # noqa: F401
+
+RequestRecord = NamedTuple('RequestRecord', [
+    ('method', str),
+    ('url_template', str),
+    ('url', str),
+    ('status_code', Optional[int]),
+    ('duration', float),
+    ('time_to_first_byte', Optional[float]),
+    ('request_bytes', Optional[int]),
+    ('response_bytes', Optional[int]),
+    ('retries', int),
+    ('error', Optional[str]),
+])
+
+EndpointStats = NamedTuple('EndpointStats', [
+    ('method', str),
+    ('url_template', str),
+    ('count', int),
+    ('errors', int),
+    ('retries', int),
+    ('total_time', float),
+    ('p50', float),
+    ('p95', float),
+    ('p99', float),
+    # cumulative counts of requests that took at most "bound" seconds, the last bound is float("inf")
+    ('histogram', Sequence[Tuple[float, int]]),
+])
+
+RequestSink = Callable[[RequestRecord], None]
+
+# the aptly API endpoints used by this library. Path segments in braces match any value.
+ENDPOINT_TEMPLATES = [
+    "api/version",
+    "api/files",
+    "api/files/{dir}",
+    "api/files/{dir}/{file}",
+    "api/packages/{key}",
+    "api/repos",
+    "api/repos/{name}",
+    "api/repos/{name}/packages",
+    "api/repos/{name}/snapshots",
+    "api/repos/{name}/file/{dir}",
+    "api/repos/{name}/file/{dir}/{file}",
+    "api/repos/{name}/include/{dir}",
+    "api/repos/{name}/include/{dir}/{file}",
+    "api/mirrors",
+    "api/mirrors/{name}",
+    "api/mirrors/{name}/packages",
+    "api/mirrors/{name}/snapshots",
+    "api/snapshots",
+    "api/snapshots/{name}",
+    "api/snapshots/{name}/packages",
+    "api/snapshots/{name}/diff/{other}",
+    "api/publish",
+    "api/publish/{prefix}",
+    "api/publish/{prefix}/{distribution}",
+]
+
+HISTOGRAM_BOUNDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+_templates_by_length = {}  # type: Dict[int, List[Tuple[int, List[str], str]]]
+for _template in ENDPOINT_TEMPLATES:
+    _segments = _template.split("/")
+    _templates_by_length.setdefault(len(_segments), []).append(
+        (sum(1 for s in _segments if not s.startswith("{")), _segments, _template)
+    )
+for _candidates in _templates_by_length.values():
+    # prefer the most specific template, i.e. the one with the most literal segments
+    _candidates.sort(key=lambda c: -c[0])
+
+
+def url_template(urlpath: str) -> str:
+    """
+    Maps an expanded API path like ``api/repos/myrepo/packages`` to its endpoint template
+    ``api/repos/{name}/packages``. Unknown paths are returned unchanged.
+    """
+    segments = urlpath.split("?", 1)[0].strip("/").split("/")
+    for _, template_segments, template in _templates_by_length.get(len(segments), []):
+        for segment, template_segment in zip(segments, template_segments):
+            if segment != template_segment and not template_segment.startswith("{"):
+                break
+        else:
+            return template
+    return urlpath
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    # nearest-rank method
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class _EndpointCollector:
+    def __init__(self, sample_size: int) -> None:
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_time = 0.0
+        self.samples = deque(maxlen=sample_size)  # type: Deque[float]
+        self.buckets = [0] * len(HISTOGRAM_BOUNDS)
+
+    def add(self, record: RequestRecord) -> None:
+        self.count += 1
+        self.retries += record.retries
+        if record.error is not None:
+            self.errors += 1
+        self.total_time += record.duration
+        self.samples.append(record.duration)
+        self.buckets[bisect.bisect_left(HISTOGRAM_BOUNDS, record.duration)] += 1
+
+
+class RequestInstrumentation:
+    """
+    Receives a ``RequestRecord`` for every request made by the API sections it has been passed to and forwards
+    it to any number of sinks, e.g. an exporter for your metrics system. It also aggregates per-endpoint counts
+    and latency percentiles, which are available through ``stats()``. Percentiles are computed over the most
+    recent ``sample_size`` requests of each endpoint.
+
+    Example:
+
+    .. code-block:: python
+        client = Client("http://aptly/")
+        client.instrumentation.add_sink(lambda record: statsd.timing(record.url_template, record.duration))
+        ...
+        for stats in client.stats().values():
+            print(stats.method, stats.url_template, stats.count, stats.p95)
+    """
+    def __init__(self, sinks: Optional[Sequence[RequestSink]] = None, sample_size: int = 10000) -> None:
+        self.sinks = list(sinks) if sinks is not None else []  # type: List[RequestSink]
+        self.sample_size = sample_size
+        self._lock = threading.Lock()
+        self._endpoints = {}  # type: Dict[Tuple[str, str], _EndpointCollector]
+
+    def add_sink(self, sink: RequestSink) -> None:
+        self.sinks.append(sink)
+
+    def record(self, record: RequestRecord) -> None:
+        with self._lock:
+            key = (record.method, record.url_template)
+            if key not in self._endpoints:
+                self._endpoints[key] = _EndpointCollector(self.sample_size)
+            self._endpoints[key].add(record)
+
+        for sink in self.sinks:
+            sink(record)
+
+    def stats(self) -> Dict[str, EndpointStats]:
+        """
+        :return: a dict mapping "<METHOD> <url template>" to the aggregated statistics of that endpoint
+        """
+        ret = {}
+        with self._lock:
+            for (method, template), collector in self._endpoints.items():
+                ordered = sorted(collector.samples)
+                cumulative = 0
+                histogram = []
+                for bound, bucket in zip(HISTOGRAM_BOUNDS, collector.buckets):
+                    cumulative += bucket
+                    histogram.append((bound, cumulative))
+                ret["%s %s" % (method, template)] = EndpointStats(
+                    method=method,
+                    url_template=template,
+                    count=collector.count,
+                    errors=collector.errors,
+                    retries=collector.retries,
+                    total_time=collector.total_time,
+                    p50=_percentile(ordered, 0.50),
+                    p95=_percentile(ordered, 0.95),
+                    p99=_percentile(ordered, 0.99),
+                    histogram=histogram,
+                )
+        return ret
+
+    def reset(self) -> None:
+        with self._lock:
+            self._endpoints.clear()
@@ -0,0 +1,263 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import json
+import re
+from typing import Any, List, Iterable, Iterator, Match, Callable, Tuple, cast
+
+JSONDecoder = Callable[[bytes], Any]
+_BytesMatch = Match[bytes]
+
+_raw_whitespace = re.compile(rb"[ \t\n\r]*")
+_raw_string = rb'"[^"\\]*(?:\\.[^"\\]*)*"'
+# an object without nested objects or arrays, like aptly's package details, is matched in one go. The patterns
+# are "unrolled loops" that never backtrack more than a single step.
+_raw_flat_object = re.compile(rb'\{[^"{}\[\]]*(?:' + _raw_string + rb'[^"{}\[\]]*)*\}', re.S)
+_raw_token = re.compile(_raw_string + rb'|[\[\]{}]', re.S)
+_raw_scalar = re.compile(_raw_string + rb'|[^,\] \t\n\r]+', re.S)
+_raw_separator = re.compile(rb"[ \t\n\r]*([,\]]?)[ \t\n\r]*")
+_raw_fast_value = re.compile(_raw_flat_object.pattern + rb"|" + _raw_string, re.S)
+# the parts of an element that JSONArrayParser skips while it's delimiting the element
+_raw_string_part = re.compile(rb'[^"\\]*')
+_raw_structure_part = re.compile(rb'[^"{}\[\]]*')
+_raw_scalar_part = re.compile(rb'[^,\] \t\n\r]*')
+
+_EXPECT_START = 0
+_EXPECT_FIRST_VALUE = 1
+_EXPECT_VALUE = 2
+_EXPECT_SEPARATOR = 3
+_DONE = 4
+
+
+def default_json_decoder() -> JSONDecoder:
+    """
+    :return: ``orjson.loads`` if the optional ``orjson`` package is installed, otherwise the standard library's
+             ``json.loads``. Both decode UTF-8 encoded bytes directly.
+    """
+    try:
+        import orjson
+    except ImportError:
+        return json.loads
+    return cast(JSONDecoder, orjson.loads)
+
+
+class JSONArrayParser:
+    """
+    Incrementally parses a JSON array that arrives in arbitrarily split chunks of UTF-8 encoded bytes, returning
+    each element as soon as it is complete. Only the current, incomplete element is buffered, so memory use is
+    bounded by the largest element instead of the size of the whole document.
+
+    Elements are only delimited while they arrive. The chunks of an element are joined and decoded once it's
+    complete, so a large element that spans many chunks costs linear time.
+
+    :param decoder: decodes the bytes of each element, see ``BaseAPIClient.json_decoder``
+    """
+    def __init__(self, decoder: JSONDecoder = json.loads) -> None:
+        self._decoder = decoder
+        self._state = _EXPECT_START
+        self._offset = 0
+        # the chunks of the current element, which is complete once it's back at nesting depth 0
+        self._parts = []  # type: List[bytes]
+        self._scalar = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, data: bytes) -> List[Any]:
+        items = self._parse(bytes(data))
+        self._offset += len(data)
+        return items
+
+    def close(self) -> None:
+        """
+        Signals the end of the input. Elements are always complete once the following ',' or ']' has been fed, so
+        this only validates that the array was properly terminated.
+        """
+        if self._state != _DONE:
+            raise ValueError("Truncated JSON array")
+
+    def _parse(self, data: bytes) -> List[Any]:
+        items = []  # type: List[Any]
+        pos, size = 0, len(data)
+        while True:
+            if self._parts:
+                end = self._scan(data, pos)
+                if end < 0:
+                    self._parts.append(data[pos:])
+                    return items
+                self._parts.append(data[pos:end])
+                items.append(self._decoder(b"".join(self._parts)))
+                self._parts = []
+                pos = end
+                continue
+
+            pos = cast(_BytesMatch, _raw_whitespace.match(data, pos)).end()
+            if pos >= size:
+                return items
+
+            char = data[pos:pos + 1]
+            if self._state == _EXPECT_START:
+                if char != b"[":
+                    raise ValueError("Expected a JSON array at position %s" % (self._offset + pos))
+                pos += 1
+                self._state = _EXPECT_FIRST_VALUE
+            elif self._state == _EXPECT_FIRST_VALUE and char == b"]":
+                pos += 1
+                self._state = _DONE
+            elif self._state in (_EXPECT_FIRST_VALUE, _EXPECT_VALUE):
+                if char in (b",", b"]"):
+                    raise ValueError("Expected a JSON value at position %s" % (self._offset + pos))
+                start = pos
+                end, pos = self._complete_run(data, pos)
+                if end > start:
+                    # the elements that are complete in this chunk are decoded in one go
+                    items.extend(self._decoder(b"[" + data[start:end] + b"]"))
+                    continue
+                self._state = _EXPECT_SEPARATOR
+                self._scalar = char not in (b"{", b"[", b'"')
+                self._depth = 0
+                self._in_string = self._escaped = False
+                end = self._scan(data, pos)
+                if end < 0:
+                    self._parts = [data[pos:]]
+                    return items
+                items.append(self._decoder(data[pos:end]))
+                pos = end
+            elif self._state == _EXPECT_SEPARATOR:
+                if char == b",":
+                    self._state = _EXPECT_VALUE
+                elif char == b"]":
+                    self._state = _DONE
+                else:
+                    raise ValueError("Expected ',' or ']' at position %s" % (self._offset + pos))
+                pos += 1
+            else:
+                raise ValueError("Unexpected data after the end of the JSON array")
+
+    def _complete_run(self, data: bytes, pos: int) -> Tuple[int, int]:
+        """
+        Skips the elements from ``pos`` on that are complete in ``data``, as long as they're flat objects or strings
+        like the elements of aptly's listings.
+
+        :return: the end of the last complete element and the position to continue at
+        """
+        end = pos
+        while True:
+            m = _raw_fast_value.match(data, pos)
+            if m is None:
+                return end, pos
+            end = pos = m.end()
+            self._state = _EXPECT_SEPARATOR
+            sep = cast(_BytesMatch, _raw_separator.match(data, end))
+            if sep.group(1) == b",":
+                self._state = _EXPECT_VALUE
+            elif sep.group(1) == b"]":
+                self._state = _DONE
+            else:
+                # more data or an error, which is reported by _parse()
+                return end, pos
+            pos = sep.end()
+            if self._state == _DONE or pos >= len(data):
+                return end, pos
+
+    def _scan(self, data: bytes, pos: int) -> int:
+        """
+        Continues delimiting the current element at ``pos``.
+
+        :return: the end of the element in ``data``, or -1 if it continues in the next chunk
+        """
+        size = len(data)
+        if self._scalar:
+            # a number or literal ends at the next separator, e.g. "1" may still be followed by ".5"
+            end = cast(_BytesMatch, _raw_scalar_part.match(data, pos)).end()
+            return end if end < size else -1
+        while pos < size:
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                    pos += 1
+                    continue
+                pos = cast(_BytesMatch, _raw_string_part.match(data, pos)).end()
+                if pos >= size:
+                    break
+                if data[pos] == 0x5c:  # a backslash escapes the next byte
+                    self._escaped = True
+                else:
+                    self._in_string = False
+                    if self._depth == 0:
+                        return pos + 1
+            else:
+                pos = cast(_BytesMatch, _raw_structure_part.match(data, pos)).end()
+                if pos >= size:
+                    break
+                char = data[pos]
+                if char == 0x22:  # '"'
+                    self._in_string = True
+                elif char in (0x7b, 0x5b):  # '{' and '['
+                    self._depth += 1
+                else:
+                    self._depth -= 1
+                    if self._depth <= 0:
+                        return pos + 1
+            pos += 1
+        return -1
+
+
+def iter_json_array(chunks: Iterable[bytes], decoder: JSONDecoder = json.loads) -> Iterator[Any]:
+    """
+    Yields the elements of a JSON array from an iterable of byte chunks, e.g. ``Response.iter_content()``.
+
+    :param decoder: decodes the bytes of each element, see ``BaseAPIClient.json_decoder``
+    """
+    parser = JSONArrayParser(decoder)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    parser.close()
+
+
+def _raw_value_end(data: bytes, pos: int) -> int:
+    m = _raw_flat_object.match(data, pos)
+    if m is not None:
+        return m.end()
+    if data[pos:pos + 1] in (b"{", b"["):
+        depth = 0
+        for m in _raw_token.finditer(data, pos):
+            if m.group(0) in (b"{", b"["):
+                depth += 1
+            elif m.group(0) in (b"}", b"]"):
+                depth -= 1
+                if depth == 0:
+                    return m.end()
+        raise ValueError("Truncated JSON array")
+    m = _raw_scalar.match(data, pos)
+    if m is None:
+        raise ValueError("Expected a JSON value at position %s" % pos)
+    return m.end()
+
+
+def iter_raw_array(data: bytes) -> Iterator[bytes]:
+    """
+    Yields the undecoded bytes of each element of the JSON array in ``data``. Elements are only delimited, not
+    validated, so a malformed element raises an exception when it's decoded instead.
+    """
+    # all of these patterns can match the empty string, so match() never returns None
+    pos = cast(_BytesMatch, _raw_whitespace.match(data)).end()
+    if data[pos:pos + 1] != b"[":
+        raise ValueError("Expected a JSON array at position %s" % pos)
+    pos = cast(_BytesMatch, _raw_whitespace.match(data, pos + 1)).end()
+    if data[pos:pos + 1] == b"]":
+        pos = cast(_BytesMatch, _raw_whitespace.match(data, pos + 1)).end()
+    else:
+        while True:
+            end = _raw_value_end(data, pos)
+            yield data[pos:end]
+            sep = cast(_BytesMatch, _raw_separator.match(data, end))
+            pos = sep.end()
+            if sep.group(1) == b"]":
+                break
+            elif sep.group(1) != b",":
+                raise ValueError("Expected ',' or ']' at position %s" % pos)
+    if pos != len(data):
+        raise ValueError("Unexpected data after the end of the JSON array")
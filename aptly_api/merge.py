@@ -0,0 +1,63 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import itertools
+from typing import Dict, List, Tuple, Iterable, Sequence, Set  # noqa: F401
+
+from aptly_api.index import PackageIndex
+from aptly_api.parts.packages import Package
+
+
+def _name_arch(pkg: Package) -> Tuple[str, str]:
+    return pkg.parsed_key.name, pkg.parsed_key.arch
+
+
+def merge_packages(package_lists: Sequence[Iterable[Package]], latest: bool = False,
+                   no_remove: bool = False) -> List[Package]:
+    """
+    Merges package lists from left to right like ``aptly snapshot merge``.
+
+    :param package_lists: e.g. the results of ``snapshots.list_packages()`` for each source snapshot
+    :param latest: keep only the newest version of each package and architecture out of all lists
+    :param no_remove: keep all versions of all packages. By default, a package in a list replaces all versions of
+                      the same package and architecture from the lists before it.
+    :return: the merged packages
+    """
+    if latest:
+        return PackageIndex(itertools.chain(*package_lists)).latest_per_package()
+    if no_remove:
+        return list(PackageIndex(itertools.chain(*package_lists)))
+
+    merged = {}  # type: Dict[Tuple[str, str], Dict[str, Package]]
+    for packages in package_lists:
+        replaced = set()  # type: Set[Tuple[str, str]]
+        for pkg in packages:
+            name_arch = _name_arch(pkg)
+            if name_arch not in replaced:
+                merged[name_arch] = {}
+                replaced.add(name_arch)
+            merged[name_arch][pkg.key] = pkg
+    return [pkg for versions in merged.values() for pkg in versions.values()]
+
+
+def pull_packages(packages: Iterable[Package], pulled: Iterable[Package], no_remove: bool = False,
+                  all_matches: bool = False) -> List[Package]:
+    """
+    Adds ``pulled`` to ``packages`` like ``aptly snapshot pull``.
+
+    :param packages: the packages to pull into
+    :param pulled: the packages to add, e.g. the packages that a query matched, with their dependencies
+    :param no_remove: keep the other versions of the pulled packages. By default, they're removed.
+    :param all_matches: pull all versions in ``pulled``, not just the newest of each package and architecture
+    :return: the resulting packages
+    """
+    incoming = PackageIndex(pulled)
+    if not all_matches:
+        incoming = PackageIndex(incoming.latest_per_package())
+    if no_remove:
+        return list(PackageIndex(packages) | incoming)
+    replaced = {_name_arch(pkg) for pkg in incoming}
+    return list(PackageIndex(itertools.chain((pkg for pkg in packages if _name_arch(pkg) not in replaced),
+                                             incoming)))
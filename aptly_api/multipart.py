@@ -0,0 +1,280 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import io
+import os
+import time
+import uuid
+from typing import Sequence, Tuple, List, Optional, Iterator, Iterable, BinaryIO, Union, Dict, cast  # noqa: F401
+
+from aptly_api.base import STREAM_CHUNK_SIZE
+from aptly_api.transfer import TransferMeter, RateLimiter
+
+UploadSource = Union[bytes, bytearray, memoryview, BinaryIO, Iterable[bytes]]
+# a file to upload is either a path or a (file name, contents) tuple
+UploadFile = Union[str, Tuple[str, UploadSource]]
+
+
+def upload_name(f: UploadFile) -> str:
+    return f if isinstance(f, str) else f[0]
+
+
+def upload_size(f: UploadFile) -> Optional[int]:
+    """
+    :return: the number of bytes ``f`` contains, or None if that can't be known before it has been read
+    """
+    if isinstance(f, str):
+        return os.path.getsize(f)
+    return _make_source(f[1]).size
+
+
+def _quote(value: str) -> str:
+    # the WHATWG/HTML5 encoding for form-data field names and filenames, as used by urllib3
+    return value.replace("\\", "\\\\").replace('"', "%22").replace("\r", "%0D").replace("\n", "%0A")
+
+
+class _Source:
+    size = None  # type: Optional[int]
+
+    def read(self, size: int) -> bytes:
+        raise NotImplementedError()  # pragma: no cover
+
+    def rewind(self) -> None:
+        raise NotImplementedError()  # pragma: no cover
+
+    def close(self) -> None:
+        pass
+
+
+class _FileSource(_Source):
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.fh = None  # type: Optional[BinaryIO]
+
+    def read(self, size: int) -> bytes:
+        if self.fh is None:
+            # only one file is open at any time, no matter how many are being uploaded
+            self.fh = open(self.path, "rb")
+        return self.fh.read(size)
+
+    def rewind(self) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self.fh is not None:
+            self.fh.close()
+        self.fh = None
+
+
+class _BufferSource(_Source):
+    def __init__(self, buffer: Union[bytes, bytearray, memoryview]) -> None:
+        # slicing a memoryview doesn't copy the underlying buffer
+        self.view = memoryview(buffer).cast("B")
+        self.size = len(self.view)
+        self.position = 0
+
+    def read(self, size: int) -> bytes:
+        data = self.view[self.position:self.position + size].tobytes()
+        self.position += len(data)
+        return data
+
+    def rewind(self) -> None:
+        self.position = 0
+
+
+class _StreamSource(_Source):
+    def __init__(self, fh: BinaryIO) -> None:
+        self.fh = fh
+        self.start = None  # type: Optional[int]
+        self.consumed = False
+        if fh.seekable():
+            self.start = fh.tell()
+            self.size = fh.seek(0, os.SEEK_END) - self.start
+            fh.seek(self.start)
+
+    def read(self, size: int) -> bytes:
+        self.consumed = True
+        return self.fh.read(size)
+
+    def rewind(self) -> None:
+        if self.start is not None:
+            self.fh.seek(self.start)
+        elif self.consumed:
+            raise io.UnsupportedOperation("a stream that isn't seekable can't be sent again")
+
+
+class _IterSource(_Source):
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self.chunks = iter(chunks)
+        # the rest of the current chunk is read through a view, so a large chunk isn't copied on every read
+        self.pending = memoryview(b"")
+        self.position = 0
+        self.consumed = False
+
+    def read(self, size: int) -> bytes:
+        self.consumed = True
+        while self.position >= len(self.pending):
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return b""
+            self.pending = memoryview(chunk).cast("B")
+            self.position = 0
+        data = self.pending[self.position:self.position + size].tobytes()
+        self.position += len(data)
+        return data
+
+    def rewind(self) -> None:
+        if self.consumed:
+            raise io.UnsupportedOperation("an iterator can't be sent again")
+
+
+def _make_source(source: Union[str, UploadSource]) -> _Source:
+    if isinstance(source, str):
+        return _FileSource(source)
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        return _BufferSource(source)
+    elif hasattr(source, "read"):
+        return _StreamSource(cast(BinaryIO, source))
+    return _IterSource(cast(Iterable[bytes], source))
+
+
+class MultipartEncoder:
+    """
+    A ``multipart/form-data`` request body that reads the files it contains while it's being sent, so memory use
+    stays flat regardless of the file sizes. Files can be given as paths, which are only opened while they're
+    being sent, or as in-memory buffers, file objects or iterators of bytes. If the size of all files is known up
+    front, so is ``length``, which lets the request be sent with a ``Content-Length`` header. Otherwise it has to
+    be sent with chunked encoding, see ``ChunkedBody``.
+
+    ``requests`` sends it like any other file object when it's passed as ``data=`` together with the
+    ``Content-Type`` header from ``content_type``.
+
+    :param files: a sequence of ``(field name, file)`` tuples. The file name sent to the server is the basename
+                  of the path or the name given with the contents.
+    :param meter: reports the progress of every file as it's read
+    :param rate_limiter: throttles ``read()`` to the limiter's bandwidth
+    """
+    def __init__(self, files: Sequence[Tuple[str, UploadFile]], boundary: Optional[str] = None,
+                 chunk_size: int = STREAM_CHUNK_SIZE, meter: Optional[TransferMeter] = None,
+                 rate_limiter: Optional[RateLimiter] = None) -> None:
+        self.boundary = boundary if boundary is not None else uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self.meter = meter
+        self.rate_limiter = rate_limiter
+        self._parts = []  # type: List[Union[bytes, _Source]]
+        self._names = {}  # type: Dict[int, str]
+        for field, f in files:
+            source = _make_source(f if isinstance(f, str) else f[1])
+            self._parts.append(
+                ('--%s\r\nContent-Disposition: form-data; name="%s"; filename="%s"\r\n\r\n' % (
+                    self.boundary, _quote(field), _quote(os.path.basename(upload_name(f))),
+                )).encode("utf-8")
+            )
+            self._names[id(source)] = upload_name(f)
+            self._parts.append(source)
+            self._parts.append(b"\r\n")
+            if meter is not None:
+                meter.expect(upload_name(f), source.size or 0)
+        self._parts.append(("--%s--\r\n" % self.boundary).encode("utf-8"))
+        self.length = None  # type: Optional[int]
+        if all(isinstance(p, bytes) or p.size is not None for p in self._parts):
+            self.length = sum(len(p) if isinstance(p, bytes) else cast(int, p.size) for p in self._parts)
+        self._part_index = 0
+        self._part_offset = 0
+        self._position = 0
+
+    @property
+    def content_type(self) -> str:
+        return "multipart/form-data; boundary=%s" % self.boundary
+
+    def __len__(self) -> int:
+        if self.length is None:
+            raise TypeError("The length of a multipart body with streamed contents of unknown size is unknown")
+        return self.length
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if offset != 0 or whence != os.SEEK_SET:
+            raise ValueError("MultipartEncoder can only be rewound to the start")
+        for part in self._parts:
+            if not isinstance(part, bytes):
+                part.rewind()
+                if self.meter is not None:
+                    self.meter.rewind(self._names[id(part)])
+        self._part_index = 0
+        self._part_offset = 0
+        self._position = 0
+        return 0
+
+    def close(self) -> None:
+        for part in self._parts:
+            if not isinstance(part, bytes):
+                part.close()
+
+    def _read_part(self, size: int) -> bytes:
+        part = self._parts[self._part_index]
+        if isinstance(part, bytes):
+            data = part[self._part_offset:self._part_offset + size]
+            done = self._part_offset + len(data) >= len(part)
+        else:
+            if part.size is not None:
+                size = min(size, part.size - self._part_offset)
+            data = part.read(size) if size > 0 else b""
+            if not data and part.size is not None and self._part_offset < part.size:
+                raise IOError("%s was truncated while it was being uploaded" % self._names[id(part)])
+            if self.meter is not None:
+                self.meter.update(self._names[id(part)], len(data))
+            done = not data or (part.size is not None and self._part_offset + len(data) >= part.size)
+            if done:
+                part.close()
+        self._part_offset += len(data)
+        if done:
+            self._part_index += 1
+            self._part_offset = 0
+        return data
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            if self.length is None:
+                return b"".join(iter(lambda: self.read(self.chunk_size), b""))
+            size = self.length - self._position
+        chunks = []  # type: List[bytes]
+        remaining = size
+        while remaining > 0 and self._part_index < len(self._parts):
+            data = self._read_part(remaining)
+            chunks.append(data)
+            remaining -= len(data)
+        ret = b"".join(chunks)
+        self._position += len(ret)
+        if self.rate_limiter is not None and ret:
+            delay = self.rate_limiter.reserve(len(ret))
+            if delay > 0:
+                time.sleep(delay)
+        return ret
+
+    def __iter__(self) -> Iterator[bytes]:
+        self.seek(0)
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+class ChunkedBody:
+    """
+    Wraps a ``MultipartEncoder`` whose length is unknown, so ``requests`` sends it with chunked transfer encoding.
+    """
+    def __init__(self, encoder: MultipartEncoder) -> None:
+        self.encoder = encoder
+
+    def __iter__(self) -> Iterator[bytes]:
+        return iter(self.encoder)
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        return self.encoder.seek(offset, whence)
@@ -3,40 +3,260 @@
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import fnmatch
+import heapq
+import itertools
 import os
-from typing import Sequence, List, Tuple, BinaryIO, cast, Optional  # noqa: F401
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED  # noqa: F401
+from typing import Sequence, List, Tuple, cast, Optional, Dict, Any, Iterator, Iterable, Set, TypeVar  # noqa: F401
+from urllib.parse import quote
 
-from aptly_api.base import BaseAPIClient, AptlyAPIException
+from aptly_api.base import BaseAPIClient, AptlyAPIException, _transport_errors
+from aptly_api.debfile import read_deb_control, short_key, file_digest
+from aptly_api.multipart import MultipartEncoder, ChunkedBody, UploadFile, upload_name, upload_size
+from aptly_api.parts.packages import Package, fetch_package_list
+from aptly_api.transfer import TransferMeter, RateLimiter
+
+T = TypeVar("T")
+
+
+class UploadError(AptlyAPIException):
+    """
+    Raised by a parallel ``upload()`` when some of its requests failed.
+
+    :ivar failed: maps every file that wasn't uploaded to the exception that its request failed with. Connection
+                  errors and timeouts are wrapped in an ``AptlyAPIException`` whose ``__cause__`` is the original
+                  exception.
+    :ivar uploaded: the server's response for all files that were uploaded successfully
+    """
+    def __init__(self, *args: Any, failed: Dict[str, AptlyAPIException], uploaded: List[str]) -> None:
+        super().__init__(*args, status_code=max(e.status_code for e in failed.values()))
+        self.failed = failed
+        self.uploaded = uploaded
+
+
+def balanced_batches(files: Sequence[UploadFile], count: int) -> List[List[UploadFile]]:
+    """
+    Splits ``files`` into at most ``count`` batches of roughly equal total size, so parallel uploads finish at
+    roughly the same time. Files keep their relative order within each batch.
+    """
+    count = max(1, min(count, len(files)))
+    batches = [[] for _ in range(count)]  # type: List[List[int]]
+    # streams of unknown size count as one byte, which spreads them evenly across the batches
+    weights = [max(1, upload_size(f) or 0) for f in files]
+    # greedily assign the largest remaining file to the batch with the smallest total size
+    heap = [(0, ix) for ix in range(count)]
+    for pos in sorted(range(len(files)), key=lambda pos: weights[pos], reverse=True):
+        total, ix = heapq.heappop(heap)
+        batches[ix].append(pos)
+        heapq.heappush(heap, (total + weights[pos], ix))
+    return [[files[pos] for pos in sorted(batch)] for batch in batches if batch]
+
+
+def check_readable(files: Sequence[UploadFile]) -> None:
+    for f in files:
+        if isinstance(f, str) and (not os.path.exists(f) or not os.access(f, os.R_OK)):
+            raise AptlyAPIException("File to upload %s can't be opened or read" % f)
+
+
+def find_files(path: str, pattern: Optional[str] = None) -> Iterator[str]:
+    """
+    Walks the directory tree below ``path`` and yields the path of every file whose name matches the glob
+    ``pattern``, in a stable order.
+    """
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        for fn in sorted(filenames):
+            if pattern is None or fnmatch.fnmatch(fn, pattern):
+                yield os.path.join(dirpath, fn)
+
+
+def chunked(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    it = iter(items)
+    while True:
+        batch = list(itertools.islice(it, max(1, size)))
+        if not batch:
+            return
+        yield batch
+
+
+def without_existing(files: Iterable[UploadFile], remote_files: Optional[Iterable[str]] = None,
+                     repo_packages: Optional[Iterable[Package]] = None) -> Iterator[UploadFile]:
+    """
+    Filters out the ``files`` that don't need to be uploaded, lazily, so ``files`` can be a directory walk.
+
+    :param remote_files: the listing of the upload directory. aptly only lists file names, so any local file with
+                         the same name is skipped.
+    :param repo_packages: the detailed package listing of the target repo. Debian packages with the same short key,
+                          size and SHA256 checksum as one of these are skipped. Only files on disk are
+                          checked.
+    """
+    remote_names = {os.path.basename(f) for f in remote_files or []}  # type: Set[str]
+    in_repo = set()  # type: Set[Tuple[str, int, str]]
+    for pkg in repo_packages or []:
+        if pkg.fields is not None and "Size" in pkg.fields and "SHA256" in pkg.fields:
+            in_repo.add((pkg.fields.get("ShortKey", ""), int(pkg.fields["Size"]), pkg.fields["SHA256"]))
+
+    for f in files:
+        if os.path.basename(upload_name(f)) in remote_names:
+            continue
+        if in_repo and isinstance(f, str) and f.endswith((".deb", ".udeb")):
+            try:
+                key = short_key(read_deb_control(f))
+            except AptlyAPIException:
+                # let aptly report broken packages
+                yield f
+                continue
+            if (key,) + file_digest(f) in in_repo:
+                continue
+        yield f
+
+
+def expect_files(meter: TransferMeter, files: Iterable[UploadFile]) -> None:
+    # announce all files up front, so progress reports know the total size before the first batch is sent
+    for f in files:
+        meter.expect(upload_name(f), upload_size(f) or 0)
+
+
+def transport_failure(e: Exception) -> AptlyAPIException:
+    # a connection reset or timeout fails only its own batch, the other batches' results must still be reported
+    error = AptlyAPIException("Upload failed: %s: %s" % (type(e).__name__, e))
+    error.__cause__ = e
+    return error
+
+
+def merge_batch_results(batches: Sequence[Sequence[UploadFile]],
+                        results: Sequence[Tuple[List[str], Optional[AptlyAPIException]]]) -> List[str]:
+    uploaded = []  # type: List[str]
+    failed = {}  # type: Dict[str, AptlyAPIException]
+    for batch, (batch_uploaded, error) in zip(batches, results):
+        uploaded.extend(batch_uploaded)
+        if error is not None:
+            for f in batch:
+                failed[upload_name(f)] = error
+    if failed:
+        raise UploadError("%s of %s files could not be uploaded" % (len(failed), sum(len(b) for b in batches)),
+                          failed=failed, uploaded=uploaded)
+    return uploaded
 
 
 class FilesAPISection(BaseAPIClient):
+    def __init__(self, *args: Any, rate_limiter: Optional[RateLimiter] = None, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # throttles all uploads of this section, Client shares one limiter between all uploads
+        self.rate_limiter = rate_limiter
+
     def list(self, directory: Optional[str] = None) -> Sequence[str]:
         if directory is None:
             resp = self.do_get("api/files")
         else:
             resp = self.do_get("api/files/%s" % directory)
 
-        return cast(List[str], resp.json())
-
-    def upload(self, destination: str, *files: str) -> Sequence[str]:
-        to_upload = []  # type: List[Tuple[str, BinaryIO]]
-        for f in files:
-            if not os.path.exists(f) or not os.access(f, os.R_OK):
-                raise AptlyAPIException("File to upload %s can't be opened or read" % f)
-            fh = open(f, mode="rb")
-            to_upload.append((f, fh),)
+        return cast(List[str], self.decode_json(resp))
 
+    def _upload(self, destination: str, files: Sequence[UploadFile],
+                meter: Optional[TransferMeter] = None) -> List[str]:
+        # stream the files from disk instead of building the whole request body in memory
+        body = MultipartEncoder([(upload_name(f), f) for f in files], meter=meter, rate_limiter=self.rate_limiter)
         try:
-            resp = self.do_post("api/files/%s" % destination,
-                                files=to_upload)
-        except AptlyAPIException:
-            raise
+            # without a known length, requests needs an object without __len__ to use chunked transfer encoding
+            data = body if body.length is not None else ChunkedBody(body)
+            resp = self.do_post("api/files/%s" % destination, data=data, headers={"Content-Type": body.content_type})
         finally:
-            for fn, to_close in to_upload:
-                if not to_close.closed:
-                    to_close.close()
+            body.close()
+
+        return cast(List[str], self.decode_json(resp))
+
+    def _upload_batch(self, destination: str, batch: Sequence[UploadFile],
+                      meter: Optional[TransferMeter] = None) -> Tuple[List[str], Optional[AptlyAPIException]]:
+        try:
+            return self._upload(destination, batch, meter), None
+        except AptlyAPIException as e:
+            return [], e
+        except _transport_errors as e:
+            return [], transport_failure(e)
+
+    def _without_existing(self, destination: str, files: Iterable[UploadFile], skip_existing: bool,
+                          skip_in_repo: Optional[str]) -> Iterator[UploadFile]:
+        remote_files = None  # type: Optional[Sequence[str]]
+        if skip_existing:
+            try:
+                remote_files = self.list(destination)
+            except AptlyAPIException as e:
+                if e.status_code != 404:
+                    raise
+        repo_packages = None  # type: Optional[Sequence[Package]]
+        if skip_in_repo is not None:
+            repo_packages = fetch_package_list(self, "api/repos/%s/packages" % quote(skip_in_repo),
+                                               {"format": "details"})
+        return without_existing(files, remote_files, repo_packages)
+
+    def upload(self, destination: str, *files: UploadFile, concurrency: int = 1, skip_existing: bool = False,
+               skip_in_repo: Optional[str] = None, meter: Optional[TransferMeter] = None) -> Sequence[str]:
+        """
+        Uploads ``files`` to the upload directory ``destination``. Each file is either a path or a
+        ``(file name, contents)`` tuple, where the contents can be ``bytes``, a ``memoryview``, a binary file object or
+        an iterator of ``bytes``. If the size of some contents can't be determined up front, the request is sent with
+        chunked transfer encoding, and it can't be retried. With ``concurrency`` > 1 the files are split
+        into up to ``concurrency`` batches of roughly equal size that are uploaded in parallel. If some of these
+        requests fail, ``UploadError`` reports which files failed and which were uploaded.
+
+        :param skip_existing: don't upload files that are already in ``destination``
+        :param skip_in_repo: don't upload Debian packages that the repo with this name already contains with the
+                             same size and SHA256 checksum
+        :param meter: a ``TransferMeter`` that reports the upload's progress and per-file timings
+        :return: the uploaded files, skipped files aren't included
+        """
+        check_readable(files)
+        if skip_existing or skip_in_repo is not None:
+            files = tuple(self._without_existing(destination, files, skip_existing, skip_in_repo))
+            if not files:
+                return []
+        if meter is not None:
+            expect_files(meter, files)
+        if concurrency <= 1:
+            return self._upload(destination, files, meter)
+
+        batches = balanced_batches(files, concurrency)
+        with ThreadPoolExecutor(max_workers=len(batches)) as executor:
+            results = list(executor.map(lambda batch: self._upload_batch(destination, batch, meter), batches))
+        return merge_batch_results(batches, results)
+
+    def upload_directory(self, destination: str, path: str, pattern: Optional[str] = "*.deb", max_open: int = 1,
+                         batch_size: int = 100, skip_existing: bool = False,
+                         skip_in_repo: Optional[str] = None, meter: Optional[TransferMeter] = None) -> Sequence[str]:
+        """
+        Uploads all files below ``path`` whose names match ``pattern`` to the upload directory ``destination``. The
+        files are sent in requests of up to ``batch_size`` files. Every request only has the file open that it's
+        currently sending, so at most ``max_open`` requests run in parallel and at most ``max_open`` file
+        descriptors are held at any time. aptly stores all files flat in ``destination``, so file names should be
+        unique across the tree.
 
-        return cast(List[str], resp.json())
+        Failures are reported like ``upload()`` does for parallel uploads, through ``UploadError``.
+        ``skip_existing``, ``skip_in_repo`` and ``meter`` work like they do for ``upload()``.
+        """
+        files = find_files(path, pattern)  # type: Iterable[UploadFile]
+        if skip_existing or skip_in_repo is not None:
+            files = self._without_existing(destination, files, skip_existing, skip_in_repo)
+        batches = chunked(files, batch_size)  # type: Iterable[List[UploadFile]]
+        if meter is not None:
+            # the meter reports progress against the total size, so the whole tree has to be walked up front
+            batches = list(batches)
+            expect_files(meter, itertools.chain(*batches))
+        workers = max(1, max_open)
+        futures = []  # type: List[Future[Tuple[List[str], Optional[AptlyAPIException]]]]
+        sent = []  # type: List[List[UploadFile]]
+        running = set()  # type: Set[Future[Tuple[List[str], Optional[AptlyAPIException]]]]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # only walk the tree as far as the next batch to send
+            for batch in batches:
+                if len(running) >= workers:
+                    running = wait(running, return_when=FIRST_COMPLETED).not_done
+                future = executor.submit(self._upload_batch, destination, batch, meter)
+                running.add(future)
+                futures.append(future)
+                sent.append(batch)
+        return merge_batch_results(sent, [future.result() for future in futures])
 
     def delete(self, path: Optional[str] = None) -> None:
         self.do_delete("api/files/%s" % path)
@@ -3,11 +3,11 @@
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
-from typing import NamedTuple, Sequence, Dict, cast, Optional, List, Union
+from typing import NamedTuple, Sequence, Dict, cast, Optional, List, Union, Iterator
 from urllib.parse import quote
 
 from aptly_api.base import BaseAPIClient
-from aptly_api.parts.packages import Package, PackageAPISection
+from aptly_api.parts.packages import Package, PackageAPISection, fetch_package_list
 
 
 Mirror = NamedTuple('Mirror', [
@@ -66,7 +66,7 @@ class MirrorsAPISection(BaseAPIClient):
         resp = self.do_get("api/mirrors")
 
         mirrors = []
-        for mirr in resp.json():
+        for mirr in self.decode_json(resp):
             mirrors.append(self.mirror_from_response(mirr))
         return mirrors
 
@@ -118,10 +118,10 @@ class MirrorsAPISection(BaseAPIClient):
 
     def show(self, name: str) -> Mirror:
         resp = self.do_get("api/mirrors/%s" % (quote(name)))
-        return self.mirror_from_response(resp.json())
+        return self.mirror_from_response(self.decode_json(resp))
 
-    def list_packages(self, name: str, query: Optional[str] = None, with_deps: bool = False,
-                      detailed: bool = False) -> Sequence[Package]:
+    @staticmethod
+    def _list_params(query: Optional[str], with_deps: bool, detailed: bool) -> Dict[str, str]:
         params = {}
         if query is not None:
             params["q"] = query
@@ -129,13 +129,23 @@ class MirrorsAPISection(BaseAPIClient):
             params["withDeps"] = "1"
         if detailed:
             params["format"] = "details"
+        return params
 
-        resp = self.do_get("api/mirrors/%s/packages" %
-                           quote(name), params=params)
-        ret = []
-        for rpkg in resp.json():
-            ret.append(PackageAPISection.package_from_response(rpkg))
-        return ret
+    def list_packages(self, name: str, query: Optional[str] = None, with_deps: bool = False,
+                      detailed: bool = False, fields: Optional[Sequence[str]] = None,
+                      lazy: bool = False) -> Sequence[Package]:
+        params = self._list_params(query, with_deps, detailed or fields is not None or lazy)
+        return fetch_package_list(self, "api/mirrors/%s/packages" % quote(name), params,
+                                  fields=fields, lazy=lazy)
+
+    def iter_packages(self, name: str, query: Optional[str] = None, with_deps: bool = False,
+                      detailed: bool = False, fields: Optional[Sequence[str]] = None) -> Iterator[Package]:
+        """
+        Streaming variant of ``list_packages``, yielding each ``Package`` as soon as it has been received.
+        """
+        params = self._list_params(query, with_deps, detailed or fields is not None)
+        for rpkg in self.do_get_json_stream("api/mirrors/%s/packages" % quote(name), params=params):
+            yield PackageAPISection.package_from_response(rpkg, fields)
 
     def delete(self, name: str) -> None:
         self.do_delete("api/mirrors/%s" % quote(name))
@@ -179,4 +189,4 @@ class MirrorsAPISection(BaseAPIClient):
 
         resp = self.do_post("api/mirrors", json=data)
 
-        return self.mirror_from_response(resp.json())
+        return self.mirror_from_response(self.decode_json(resp))
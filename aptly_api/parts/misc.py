@@ -14,7 +14,8 @@ class MiscAPISection(BaseAPIClient):
 
     def version(self) -> str:
         resp = self.do_get("api/version")
-        if "Version" in resp.json():
-            return cast(str, resp.json()["Version"])
+        rcnt = self.decode_json(resp)
+        if "Version" in rcnt:
+            return cast(str, rcnt["Version"])
         else:
             raise AptlyAPIException("Aptly server didn't return a valid response object:\n%s" % resp.text)
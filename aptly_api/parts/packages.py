@@ -4,38 +4,287 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
-from typing import NamedTuple, Dict, Union, Optional
+import json
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Dict, Union, Optional, List, Iterable, Any, Tuple, Mapping, Sequence, \
+    Iterator  # noqa: F401
 from urllib.parse import quote
 
-from aptly_api.base import BaseAPIClient
+from aptly_api.base import BaseAPIClient, AptlyAPIException
+from aptly_api.jsonutil import iter_raw_array, JSONDecoder
 
+# a package's key is read from a raw JSON object without decoding it
+_raw_key_field = b'"Key"'
+_raw_field_value = re.compile(rb'[ \t\n\r]*:[ \t\n\r]*("[^"\\]*(?:\\.[^"\\]*)*")')
 
-Package = NamedTuple('Package', [
-    ('key', str),
-    ('short_key', Optional[str]),
-    ('files_hash', Optional[str]),
-    ('fields', Optional[Dict[str, str]]),
+
+class PackageKey:
+    """
+    A parsed aptly package key like ``Pamd64 nginx 1.10.0-1 1cc572a93625a9c9``. Architecture and name strings
+    are interned, so the many keys of a large package list share them.
+    """
+    __slots__ = ("arch", "name", "version", "files_hash")
+
+    def __init__(self, arch: str, name: str, version: str, files_hash: Optional[str] = None) -> None:
+        self.arch = sys.intern(arch)
+        self.name = sys.intern(name)
+        self.version = version
+        self.files_hash = files_hash
+
+    @classmethod
+    def parse(cls, key: str) -> "PackageKey":
+        """
+        Parses a package key or a short key without the files hash.
+        """
+        parts = key.split(" ")
+        if not 3 <= len(parts) <= 4 or key[:1] != "P" or "" in parts:
+            raise AptlyAPIException("Not an aptly package key: %s" % key)
+        return cls(parts[0][1:], parts[1], parts[2], parts[3] if len(parts) == 4 else None)
+
+    @property
+    def short_key(self) -> str:
+        return "P%s %s %s" % (self.arch, self.name, self.version)
+
+    def _astuple(self) -> Tuple[str, str, str, Optional[str]]:
+        return self.arch, self.name, self.version, self.files_hash
+
+    def __str__(self) -> str:
+        if self.files_hash is None:
+            return self.short_key
+        return "%s %s" % (self.short_key, self.files_hash)
+
+    def __repr__(self) -> str:
+        return "PackageKey(%r)" % str(self)
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, PackageKey):
+            return NotImplemented
+        return self._astuple() == other._astuple()
+
+    def __hash__(self) -> int:
+        return hash(self._astuple())
+
+
+def project_fields(fields: Mapping[str, str], names: Sequence[str]) -> Dict[str, str]:
+    """
+    :return: only the fields in ``names`` that ``fields`` contains
+    """
+    return {name: fields[name] for name in names if name in fields}
+
+
+class LazyFields(Mapping[str, str]):
+    """
+    The fields of a package, kept as the raw JSON object from a listing until they're accessed for the first time.
+    Undecoded fields take a fraction of the memory of a dict.
+
+    :param only: decode only these fields, see ``project_fields()``
+    :param decoder: the JSON decoder to use, see ``BaseAPIClient.json_decoder``
+    """
+    __slots__ = ("_raw", "_only", "_decoder", "_decoded")
+
+    def __init__(self, raw: bytes, only: Optional[Sequence[str]] = None, decoder: JSONDecoder = json.loads) -> None:
+        self._raw = raw
+        self._only = only
+        self._decoder = decoder
+        self._decoded = None  # type: Optional[Dict[str, str]]
+
+    @property
+    def decoded(self) -> bool:
+        return self._decoded is not None
+
+    def _fields(self) -> Dict[str, str]:
+        if self._decoded is None:
+            fields = self._decoder(self._raw)
+            self._decoded = project_fields(fields, self._only) if self._only is not None else fields
+            self._raw = b""
+        return self._decoded
+
+    def __getitem__(self, name: str) -> str:
+        return self._fields()[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._fields())
+
+    def __len__(self) -> int:
+        return len(self._fields())
+
+    def __repr__(self) -> str:
+        if self._decoded is None:
+            return "LazyFields(<%s bytes>)" % len(self._raw)
+        return "LazyFields(%r)" % self._decoded
+
+
+class _PackageTuple(NamedTuple):
+    key: str
+    parsed_key: PackageKey
+    fields: Optional[Mapping[str, str]]
+
+
+class Package(_PackageTuple):
+    """
+    A package of a listing. Its ``key`` is parsed into ``parsed_key`` once, when the package is created, and
+    ``short_key`` and ``files_hash`` are derived from that instead of being kept as strings of their own.
+
+    ``Package(key, short_key, files_hash, fields)`` creates a package like it did when those were the fields of the
+    tuple. ``short_key`` and ``files_hash`` are only accepted for that, they're always derived from ``key``.
+    """
+    __slots__ = ()
+
+    def __new__(cls, key: str, short_key: Optional[str] = None, files_hash: Optional[str] = None,
+                fields: Optional[Mapping[str, str]] = None, parsed_key: Optional[PackageKey] = None) -> "Package":
+        # tuple.__new__() skips the argument handling of the named tuple's __new__(), listings create many packages
+        return tuple.__new__(cls, (key, parsed_key if parsed_key is not None else PackageKey.parse(key), fields))
+
+    def __getnewargs__(self) -> Tuple[Any, ...]:
+        # tuple(self) doesn't match the arguments of __new__()
+        return self.key, None, None, self.fields, self.parsed_key
+
+    @property
+    def short_key(self) -> str:
+        return self.parsed_key.short_key
+
+    @property
+    def files_hash(self) -> Optional[str]:
+        return self.parsed_key.files_hash
+
+
+PackageLookup = NamedTuple('PackageLookup', [
+    ('packages', List[Package]),
+    ('missing', List[str]),
 ])
 
 
+def project_packages(packages: Sequence[Package], names: Optional[Sequence[str]]) -> List[Package]:
+    """
+    :return: ``packages`` with only the fields in ``names``, or unchanged if ``names`` is None
+    """
+    if names is None:
+        return list(packages)
+    return [pkg if pkg.fields is None else pkg._replace(fields=project_fields(pkg.fields, names))
+            for pkg in packages]
+
+
 class PackageAPISection(BaseAPIClient):
     @staticmethod
-    def package_from_response(api_response: Union[str, Dict[str, str]]) -> Package:
+    def package_from_response(api_response: Union[str, Dict[str, str]],
+                              fields: Optional[Sequence[str]] = None) -> Package:
+        """
+        :param fields: keep only these control fields of a detailed response, see ``project_fields()``
+        """
         if isinstance(api_response, str):
-            return Package(
-                key=api_response,
-                short_key=None,
-                files_hash=None,
-                fields=None,
-            )
+            return Package(key=api_response)
         else:
             return Package(
                 key=api_response["Key"],
-                short_key=api_response["ShortKey"] if "ShortKey" in api_response else None,
-                files_hash=api_response["FilesHash"] if "FilesHash" in api_response else None,
-                fields=api_response,
+                fields=api_response if fields is None else project_fields(api_response, fields),
             )
 
+    @staticmethod
+    def package_from_raw(raw: bytes, fields: Optional[Sequence[str]] = None,
+                         decoder: JSONDecoder = json.loads) -> Package:
+        """
+        Creates a ``Package`` from the undecoded JSON object of a detailed listing. Only its key fields are read
+        right away, all other fields are decoded on first access, see ``LazyFields``.
+        """
+        pos = raw.find(_raw_key_field)
+        while pos >= 0:
+            # the name may also be the end of a string value, which isn't followed by a colon
+            m = _raw_field_value.match(raw, pos + len(_raw_key_field))
+            if m is not None:
+                value = m.group(1)
+                # keys hardly ever contain escapes, so most values can skip the JSON decoder
+                key = json.loads(value) if b"\\" in value else value[1:-1].decode("utf-8")
+                return Package(key=key, fields=LazyFields(raw, fields, decoder))
+            pos = raw.find(_raw_key_field, pos + 1)
+        raise AptlyAPIException("Package details without a key: %s" % raw[:200].decode("utf-8", "replace"))
+
     def show(self, key: str) -> Package:
+        if self.package_store is not None:
+            fields = self.package_store.get(key)
+            if fields is not None:
+                return self.package_from_response(fields)
+
+        pkg = self._fetch(key)
+        if self.package_store is not None and pkg.fields is not None:
+            self.package_store.put(pkg.key, pkg.fields)
+        return pkg
+
+    def _fetch(self, key: str) -> Package:
         resp = self.do_get("api/packages/%s" % quote(key))
-        return self.package_from_response(resp.json())
+        return self.package_from_response(self.decode_json(resp))
+
+    def _fetch_or_none(self, key: str) -> Optional[Package]:
+        try:
+            return self._fetch(key)
+        except AptlyAPIException as e:
+            if e.status_code == 404:
+                return None
+            raise
+
+    def show_many(self, keys: Iterable[str], concurrency: int = 10) -> PackageLookup:
+        """
+        Looks up many package keys using up to ``concurrency`` parallel requests. Repeated keys are only looked up
+        once.
+
+        :return: a ``PackageLookup`` with the packages that were found in the order of ``keys`` and the keys that
+                 the server doesn't know
+        """
+        unique = list(dict.fromkeys(keys))
+        found = {}  # type: Dict[str, Package]
+        if self.package_store is not None:
+            for key, fields in self.package_store.get_many(unique).items():
+                found[key] = self.package_from_response(fields)
+
+        pending = [key for key in unique if key not in found]
+        if pending:
+            with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(pending)))) as executor:
+                for key, pkg in zip(pending, executor.map(self._fetch_or_none, pending)):
+                    if pkg is not None:
+                        found[key] = pkg
+            if self.package_store is not None:
+                # stored in one transaction, the workers would otherwise take turns writing one package each
+                self.package_store.put_many((pkg.key, pkg.fields) for pkg in (found.get(key) for key in pending)
+                                            if pkg is not None and pkg.fields is not None)
+
+        return PackageLookup(
+            packages=[found[key] for key in unique if key in found],
+            missing=[key for key in unique if key not in found],
+        )
+
+
+def fetch_package_list(section: BaseAPIClient, urlpath: str, params: Dict[str, str],
+                       fields: Optional[Sequence[str]] = None, lazy: bool = False) -> List[Package]:
+    """
+    Fetches a package listing from ``urlpath``. If ``section`` has a ``PackageStore`` and a detailed listing was
+    requested, only the package keys are fetched and the details are looked up in the store. If any of them are
+    missing, the detailed listing is fetched after all and written to the store.
+
+    :param fields: keep only these control fields of each package
+    :param lazy: keep the details of each package as raw JSON until they're accessed. Package details from a
+                 ``PackageStore`` are decoded anyway.
+    """
+    store = section.package_store
+    detailed = params.get("format") == "details"
+    if store is not None and detailed:
+        keys = section.decode_json(section.do_get(urlpath, params={k: v for k, v in params.items() if k != "format"}))
+        found = store.get_many(keys)
+        if len(found) == len(set(keys)):
+            return [PackageAPISection.package_from_response(found[key], fields) for key in keys]
+
+    resp = section.do_get(urlpath, params=params)
+    return packages_from_listing(section, resp.content, detailed, fields, lazy)
+
+
+def packages_from_listing(section: Any, content: bytes, detailed: bool, fields: Optional[Sequence[str]],
+                          lazy: bool) -> List[Package]:
+    # shared by the sync and async fetch_package_list
+    store = section.package_store
+    if lazy and detailed and store is None:
+        return [PackageAPISection.package_from_raw(raw, fields, section.json_decoder)
+                for raw in iter_raw_array(content)]
+    ret = [PackageAPISection.package_from_response(rpkg) for rpkg in section.json_decoder(content)]
+    if store is not None and detailed:
+        store.put_many((pkg.key, pkg.fields) for pkg in ret if pkg.fields is not None)
+    return project_packages(ret, fields)
@@ -55,7 +55,7 @@ class PublishAPISection(BaseAPIClient):
     def list(self) -> Sequence[PublishEndpoint]:
         resp = self.do_get("api/publish")
         ret = []
-        for rpe in resp.json():
+        for rpe in self.decode_json(resp):
             ret.append(self.endpoint_from_response(rpe))
         return ret
 
@@ -125,7 +125,7 @@ class PublishAPISection(BaseAPIClient):
         body["Signing"] = sign_dict
 
         resp = self.do_post(url, json=body)
-        return self.endpoint_from_response(resp.json())
+        return self.endpoint_from_response(self.decode_json(resp))
 
     def update(self, *, prefix: str, distribution: str,
                snapshots: Optional[Sequence[Dict[str, str]]] = None, force_overwrite: bool = False,
@@ -180,7 +180,7 @@ class PublishAPISection(BaseAPIClient):
 
         resp = self.do_put("api/publish/%s/%s" %
                            (quote(self.escape_prefix(prefix)), quote(distribution),), json=body)
-        return self.endpoint_from_response(resp.json())
+        return self.endpoint_from_response(self.decode_json(resp))
 
     def drop(self, *, prefix: str, distribution: str, force_delete: bool = False) -> None:
         params = {}
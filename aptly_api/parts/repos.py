@@ -3,11 +3,12 @@
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
-from typing import NamedTuple, Sequence, Dict, Union, cast, Optional
+from typing import NamedTuple, Sequence, Dict, Union, cast, Optional, Iterator, Iterable
 from urllib.parse import quote
 
 from aptly_api.base import BaseAPIClient, AptlyAPIException
-from aptly_api.parts.packages import PackageAPISection, Package
+from aptly_api.debfile import package_keys
+from aptly_api.parts.packages import PackageAPISection, Package, fetch_package_list
 
 Repo = NamedTuple('Repo', [
     ('name', str),
@@ -22,6 +23,25 @@ FileReport = NamedTuple('FileReport', [
 ])
 
 
+def files_present(files: Iterable[str], packages: Iterable[Package]) -> Dict[str, bool]:
+    """
+    Checks which of the local package ``files`` are contained in ``packages``, which is usually the package listing
+    of a repo. A file counts as present if all the packages it describes are, see
+    ``aptly_api.debfile.package_keys``. Files that can't be parsed are reported as missing.
+    """
+    # a package key is its short key followed by the hash of its files
+    present = {pkg.parsed_key.short_key for pkg in packages}
+    ret = {}
+    for f in files:
+        try:
+            keys = package_keys(f)
+        except (AptlyAPIException, OSError, ValueError, KeyError):
+            ret[f] = False
+            continue
+        ret[f] = bool(keys) and all(key in present for key in keys)
+    return ret
+
+
 class ReposAPISection(BaseAPIClient):
     @staticmethod
     def repo_from_response(api_response: Dict[str, str]) -> Repo:
@@ -54,14 +74,14 @@ class ReposAPISection(BaseAPIClient):
 
         resp = self.do_post("api/repos", json=data)
 
-        return self.repo_from_response(resp.json())
+        return self.repo_from_response(self.decode_json(resp))
 
     def show(self, reponame: str) -> Repo:
         resp = self.do_get("api/repos/%s" % quote(reponame))
-        return self.repo_from_response(resp.json())
+        return self.repo_from_response(self.decode_json(resp))
 
-    def search_packages(self, reponame: str, query: Optional[str] = None, with_deps: bool = False,
-                        detailed: bool = False) -> Sequence[Package]:
+    @staticmethod
+    def _search_params(query: Optional[str], with_deps: bool, detailed: bool) -> Dict[str, str]:
         if query is None and with_deps:
             raise AptlyAPIException("search_packages can't include dependencies (with_deps==True) without"
                                     "a query")
@@ -74,12 +94,34 @@ class ReposAPISection(BaseAPIClient):
 
         if detailed:
             params["format"] = "details"
+        return params
 
-        resp = self.do_get("api/repos/%s/packages" % quote(reponame), params=params)
-        ret = []
-        for rpkg in resp.json():
-            ret.append(PackageAPISection.package_from_response(rpkg))
-        return ret
+    def search_packages(self, reponame: str, query: Optional[str] = None, with_deps: bool = False,
+                        detailed: bool = False, fields: Optional[Sequence[str]] = None,
+                        lazy: bool = False) -> Sequence[Package]:
+        params = self._search_params(query, with_deps, detailed or fields is not None or lazy)
+        return fetch_package_list(self, "api/repos/%s/packages" % quote(reponame), params,
+                                  fields=fields, lazy=lazy)
+
+    def iter_packages(self, reponame: str, query: Optional[str] = None, with_deps: bool = False,
+                      detailed: bool = False, fields: Optional[Sequence[str]] = None) -> Iterator[Package]:
+        """
+        Like ``search_packages``, but parses the response while it's being received and yields one ``Package`` at
+        a time, so memory use stays flat even for huge detailed listings.
+        """
+        params = self._search_params(query, with_deps, detailed or fields is not None)
+        for rpkg in self.do_get_json_stream("api/repos/%s/packages" % quote(reponame), params=params):
+            yield PackageAPISection.package_from_response(rpkg, fields)
+
+    def files_present(self, reponame: str, files: Iterable[str]) -> Dict[str, bool]:
+        """
+        Checks which local ``.deb``, ``.udeb``, ``.dsc`` and ``.changes`` files are already in the repo, so they
+        don't need to be uploaded. This only compares package keys computed from the local files with a single
+        package listing of the repo and doesn't verify checksums.
+
+        :return: a dict mapping each of ``files`` to whether the repo already contains it
+        """
+        return files_present(files, self.search_packages(reponame))
 
     def edit(self, reponame: str, comment: Optional[str] = None, default_distribution: Optional[str] = None,
              default_component: Optional[str] = None) -> Repo:
@@ -96,13 +138,13 @@ class ReposAPISection(BaseAPIClient):
             body["DefaultComponent"] = default_component
 
         resp = self.do_put("api/repos/%s" % quote(reponame), json=body)
-        return self.repo_from_response(resp.json())
+        return self.repo_from_response(self.decode_json(resp))
 
     def list(self) -> Sequence[Repo]:
         resp = self.do_get("api/repos")
 
         repos = []
-        for rdesc in resp.json():
+        for rdesc in self.decode_json(resp):
             repos.append(
                 self.repo_from_response(rdesc)
             )
@@ -125,7 +167,7 @@ class ReposAPISection(BaseAPIClient):
             resp = self.do_post("api/repos/%s/file/%s/%s" % (quote(reponame), quote(dir), quote(filename),),
                                 params=params)
 
-        return self.filereport_from_response(resp.json())
+        return self.filereport_from_response(self.decode_json(resp))
 
     def include_uploaded_file(self, reponame: str, dir: str, filename: Optional[str] = None,
                               remove_processed_files: bool = True, force_replace: bool = False,
@@ -146,16 +188,16 @@ class ReposAPISection(BaseAPIClient):
             resp = self.do_post("api/repos/%s/include/%s/%s" % (quote(reponame), quote(dir), quote(filename),),
                                 params=params)
 
-        return self.filereport_from_response(resp.json())
+        return self.filereport_from_response(self.decode_json(resp))
 
     def add_packages_by_key(self, reponame: str, *package_keys: str) -> Repo:
         resp = self.do_post("api/repos/%s/packages" % quote(reponame), json={
             "PackageRefs": package_keys,
         })
-        return self.repo_from_response(resp.json())
+        return self.repo_from_response(self.decode_json(resp))
 
     def delete_packages_by_key(self, reponame: str, *package_keys: str) -> Repo:
         resp = self.do_delete("api/repos/%s/packages" % quote(reponame), json={
             "PackageRefs": package_keys,
         })
-        return self.repo_from_response(resp.json())
+        return self.repo_from_response(self.decode_json(resp))
@@ -3,33 +3,118 @@
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import itertools
 from datetime import datetime
 
-from typing import NamedTuple, Sequence, Optional, Dict, Union, cast, List
+from typing import Sequence, Optional, Dict, Union, cast, List, Iterator, Any, Tuple
 from urllib.parse import quote
 
-import iso8601
-
 from aptly_api.base import BaseAPIClient, AptlyAPIException
-from aptly_api.parts.packages import Package, PackageAPISection
+from aptly_api.cache import SnapshotPackageCache
+from aptly_api.diff import DiffSummary, diff_packages, diff_summary, diff_matrix
+from aptly_api.index import PackageIndex
+from aptly_api.merge import merge_packages, pull_packages
+from aptly_api.parts.packages import Package, PackageAPISection, fetch_package_list, project_packages
+from aptly_api.timeutil import parse_timestamp
+
+
+class Snapshot:
+    """
+    An aptly snapshot. Snapshots read from the server keep their creation time as the raw ``created_at_raw``
+    string and only parse it into ``created_at`` when it's first accessed, as that dominates the cost of listing
+    many snapshots otherwise. Snapshots behave like the named tuple they used to be, i.e. they can be unpacked,
+    indexed, sorted and compared to tuples, but they aren't ``tuple`` instances.
+    """
+    __slots__ = ("name", "description", "created_at_raw", "_created_at")
+    _fields = ("name", "description", "created_at")
+
+    def __init__(self, name: str, description: Optional[str], created_at: Optional[datetime] = None,
+                 created_at_raw: Optional[str] = None) -> None:
+        self.name = name
+        self.description = description
+        self.created_at_raw = created_at_raw
+        self._created_at = created_at
+
+    @property
+    def created_at(self) -> Optional[datetime]:
+        if self._created_at is None and self.created_at_raw is not None:
+            self._created_at = parse_timestamp(self.created_at_raw)
+        return self._created_at
+
+    def _astuple(self) -> Tuple[str, Optional[str], Optional[datetime]]:
+        return self.name, self.description, self.created_at
 
-Snapshot = NamedTuple('Snapshot', [
-    ('name', str),
-    ('description', Optional[str]),
-    ('created_at', Optional[datetime])
-])
+    def _asdict(self) -> Dict[str, Any]:
+        return dict(zip(self._fields, self._astuple()))
+
+    def _replace(self, **kwargs: Any) -> "Snapshot":
+        return Snapshot(**dict(self._asdict(), **kwargs))
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._astuple())
+
+    def __len__(self) -> int:
+        return len(self._fields)
+
+    def __getitem__(self, item: Any) -> Any:
+        return self._astuple()[item]
+
+    @staticmethod
+    def _other(other: Any) -> Optional[Tuple[Any, ...]]:
+        if isinstance(other, Snapshot):
+            return other._astuple()
+        return other if isinstance(other, tuple) else None
+
+    def __eq__(self, other: Any) -> bool:
+        other = self._other(other)
+        if other is None:
+            return NotImplemented
+        return self._astuple() == other
+
+    def __lt__(self, other: Any) -> bool:
+        other = self._other(other)
+        if other is None:
+            return NotImplemented
+        return self._astuple() < other
+
+    def __le__(self, other: Any) -> bool:
+        other = self._other(other)
+        if other is None:
+            return NotImplemented
+        return self._astuple() <= other
+
+    def __gt__(self, other: Any) -> bool:
+        other = self._other(other)
+        if other is None:
+            return NotImplemented
+        return self._astuple() > other
+
+    def __ge__(self, other: Any) -> bool:
+        other = self._other(other)
+        if other is None:
+            return NotImplemented
+        return self._astuple() >= other
+
+    def __hash__(self) -> int:
+        return hash(self._astuple())
+
+    def __repr__(self) -> str:
+        return "Snapshot(name=%r, description=%r, created_at=%r)" % self._astuple()
 
 
 class SnapshotAPISection(BaseAPIClient):
+    def __init__(self, *args: Any, package_cache: Optional[SnapshotPackageCache] = None, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.package_cache = package_cache
+
     @staticmethod
     def snapshot_from_response(api_response: Dict[str, Union[str, None]]) -> Snapshot:
         return Snapshot(
             # use a cast() here as `name` can never be None, but the `api_response` declaration can't handle that
             name=cast(str, api_response["Name"]),
             description=api_response["Description"] if "Description" in api_response else None,
-            created_at=iso8601.parse_date(
-                cast(str, api_response["CreatedAt"])
-            ) if "CreatedAt" in api_response else None,
+            # parsed on first access, see Snapshot.created_at
+            created_at_raw=api_response.get("CreatedAt"),
         )
 
     def list(self, sort: str = 'name') -> Sequence[Snapshot]:
@@ -38,7 +123,7 @@ class SnapshotAPISection(BaseAPIClient):
                                     "supported." % sort)
         resp = self.do_get("api/snapshots", params={"sort": sort})
         ret = []
-        for rsnap in resp.json():
+        for rsnap in self.decode_json(resp):
             ret.append(self.snapshot_from_response(rsnap))
         return ret
 
@@ -50,7 +135,7 @@ class SnapshotAPISection(BaseAPIClient):
             body["Description"] = description
 
         resp = self.do_post("api/repos/%s/snapshots" % quote(reponame), json=body)
-        return self.snapshot_from_response(resp.json())
+        return self.snapshot_from_response(self.decode_json(resp))
 
     def create_from_mirror(self, mirrorname: str, snapshotname: str, description: Optional[str] = None) -> Snapshot:
         body = {
@@ -61,7 +146,7 @@ class SnapshotAPISection(BaseAPIClient):
 
         resp = self.do_post("api/mirrors/%s/snapshots" %
                             quote(mirrorname), json=body)
-        return self.snapshot_from_response(resp.json())
+        return self.snapshot_from_response(self.decode_json(resp))
 
     def create_from_packages(self, snapshotname: str, description: Optional[str] = None,
                              source_snapshots: Optional[Sequence[str]] = None,
@@ -79,7 +164,7 @@ class SnapshotAPISection(BaseAPIClient):
             body["PackageRefs"] = package_refs
 
         resp = self.do_post("api/snapshots", json=body)
-        return self.snapshot_from_response(resp.json())
+        return self.snapshot_from_response(self.decode_json(resp))
 
     def update(self, snapshotname: str, newname: Optional[str] = None,
                newdescription: Optional[str] = None) -> Snapshot:
@@ -94,14 +179,14 @@ class SnapshotAPISection(BaseAPIClient):
             body["Description"] = newdescription
 
         resp = self.do_put("api/snapshots/%s" % quote(snapshotname), json=body)
-        return self.snapshot_from_response(resp.json())
+        return self.snapshot_from_response(self.decode_json(resp))
 
     def show(self, snapshotname: str) -> Snapshot:
         resp = self.do_get("api/snapshots/%s" % quote(snapshotname))
-        return self.snapshot_from_response(resp.json())
+        return self.snapshot_from_response(self.decode_json(resp))
 
-    def list_packages(self, snapshotname: str, query: Optional[str] = None, with_deps: bool = False,
-                      detailed: bool = False) -> Sequence[Package]:
+    @staticmethod
+    def _list_params(query: Optional[str], with_deps: bool, detailed: bool) -> Dict[str, str]:
         params = {}
         if query is not None:
             params["q"] = query
@@ -109,13 +194,41 @@ class SnapshotAPISection(BaseAPIClient):
             params["withDeps"] = "1"
         if detailed:
             params["format"] = "details"
+        return params
 
-        resp = self.do_get("api/snapshots/%s/packages" %
-                           quote(snapshotname), params=params)
-        ret = []
-        for rpkg in resp.json():
-            ret.append(PackageAPISection.package_from_response(rpkg))
-        return ret
+    def list_packages(self, snapshotname: str, query: Optional[str] = None, with_deps: bool = False,
+                      detailed: bool = False, fields: Optional[Sequence[str]] = None,
+                      lazy: bool = False) -> Sequence[Package]:
+        params = self._list_params(query, with_deps, detailed or fields is not None or lazy)
+        created_at = None
+        if self.package_cache is not None:
+            # revalidate: a snapshot that was deleted and recreated under the same name has a new timestamp
+            snapshot = self.show(snapshotname)
+            if snapshot.created_at_raw is not None:
+                created_at = snapshot.created_at_raw
+                cached = self.package_cache.get(snapshotname, created_at, params,
+                                                decode=PackageAPISection.package_from_response)
+                if cached is not None:
+                    return project_packages(cast(List[Package], cached), fields)
+
+        if self.package_cache is None or created_at is None:
+            return fetch_package_list(self, "api/snapshots/%s/packages" % quote(snapshotname), params,
+                                      fields=fields, lazy=lazy)
+
+        # cache the complete listing, so it can serve any projection later
+        ret = fetch_package_list(self, "api/snapshots/%s/packages" % quote(snapshotname), params)
+        self.package_cache.put(snapshotname, created_at, params, ret,
+                               raw_items=[pkg.key if pkg.fields is None else pkg.fields for pkg in ret])
+        return project_packages(ret, fields)
+
+    def iter_packages(self, snapshotname: str, query: Optional[str] = None, with_deps: bool = False,
+                      detailed: bool = False, fields: Optional[Sequence[str]] = None) -> Iterator[Package]:
+        """
+        Streaming variant of ``list_packages``, yielding each ``Package`` as soon as it has been received.
+        """
+        params = self._list_params(query, with_deps, detailed or fields is not None)
+        for rpkg in self.do_get_json_stream("api/snapshots/%s/packages" % quote(snapshotname), params=params):
+            yield PackageAPISection.package_from_response(rpkg, fields)
 
     def delete(self, snapshotname: str, force: bool = False) -> None:
         params = None
@@ -129,4 +242,89 @@ class SnapshotAPISection(BaseAPIClient):
     def diff(self, snapshot1: str, snapshot2: str) -> Sequence[Dict[str, str]]:
         resp = self.do_get("api/snapshots/%s/diff/%s" %
                            (quote(snapshot1), quote(snapshot2),))
-        return cast(List[Dict[str, str]], resp.json())
+        return cast(List[Dict[str, str]], self.decode_json(resp))
+
+    def local_diff(self, snapshot1: str, snapshot2: str,
+                   only_matching: bool = False) -> Sequence[Dict[str, Optional[str]]]:
+        """
+        Computes ``diff()`` on the client from the package lists of both snapshots, which ``snapshot_cache`` can
+        serve, see ``aptly_api.diff.diff_packages``.
+        """
+        return diff_packages(self.list_packages(snapshot1), self.list_packages(snapshot2), only_matching)
+
+    def diff_summary(self, snapshot1: str, snapshot2: str) -> DiffSummary:
+        """
+        :return: the number of removed, added and changed packages that ``local_diff()`` would return
+        """
+        return diff_summary(self.list_packages(snapshot1), self.list_packages(snapshot2))
+
+    def diff_matrix(self, snapshotnames: Sequence[str]) -> List[List[DiffSummary]]:
+        """
+        Compares each snapshot to every other one with a single package listing per snapshot.
+
+        :return: ``matrix[i][j]`` is the ``diff_summary()`` of ``snapshotnames[i]`` and ``snapshotnames[j]``
+        """
+        return diff_matrix([self.list_packages(name) for name in snapshotnames])
+
+    # the descriptions that aptly's command line gives the snapshots it creates
+    @staticmethod
+    def _merge_description(sources: Sequence[str]) -> str:
+        return "Merged from sources: %s" % ", ".join("'%s'" % name for name in sources)
+
+    @staticmethod
+    def _pull_description(snapshotname: str, source: str, queries: Sequence[str]) -> str:
+        return "Pulled into '%s' with '%s' as source, pull request was: '%s'" % (
+            snapshotname, source, " ".join(queries))
+
+    @staticmethod
+    def _filter_description(source: str, queries: Sequence[str]) -> str:
+        return "Filtered '%s', query was: '%s'" % (source, " ".join(queries))
+
+    def merge(self, destination: str, sources: Sequence[str], description: Optional[str] = None,
+              latest: bool = False, no_remove: bool = False) -> Snapshot:
+        """
+        Creates the snapshot ``destination`` from the packages of ``sources`` like ``aptly snapshot merge``. The
+        merge is computed locally by ``aptly_api.merge.merge_packages``, see there for ``latest`` and
+        ``no_remove``.
+        """
+        if not sources:
+            raise AptlyAPIException("Merging snapshots requires at least one source snapshot.")
+        if description is None:
+            description = self._merge_description(sources)
+        packages = merge_packages([self.list_packages(name) for name in sources], latest=latest, no_remove=no_remove)
+        return self.create_from_packages(destination, description=description, source_snapshots=sources,
+                                         package_refs=[pkg.key for pkg in packages])
+
+    def pull(self, snapshotname: str, source: str, destination: str, queries: Sequence[str],
+             description: Optional[str] = None, with_deps: bool = True, no_remove: bool = False,
+             all_matches: bool = False) -> Snapshot:
+        """
+        Creates the snapshot ``destination`` from ``snapshotname`` and the packages of ``source`` that match one
+        of ``queries`` like ``aptly snapshot pull``. Dependencies are resolved by the server within ``source``,
+        the result is computed locally by ``aptly_api.merge.pull_packages``, see there for ``no_remove`` and
+        ``all_matches``.
+        """
+        if not queries:
+            raise AptlyAPIException("Pulling packages requires at least one package query.")
+        if description is None:
+            description = self._pull_description(snapshotname, source, queries)
+        pulled = [self.list_packages(source, query=query, with_deps=with_deps) for query in queries]
+        packages = pull_packages(self.list_packages(snapshotname), itertools.chain(*pulled), no_remove=no_remove,
+                                 all_matches=all_matches)
+        return self.create_from_packages(destination, description=description, source_snapshots=[snapshotname, source],
+                                         package_refs=[pkg.key for pkg in packages])
+
+    def filter(self, source: str, destination: str, queries: Sequence[str], description: Optional[str] = None,
+               with_deps: bool = False) -> Snapshot:
+        """
+        Creates the snapshot ``destination`` from the packages of ``source`` that match any of ``queries`` like
+        ``aptly snapshot filter``.
+        """
+        if not queries:
+            raise AptlyAPIException("Filtering a snapshot requires at least one package query.")
+        if description is None:
+            description = self._filter_description(source, queries)
+        packages = PackageIndex(itertools.chain(*(self.list_packages(source, query=query, with_deps=with_deps)
+                                                  for query in queries)))
+        return self.create_from_packages(destination, description=description, source_snapshots=[source],
+                                         package_refs=[pkg.key for pkg in packages])
@@ -0,0 +1,85 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional, Tuple, Type, Iterable, FrozenSet  # noqa: F401
+
+IDEMPOTENT_METHODS = frozenset({"GET", "PUT", "DELETE"})  # type: FrozenSet[str]
+RETRY_STATUS_CODES = frozenset({429, 502, 503, 504})  # type: FrozenSet[int]
+
+
+class RetryPolicy:
+    """
+    Describes if and how ``BaseAPIClient`` retries failed requests.
+
+    A request is retried when it fails with one of ``status_codes`` or raises one of ``exceptions`` (by default the
+    transport errors of the HTTP library in use, i.e. connection resets and timeouts), up to ``max_attempts``
+    attempts in total. Between attempts the client sleeps for an exponentially growing, fully jittered delay of at
+    most ``max_backoff`` seconds, unless the server sent a ``Retry-After`` header, which takes precedence.
+
+    Only the idempotent verbs GET, PUT and DELETE are retried by default. Non-idempotent calls like
+    ``publish.publish`` or ``snapshots.create_from_repo`` are only retried when "POST" is explicitly included in
+    ``methods``.
+
+    Example:
+
+    .. code-block:: python
+        Client("http://aptly/", retry=RetryPolicy(max_attempts=5, methods={"GET", "PUT", "DELETE", "POST"}))
+    """
+    def __init__(self, max_attempts: int = 3, backoff_factor: float = 0.2, max_backoff: float = 10.0,
+                 status_codes: Iterable[int] = RETRY_STATUS_CODES,
+                 exceptions: Optional[Tuple[Type[BaseException], ...]] = None,
+                 methods: Iterable[str] = IDEMPOTENT_METHODS,
+                 respect_retry_after: bool = True, max_retry_after: float = 120.0) -> None:
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        self.max_attempts = max_attempts
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.status_codes = frozenset(status_codes)
+        self.exceptions = exceptions
+        self.methods = frozenset(m.upper() for m in methods)
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+
+    def allows(self, method: str, attempt: int) -> bool:
+        """
+        :return: whether another attempt may follow the failed attempt number ``attempt`` (starting at 1)
+        """
+        return method.upper() in self.methods and attempt < self.max_attempts
+
+    def retries_status(self, status_code: int) -> bool:
+        return status_code in self.status_codes
+
+    def retries_exception(self, exc: BaseException, transport_errors: Tuple[Type[BaseException], ...]) -> bool:
+        return isinstance(exc, self.exceptions if self.exceptions is not None else transport_errors)
+
+    def delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """
+        :return: the number of seconds to wait after the failed attempt number ``attempt`` (starting at 1)
+        """
+        if retry_after is not None and self.respect_retry_after:
+            server_delay = self.parse_retry_after(retry_after)
+            if server_delay is not None:
+                return min(server_delay, self.max_retry_after)
+
+        # "full jitter" spreads out the retries of concurrent clients hitting the same locked aptly database
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * (2 ** (attempt - 1))))
+
+    @staticmethod
+    def parse_retry_after(value: str) -> Optional[float]:
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
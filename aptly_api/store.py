@@ -0,0 +1,133 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional, Dict, Iterable, Tuple, Mapping, List, Sequence  # noqa: F401
+
+# stay well below SQLite's limit for host parameters in a single statement
+_BATCH_SIZE = 500
+
+
+def _placeholders(batch: Sequence[str]) -> str:
+    return ",".join("?" * len(batch))
+
+
+class PackageStore:
+    """
+    A persistent, content-addressed store for package details backed by SQLite. An aptly package key like
+    ``Pamd64 foo 1.0 1cc572a93625a9c9`` includes the hash of the package's files, so the details returned by
+    ``packages.show(key)`` never change and can be shared between processes and jobs indefinitely.
+
+    The database uses SQLite's write-ahead log, so readers don't block each other or a writer. Reads only write
+    back when an entry was last used more than ``touch_interval`` seconds ago, and the size is only checked after
+    about 1% of ``max_entries`` packages have been stored. When the store holds more than ``max_entries``
+    packages then, the least recently used ones are evicted, so it can temporarily hold about 1% more than that
+    per process. A store that stays locked for longer than ``timeout`` seconds is treated as a cache miss on
+    reads and skipped on writes, so the store never fails an API call.
+
+    Example:
+
+    .. code-block:: python
+        client = Client("http://aptly/", package_store=PackageStore("/var/cache/aptly-packages.sqlite"))
+    """
+    def __init__(self, path: str = ":memory:", max_entries: int = 1000000, timeout: float = 5.0,
+                 touch_interval: float = 3600.0) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self._lock = threading.Lock()
+        # the number of packages stored since the size was last checked
+        self._unchecked = 0
+        self._db = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # with a write-ahead log, this only risks losing the latest writes on a power failure, never corruption
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS packages ("
+                             "key TEXT PRIMARY KEY NOT NULL, fields TEXT NOT NULL, last_used REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS packages_last_used ON packages (last_used)")
+
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, str]]:
+        """
+        :return: a dict containing the fields of every package in ``keys`` that is in the store. Nothing is found
+                 if the store is locked.
+        """
+        keys = list(dict.fromkeys(keys))
+        ret = {}  # type: Dict[str, Dict[str, str]]
+        now = time.time()
+        stale = []  # type: List[str]
+        with self._lock:
+            try:
+                for ix in range(0, len(keys), _BATCH_SIZE):
+                    batch = keys[ix:ix + _BATCH_SIZE]
+                    for key, fields, last_used in self._db.execute(
+                            "SELECT key, fields, last_used FROM packages WHERE key IN (%s)" % _placeholders(batch),
+                            batch):
+                        ret[key] = json.loads(fields)
+                        if last_used < now - self.touch_interval:
+                            stale.append(key)
+            except sqlite3.OperationalError:
+                # e.g. "database is locked" when many processes share the store
+                return {}
+
+            # only entries that haven't been used for a while are written back, so most reads don't write
+            try:
+                with self._db:
+                    for ix in range(0, len(stale), _BATCH_SIZE):
+                        batch = stale[ix:ix + _BATCH_SIZE]
+                        self._db.execute("UPDATE packages SET last_used = ? WHERE key IN (%s)" %
+                                         _placeholders(batch), (now, *batch))
+            except sqlite3.OperationalError:
+                # they're written back by a later read
+                pass
+        return ret
+
+    def put(self, key: str, fields: Mapping[str, str]) -> None:
+        self.put_many([(key, fields)])
+
+    def put_many(self, items: Iterable[Tuple[str, Mapping[str, str]]]) -> None:
+        """
+        Stores the fields of packages. If the store is locked, nothing is stored.
+        """
+        now = time.time()
+        rows = [(key, json.dumps(dict(fields)), now) for key, fields in items]
+        try:
+            with self._lock, self._db:
+                self._db.executemany("INSERT OR REPLACE INTO packages (key, fields, last_used) VALUES (?, ?, ?)",
+                                     rows)
+                self._unchecked += len(rows)
+                if self._unchecked * 100 >= self.max_entries:
+                    self._evict()
+                    self._unchecked = 0
+        except sqlite3.OperationalError:
+            pass
+
+    def _evict(self) -> None:
+        count = self._db.execute("SELECT COUNT(*) FROM packages").fetchone()[0]
+        if count > self.max_entries:
+            self._db.execute("DELETE FROM packages WHERE key IN "
+                             "(SELECT key FROM packages ORDER BY last_used ASC LIMIT ?)",
+                             (count - self.max_entries,))
+
+    def __contains__(self, key: object) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM packages WHERE key = ?", (key,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return int(self._db.execute("SELECT COUNT(*) FROM packages").fetchone()[0])
+
+    def clear(self) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM packages")
+
+    def close(self) -> None:
+        self._db.close()
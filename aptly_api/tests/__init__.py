@@ -13,3 +13,17 @@ from .test_publish import *  # noqa
 from .test_repos import *  # noqa
 from .test_snapshots import *  # noqa
 from .test_mirrors import *  # noqa
+from .test_aio import *  # noqa
+from .test_retry import *  # noqa
+from .test_jsonutil import *  # noqa
+from .test_instrumentation import *  # noqa
+from .test_cache import *  # noqa
+from .test_store import *  # noqa
+from .test_multipart import *  # noqa
+from .test_debfile import *  # noqa
+from .test_transfer import *  # noqa
+from .test_debversion import *  # noqa
+from .test_index import *  # noqa
+from .test_diff import *  # noqa
+from .test_merge import *  # noqa
+from .test_timeutil import *  # noqa
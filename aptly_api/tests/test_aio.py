@@ -0,0 +1,692 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import asyncio
+import json
+import os
+import ssl
+import tempfile
+import threading
+import warnings
+from typing import Any, Dict, Tuple, List, Sequence, Iterator, cast  # noqa: F401
+from unittest import IsolatedAsyncioTestCase, mock
+
+import httpx
+
+from aptly_api.aio import AsyncClient
+from aptly_api.aio.base import AsyncBaseAPIClient, make_async_client, make_ssl_context
+from aptly_api.aio.parts.misc import AsyncMiscAPISection
+from aptly_api.aio.parts.mirrors import AsyncMirrorsAPISection
+from aptly_api.base import AptlyAPIException
+from aptly_api.cache import ResponseCache, SnapshotPackageCache
+from aptly_api.diff import DiffSummary
+from aptly_api.instrumentation import RequestInstrumentation, RequestRecord  # noqa: F401
+from aptly_api.multipart import UploadFile, upload_name  # noqa: F401
+from aptly_api.parts.files import UploadError
+from aptly_api.parts.mirrors import Mirror
+from aptly_api.parts.packages import Package
+from aptly_api.parts.publish import PublishEndpoint
+from aptly_api.parts.repos import Repo, FileReport
+from aptly_api.parts.snapshots import Snapshot
+from aptly_api.retry import RetryPolicy
+from aptly_api.store import PackageStore
+from aptly_api.tests.test_debfile import make_deb, CONTROL
+from aptly_api.transfer import TransferMeter, RateLimiter
+
+
+class MockAptly:
+    """
+    A minimal httpx transport handler that returns canned responses keyed by method and path.
+    """
+    def __init__(self) -> None:
+        self.routes = {}  # type: Dict[Tuple[str, str], Tuple[int, str]]
+        self.requests = []  # type: List[httpx.Request]
+
+    def add(self, method: str, path: str, text: str, status_code: int = 200) -> None:
+        self.routes[(method, path)] = (status_code, text)
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        status_code, text = self.routes[(request.method, request.url.path)]
+        return httpx.Response(status_code, text=text)
+
+    @property
+    def last_json(self) -> Any:
+        return json.loads(self.requests[-1].content)
+
+    @property
+    def last_params(self) -> Dict[str, str]:
+        return dict(self.requests[-1].url.params)
+
+
+_repo = '{"Name":"aptly-repo","Comment":"comment","DefaultDistribution":"stretch","DefaultComponent":"main"}'
+_snapshot = '{"Name":"aptly-repo-1","CreatedAt":"2017-06-03T23:43:40.275605639Z","Description":"desc"}'
+_endpoint = ('{"AcquireByHash":false,"Architectures":["amd64"],"Distribution":"mn-nightly","Label":"",'
+             '"Origin":"","Prefix":"nightly/stretch","SkipContents":false,"SourceKind":"local",'
+             '"Sources":[{"Component":"main","Name":"maurusnet"}],"Storage":"s3:maurusnet"}')
+_mirror = ('{"UUID":"2cb5985a","Name":"aptly-mirror","ArchiveRoot":"https://deb.example.com/",'
+           '"Distribution":"stretch","Components":["main"],"Architectures":["amd64"]}')
+_pkgkey = "Pamd64 authserver 0.1.14~dev0-1 1cc572a93625a9c9"
+
+
+class AsyncClientTests(IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.mock = MockAptly()
+        self.client = AsyncClient("http://test/")
+        # swap the pooled client for one that talks to the mock transport
+        http_client = httpx.AsyncClient(transport=httpx.MockTransport(self.mock))
+        for section in (self.client.files, self.client.misc, self.client.packages, self.client.publish,
+                        self.client.repos, self.client.snapshots, self.client.mirrors):
+            section.http_client = http_client
+        self.client.http_client = http_client
+
+    async def asyncTearDown(self) -> None:
+        await self.client.aclose()
+
+    def test_instantiate(self) -> None:
+        self.assertEqual(str(self.client), "AsyncClient (Aptly API Client) <http://test/>")
+        self.assertEqual(self.client.aptly_server_url, "http://test/")
+
+    async def test_shared_pool(self) -> None:
+        async with AsyncClient("http://test/", pool_size=3) as cl:
+            for section in (cl.files, cl.misc, cl.packages, cl.publish, cl.repos, cl.snapshots, cl.mirrors):
+                self.assertIs(section.http_client, cl.http_client)
+        self.assertTrue(cl.http_client.is_closed)
+
+    def test_ssl_context(self) -> None:
+        testcert = os.path.join(os.path.dirname(__file__), "testcert.pem")
+        self.assertIs(make_ssl_context(), True)
+        self.assertIs(make_ssl_context(False), False)
+        with warnings.catch_warnings():
+            # httpx deprecated passing CA bundle paths and client certificates
+            warnings.simplefilter("error", DeprecationWarning)
+            with tempfile.TemporaryDirectory() as capath:
+                for verify in (testcert, capath, True, None):
+                    context = make_ssl_context(verify, (testcert, testcert))
+                    self.assertIsInstance(context, ssl.SSLContext)
+                    self.assertEqual(cast(ssl.SSLContext, context).verify_mode, ssl.CERT_REQUIRED)
+                    asyncio.run(make_async_client(verify, (testcert, testcert)).aclose())
+            context = make_ssl_context(False, (testcert, testcert))
+            self.assertEqual(cast(ssl.SSLContext, context).verify_mode, ssl.CERT_NONE)
+            self.assertEqual(len(cast(ssl.SSLContext, make_ssl_context(testcert)).get_ca_certs()), 1)
+
+    async def test_standalone_section(self) -> None:
+        section = AsyncBaseAPIClient("http://test/", ssl_verify=False)
+        self.assertIsInstance(section.http_client, httpx.AsyncClient)
+        await section.http_client.aclose()
+
+    async def test_errors(self) -> None:
+        self.mock.add("GET", "/api/version", "this is not json", status_code=400)
+        with self.assertRaisesRegex(AptlyAPIException, "400 Bad Request this is not json"):
+            await self.client.misc.version()
+        self.mock.add("GET", "/api/repos", '{"error": "error", "meta": "meta"}', status_code=404)
+        with self.assertRaisesRegex(AptlyAPIException, r"404 - Not Found - error \(meta\)"):
+            await self.client.repos.list()
+        self.mock.add("GET", "/api/repos", '[{"error": "error"}]', status_code=500)
+        with self.assertRaises(AptlyAPIException) as ctx:
+            await self.client.repos.list()
+        self.assertEqual(ctx.exception.status_code, 500)
+        self.assertEqual(self.client.misc._error_from_response(httpx.Response(200)), "no error (status 200)")
+
+    async def test_json_decoder(self) -> None:
+        decoded = []  # type: List[bytes]
+
+        def decoder(data: bytes) -> Any:
+            decoded.append(data)
+            return json.loads(data)
+
+        for section in (self.client.misc, self.client.repos):
+            section.json_decoder = decoder
+        self.mock.add("GET", "/api/version", '{"Version": "1.0.0"}')
+        self.assertEqual(await self.client.misc.version(), "1.0.0")
+        self.mock.add("GET", "/api/repos", '{"error": "broken"}', status_code=500)
+        with self.assertRaisesRegex(AptlyAPIException, "broken"):
+            await self.client.repos.list()
+        self.assertEqual(decoded, [b'{"Version": "1.0.0"}', b'{"error": "broken"}'])
+        self.mock.add("GET", "/api/repos/x/packages", '["Pamd64 x 1.0 a1"]')
+        self.assertEqual([pkg.key async for pkg in self.client.repos.iter_packages("x")], ["Pamd64 x 1.0 a1"])
+        self.assertEqual(decoded[-1], b'["Pamd64 x 1.0 a1"]')
+        async with AsyncClient("http://test/", json_decoder=decoder) as cl:
+            self.assertIs(cl.packages.json_decoder, decoder)
+
+    async def test_misc(self) -> None:
+        self.mock.add("GET", "/api/version", '{"Version": "1.0.0"}')
+        self.assertEqual(await self.client.misc.version(), "1.0.0")
+        self.mock.add("GET", "/api/version", '{}')
+        with self.assertRaises(AptlyAPIException):
+            await self.client.misc.version()
+        with self.assertRaises(NotImplementedError):
+            await self.client.misc.graph("png")
+
+    async def test_files(self) -> None:
+        self.mock.add("GET", "/api/files", '["aptly-0.9"]')
+        self.assertSequenceEqual(await self.client.files.list(), ["aptly-0.9"])
+        self.mock.add("GET", "/api/files/dir", '["dir/a.deb"]')
+        self.assertSequenceEqual(await self.client.files.list("dir"), ["dir/a.deb"])
+        self.mock.add("POST", "/api/files/test", '["test/testpkg.deb"]')
+        self.assertSequenceEqual(
+            await self.client.files.upload("test", os.path.join(os.path.dirname(__file__), "testpkg.deb")),
+            ["test/testpkg.deb"],
+        )
+        self.assertIn(b'filename="testpkg.deb"', self.mock.requests[-1].content)
+        with self.assertRaises(AptlyAPIException):
+            await self.client.files.upload("test", "noexistant")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            files = []
+            for name in ("a.deb", "b.deb", "bad.deb"):
+                files.append(os.path.join(tmpdir, name))
+                with open(files[-1], "wb") as f:
+                    f.write(b"x")
+            self.client.files.rate_limiter = RateLimiter(1.0, burst=1.0)
+            with mock.patch("aptly_api.aio.base.asyncio.sleep") as sleep:
+                await self.client.files.upload("test", files[0])
+            self.assertGreater(sleep.call_count, 0)
+            self.client.files.rate_limiter = None
+            meter = TransferMeter()
+            self.assertSequenceEqual(await self.client.files.upload("test", *files[:2], concurrency=2, meter=meter),
+                                     ["test/testpkg.deb", "test/testpkg.deb"])
+            self.assertEqual([t.bytes_sent for t in meter.summary()], [1, 1])
+            await self.client.files.upload("test", files[0], meter=meter)
+            self.mock.add("POST", "/api/files/test", '{"error": "upload failed"}', status_code=500)
+            with self.assertRaises(UploadError) as ctx:
+                await self.client.files.upload("test", *files, concurrency=2)
+            self.assertEqual(len(ctx.exception.failed), 3)
+            self.mock.add("POST", "/api/files/test", '["test/a.deb"]')
+            self.assertSequenceEqual(await self.client.files.upload_directory("test", tmpdir, max_open=2, batch_size=2,
+                                                                              meter=meter),
+                                     ["test/a.deb", "test/a.deb"])
+            self.assertEqual(len(self.mock.requests), 11)
+            self.mock.add("GET", "/api/files/test", '["a.deb"]')
+            self.mock.add("GET", "/api/repos/aptly-repo/packages", '[]')
+            self.assertSequenceEqual(await self.client.files.upload_directory("test", tmpdir, skip_existing=True,
+                                                                              skip_in_repo="aptly-repo"),
+                                     ["test/a.deb"])
+            self.assertSequenceEqual(await self.client.files.upload("test", files[0], skip_existing=True), [])
+            self.assertEqual(len(self.mock.requests), 15)
+            self.mock.add("GET", "/api/files/test", '{"error": "not found"}', status_code=404)
+            self.assertSequenceEqual(await self.client.files.upload("test", files[0], skip_existing=True),
+                                     ["test/a.deb"])
+            self.mock.add("GET", "/api/files/test", '{"error": "broken"}', status_code=500)
+            with self.assertRaises(AptlyAPIException):
+                await self.client.files.upload("test", files[0], skip_existing=True)
+        self.mock.add("DELETE", "/api/files/test", '{}')
+        await self.client.files.delete("test")
+
+    async def test_files_connection_error(self) -> None:
+        self.mock.add("POST", "/api/files/test", '["test/a.deb"]')
+        upload = self.client.files._upload
+        files = [("a.deb", b"a"), ("b.deb", b"b")]  # type: List[UploadFile]
+
+        async def reset(destination: str, batch: Sequence[UploadFile], meter: Any = None) -> List[str]:
+            if batch[0] == files[1]:
+                raise httpx.ReadError("Connection reset by peer")
+            return await upload(destination, batch, meter)
+
+        with mock.patch.object(self.client.files, "_upload", reset), self.assertRaises(UploadError) as ctx:
+            await self.client.files.upload("test", *files, concurrency=2)
+        self.assertEqual(list(ctx.exception.failed), ["b.deb"])
+        self.assertIsInstance(ctx.exception.failed["b.deb"].__cause__, httpx.ReadError)
+        self.assertEqual(ctx.exception.uploaded, ["test/a.deb"])
+
+    async def test_upload_directory_lazy(self) -> None:
+        walked = []  # type: List[str]
+        walked_when_sent = []  # type: List[int]
+
+        async def send(destination: str, batch: Sequence[UploadFile], meter: Any = None) -> List[str]:
+            walked_when_sent.append(len(walked))
+            return ["test/%s" % upload_name(f) for f in batch]
+
+        def walk(path: str, pattern: str) -> Iterator[str]:
+            for ix in range(6):
+                walked.append("%s.deb" % ix)
+                yield walked[-1]
+
+        with mock.patch.object(self.client.files, "_upload", send), \
+                mock.patch("aptly_api.aio.parts.files.find_files", walk):
+            self.assertEqual(len(await self.client.files.upload_directory("test", "/", batch_size=2, max_open=1)), 6)
+        self.assertEqual(len(walked_when_sent), 3)
+        for ix, count in enumerate(walked_when_sent):
+            self.assertLessEqual(count, (ix + 2) * 2)
+
+    async def test_skip_in_repo_off_loop(self) -> None:
+        loop_ran = threading.Event()
+
+        async def tick() -> None:
+            loop_ran.set()
+
+        def digest(path: str) -> Tuple[int, str]:
+            # only returns if the event loop keeps running while the file is hashed
+            asyncio.run_coroutine_threadsafe(tick(), loop)
+            self.assertTrue(loop_ran.wait(5))
+            loop_ran.clear()
+            return 1, "0" * 64
+
+        loop = asyncio.get_running_loop()
+        self.mock.add("GET", "/api/repos/aptly-repo/packages",
+                      '[{"Key": "%s", "ShortKey": "x", "Size": "1", "SHA256": "%s"}]' % (_pkgkey, "1" * 64))
+        self.mock.add("POST", "/api/files/test", '["test/authserver.deb"]')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            deb = os.path.join(tmpdir, "authserver.deb")
+            make_deb(deb)
+            with mock.patch("aptly_api.parts.files.file_digest", side_effect=digest) as file_digest:
+                self.assertSequenceEqual(await self.client.files.upload_directory("test", tmpdir,
+                                                                                  skip_in_repo="aptly-repo"),
+                                         ["test/authserver.deb"])
+                self.assertSequenceEqual(await self.client.files.upload("test", deb, skip_in_repo="aptly-repo"),
+                                         ["test/authserver.deb"])
+            self.assertEqual(file_digest.call_count, 2)
+
+    async def test_files_in_memory(self) -> None:
+        self.mock.add("POST", "/api/files/test", '["test/a.deb"]')
+        self.assertSequenceEqual(await self.client.files.upload("test", ("a.deb", b"A" * 10)), ["test/a.deb"])
+        self.assertEqual(self.mock.requests[-1].headers["Content-Length"], str(len(self.mock.requests[-1].content)))
+        self.assertIn(b"A" * 10, self.mock.requests[-1].content)
+        await self.client.files.upload("test", ("a.deb", iter([b"B" * 10, b"B" * 5])))
+        self.assertNotIn("Content-Length", self.mock.requests[-1].headers)
+        self.assertEqual(self.mock.requests[-1].headers["Transfer-Encoding"], "chunked")
+        self.assertIn(b"B" * 15, self.mock.requests[-1].content)
+
+    async def test_packages(self) -> None:
+        self.mock.add("GET", "/api/packages/%s" % _pkgkey,
+                      '{"Key": "%s", "ShortKey": "Pamd64 authserver 0.1.14~dev0-1", '
+                      '"FilesHash": "1cc572a93625a9c9"}' % _pkgkey)
+        pkg = await self.client.packages.show(_pkgkey)
+        self.assertEqual(pkg.short_key, "Pamd64 authserver 0.1.14~dev0-1")
+        self.assertEqual(pkg.files_hash, "1cc572a93625a9c9")
+
+    async def test_repos(self) -> None:
+        repo = Repo(name="aptly-repo", comment="comment", default_distribution="stretch",
+                    default_component="main")
+        self.mock.add("POST", "/api/repos", _repo)
+        self.assertEqual(await self.client.repos.create("aptly-repo", comment="comment",
+                                                        default_distribution="stretch",
+                                                        default_component="main"), repo)
+        self.assertEqual(self.mock.last_json["DefaultComponent"], "main")
+        self.mock.add("GET", "/api/repos/aptly-repo", _repo)
+        self.assertEqual(await self.client.repos.show("aptly-repo"), repo)
+        self.mock.add("GET", "/api/repos", "[%s]" % _repo)
+        self.assertSequenceEqual(await self.client.repos.list(), [repo])
+        self.mock.add("PUT", "/api/repos/aptly-repo", _repo)
+        self.assertEqual(await self.client.repos.edit("aptly-repo", comment="comment",
+                                                      default_distribution="stretch",
+                                                      default_component="main"), repo)
+        with self.assertRaises(AptlyAPIException):
+            await self.client.repos.edit("aptly-repo")
+        self.mock.add("DELETE", "/api/repos/aptly-repo", '{}')
+        await self.client.repos.delete("aptly-repo", force=True)
+        self.assertEqual(self.mock.last_params, {"force": "1"})
+
+    async def test_repos_packages(self) -> None:
+        self.mock.add("GET", "/api/repos/aptly-repo/packages", '["%s"]' % _pkgkey)
+        self.assertSequenceEqual(
+            await self.client.repos.search_packages("aptly-repo", query="authserver", with_deps=True,
+                                                    detailed=True),
+            [Package(key=_pkgkey, short_key=None, files_hash=None, fields=None)]
+        )
+        self.assertEqual(self.mock.last_params, {"q": "authserver", "withDeps": "1", "format": "details"})
+        with self.assertRaises(AptlyAPIException):
+            await self.client.repos.search_packages("aptly-repo", with_deps=True)
+        self.mock.add("POST", "/api/repos/aptly-repo/packages", _repo)
+        await self.client.repos.add_packages_by_key("aptly-repo", _pkgkey)
+        self.assertEqual(self.mock.last_json, {"PackageRefs": [_pkgkey]})
+        self.mock.add("DELETE", "/api/repos/aptly-repo/packages", _repo)
+        await self.client.repos.delete_packages_by_key("aptly-repo", _pkgkey)
+        self.assertEqual(self.mock.last_json, {"PackageRefs": [_pkgkey]})
+        with tempfile.TemporaryDirectory() as tmpdir:
+            deb = os.path.join(tmpdir, "authserver.deb")
+            make_deb(deb, control=CONTROL.replace("1:0.1.14~dev0-1", "0.1.14~dev0-1"))
+            self.assertEqual(await self.client.repos.files_present("aptly-repo", [deb]), {deb: True})
+            threads = []  # type: List[threading.Thread]
+
+            def package_keys(path: str) -> List[str]:
+                threads.append(threading.current_thread())
+                return []
+
+            with mock.patch("aptly_api.parts.repos.package_keys", package_keys):
+                self.assertEqual(await self.client.repos.files_present("aptly-repo", [deb]), {deb: False})
+            # the control data is parsed in a worker thread, not on the event loop
+            self.assertEqual(len(threads), 1)
+            self.assertIsNot(threads[0], threading.current_thread())
+
+    async def test_package_fields(self) -> None:
+        details = '[{"Key": "%s", "Version": "0.1.14~dev0-1", "Description": " long"}]' % _pkgkey
+        self.mock.add("GET", "/api/repos/aptly-repo/packages", details)
+        pkgs = await self.client.repos.search_packages("aptly-repo", fields=["Version"], lazy=True)
+        self.assertEqual((pkgs[0].key, pkgs[0].fields), (_pkgkey, {"Version": "0.1.14~dev0-1"}))
+        self.assertEqual(self.mock.last_params, {"format": "details"})
+        self.mock.add("GET", "/api/snapshots/aptly-repo-1/packages", details)
+        pkgs = await self.client.snapshots.list_packages("aptly-repo-1", fields=["Description"])
+        self.assertEqual(pkgs[0].fields, {"Description": " long"})
+        self.mock.add("GET", "/api/mirrors/aptly-mirror/packages", details)
+        self.assertEqual([pkg.fields async for pkg in self.client.mirrors.iter_packages("aptly-mirror", fields=[])],
+                         [{}])
+
+    async def test_repos_uploaded_files(self) -> None:
+        report = '{"FailedFiles": [], "Report": {"Added": ["a added"], "Removed": [], "Warnings": []}}'
+        for kind in ("file", "include"):
+            self.mock.add("POST", "/api/repos/aptly-repo/%s/dir" % kind, report)
+            self.mock.add("POST", "/api/repos/aptly-repo/%s/dir/a.deb" % kind, report)
+        expected = FileReport(failed_files=[], report={"Added": ["a added"], "Removed": [], "Warnings": []})
+        self.assertEqual(await self.client.repos.add_uploaded_file("aptly-repo", "dir"), expected)
+        self.assertEqual(await self.client.repos.add_uploaded_file("aptly-repo", "dir", "a.deb",
+                                                                   force_replace=True), expected)
+        self.assertEqual(self.mock.last_params, {"noRemove": "0", "forceReplace": "1"})
+        self.assertEqual(await self.client.repos.include_uploaded_file("aptly-repo", "dir"), expected)
+        self.assertEqual(await self.client.repos.include_uploaded_file(
+            "aptly-repo", "dir", "a.deb", remove_processed_files=False, force_replace=True, accept_unsigned=True,
+            ignore_signature=True), expected)
+        self.assertEqual(self.mock.last_params, {"noRemoveFiles": "1", "forceReplace": "1", "acceptUnsigned": "1",
+                                                 "ignoreSignature": "1"})
+
+    async def test_snapshots(self) -> None:
+        self.mock.add("GET", "/api/snapshots", "[%s]" % _snapshot)
+        snapshots = await self.client.snapshots.list(sort="time")
+        self.assertEqual(len(snapshots), 1)
+        self.assertIsInstance(snapshots[0], Snapshot)
+        with self.assertRaises(AptlyAPIException):
+            await self.client.snapshots.list(sort="snoepsort")
+        self.mock.add("POST", "/api/repos/aptly-repo/snapshots", _snapshot)
+        self.assertEqual((await self.client.snapshots.create_from_repo("aptly-repo", "aptly-repo-1",
+                                                                       description="desc")).name, "aptly-repo-1")
+        self.mock.add("POST", "/api/mirrors/aptly-mirror/snapshots", _snapshot)
+        self.assertEqual((await self.client.snapshots.create_from_mirror("aptly-mirror", "aptly-repo-1",
+                                                                         description="desc")).name, "aptly-repo-1")
+        self.mock.add("POST", "/api/snapshots", _snapshot)
+        await self.client.snapshots.create_from_packages("aptly-repo-1", description="desc",
+                                                         source_snapshots=["a"], package_refs=[_pkgkey])
+        self.assertEqual(self.mock.last_json, {"Name": "aptly-repo-1", "Description": "desc",
+                                               "SourceSnapshots": ["a"], "PackageRefs": [_pkgkey]})
+        self.mock.add("PUT", "/api/snapshots/aptly-repo-1", _snapshot)
+        await self.client.snapshots.update("aptly-repo-1", newname="aptly-repo-1", newdescription="desc")
+        with self.assertRaises(AptlyAPIException):
+            await self.client.snapshots.update("aptly-repo-1")
+        self.mock.add("GET", "/api/snapshots/aptly-repo-1", _snapshot)
+        self.assertEqual((await self.client.snapshots.show("aptly-repo-1")).description, "desc")
+        self.mock.add("GET", "/api/snapshots/aptly-repo-1/packages", '["%s"]' % _pkgkey)
+        self.assertEqual((await self.client.snapshots.list_packages("aptly-repo-1", query="authserver",
+                                                                    with_deps=True, detailed=True))[0].key, _pkgkey)
+        self.assertEqual(self.mock.last_params, {"q": "authserver", "withDeps": "1", "format": "details"})
+        self.mock.add("DELETE", "/api/snapshots/aptly-repo-1", '{}')
+        await self.client.snapshots.delete("aptly-repo-1", force=True)
+        self.assertEqual(self.mock.last_params, {"force": "1"})
+        self.mock.add("GET", "/api/snapshots/a/diff/b", '[{"Left": null, "Right": "%s"}]' % _pkgkey)
+        self.assertSequenceEqual(await self.client.snapshots.diff("a", "b"), [{"Left": None, "Right": _pkgkey}])
+
+    async def test_merge_pull_filter(self) -> None:
+        self.mock.add("GET", "/api/snapshots/a/packages", '["Pamd64 nginx 1.10 a1"]')
+        self.mock.add("GET", "/api/snapshots/b/packages", '["%s"]' % _pkgkey)
+        self.mock.add("POST", "/api/snapshots", _snapshot)
+        await self.client.snapshots.merge("c", ["a", "b"])
+        self.assertEqual(self.mock.last_json, {"Name": "c", "Description": "Merged from sources: 'a', 'b'",
+                                               "SourceSnapshots": ["a", "b"],
+                                               "PackageRefs": ["Pamd64 nginx 1.10 a1", _pkgkey]})
+        await self.client.snapshots.pull("a", "b", "c", ["authserver"])
+        self.assertEqual(self.mock.last_json, {
+            "Name": "c", "Description": "Pulled into 'a' with 'b' as source, pull request was: 'authserver'",
+            "SourceSnapshots": ["a", "b"], "PackageRefs": ["Pamd64 nginx 1.10 a1", _pkgkey],
+        })
+        await self.client.snapshots.filter("b", "c", ["authserver"])
+        self.assertEqual(self.mock.last_json, {"Name": "c", "Description": "Filtered 'b', query was: 'authserver'",
+                                               "SourceSnapshots": ["b"], "PackageRefs": [_pkgkey]})
+        with self.assertRaises(AptlyAPIException):
+            await self.client.snapshots.merge("c", [])
+        with self.assertRaises(AptlyAPIException):
+            await self.client.snapshots.pull("a", "b", "c", [])
+        with self.assertRaises(AptlyAPIException):
+            await self.client.snapshots.filter("b", "c", [])
+
+    async def test_local_diff(self) -> None:
+        self.mock.add("GET", "/api/snapshots/a/packages", '[]')
+        self.mock.add("GET", "/api/snapshots/b/packages", '["%s"]' % _pkgkey)
+        self.assertSequenceEqual(await self.client.snapshots.local_diff("a", "b"), [{"Left": None, "Right": _pkgkey}])
+        self.assertEqual(await self.client.snapshots.diff_summary("b", "a"), DiffSummary(1, 0, 0))
+        self.assertEqual(await self.client.snapshots.diff_matrix(["a", "b"]),
+                         [[DiffSummary(0, 0, 0), DiffSummary(0, 1, 0)], [DiffSummary(1, 0, 0), DiffSummary(0, 0, 0)]])
+
+    async def test_publish(self) -> None:
+        self.mock.add("GET", "/api/publish", "[%s]" % _endpoint)
+        endpoints = await self.client.publish.list()
+        self.assertIsInstance(endpoints[0], PublishEndpoint)
+        self.mock.add("POST", "/api/publish/s3:maurusnet:nightly_stretch", _endpoint)
+        await self.client.publish.publish(
+            sources=[{"Name": "maurusnet"}], architectures=["amd64"], prefix="s3:maurusnet:nightly/stretch",
+            distribution="mn-nightly", label="label", origin="origin", force_overwrite=True, sign_gpgkey="A16BE921",
+            sign_keyring="kr", sign_secret_keyring="skr", sign_passphrase="pass", acquire_by_hash=True,
+        )
+        self.assertEqual(self.mock.last_json["Signing"], {"Batch": True, "GpgKey": "A16BE921", "Keyring": "kr",
+                                                          "SecretKeyring": "skr", "Passphrase": "pass"})
+        self.mock.add("POST", "/api/publish", _endpoint)
+        await self.client.publish.publish(sources=[{"Name": "maurusnet"}], architectures=["amd64"], sign_skip=True,
+                                          sign_passphrase_file="/tmp/pass")
+        self.assertEqual(self.mock.last_json["Signing"], {"Skip": True})
+        await self.client.publish.publish(sources=[{"Name": "maurusnet"}], architectures=["amd64"],
+                                          sign_passphrase_file="/tmp/pass")
+        self.assertEqual(self.mock.last_json["Signing"], {"Batch": True, "PassphraseFile": "/tmp/pass"})
+        with self.assertRaises(AptlyAPIException):
+            await self.client.publish.publish(sources=[{"Name": "x"}], architectures=["amd64"],
+                                              sign_passphrase="a", sign_passphrase_file="b")
+        with self.assertRaises(AptlyAPIException):
+            await self.client.publish.publish(sources=[{"x": "x"}], architectures=["amd64"])
+
+        self.mock.add("PUT", "/api/publish/s3:maurusnet:nightly_stretch/mn-nightly", _endpoint)
+        await self.client.publish.update(
+            prefix="s3:maurusnet:nightly/stretch", distribution="mn-nightly", snapshots=[{"Name": "a"}],
+            force_overwrite=True, sign_gpgkey="A16BE921", sign_keyring="kr", sign_secret_keyring="skr",
+            sign_passphrase="pass", skip_contents=True, skip_cleanup=True,
+        )
+        self.assertEqual(self.mock.last_json["SkipContents"], True)
+        await self.client.publish.update(prefix="s3:maurusnet:nightly/stretch", distribution="mn-nightly",
+                                         sign_skip=True)
+        await self.client.publish.update(prefix="s3:maurusnet:nightly/stretch", distribution="mn-nightly",
+                                         sign_passphrase_file="/tmp/pass")
+        self.assertEqual(self.mock.last_json, {"Signing": {"Batch": True, "PassphraseFile": "/tmp/pass"}})
+        with self.assertRaises(AptlyAPIException):
+            await self.client.publish.update(prefix="a", distribution="b", sign_passphrase="a",
+                                             sign_passphrase_file="b")
+        with self.assertRaises(AptlyAPIException):
+            await self.client.publish.update(prefix="a", distribution="b", snapshots=[{"x": "x"}])
+
+        self.mock.add("DELETE", "/api/publish/s3:maurusnet:nightly_stretch/mn-nightly", '{}')
+        await self.client.publish.drop(prefix="s3:maurusnet:nightly/stretch", distribution="mn-nightly",
+                                       force_delete=True)
+        self.assertEqual(self.mock.last_params, {"force": "1"})
+
+    async def test_mirrors(self) -> None:
+        self.mock.add("GET", "/api/mirrors", "[%s]" % _mirror)
+        mirrors = await self.client.mirrors.list()
+        self.assertIsInstance(mirrors[0], Mirror)
+        self.mock.add("GET", "/api/mirrors/aptly-mirror", _mirror)
+        self.assertEqual((await self.client.mirrors.show("aptly-mirror")).uuid, "2cb5985a")
+        self.mock.add("PUT", "/api/mirrors/aptly-mirror", '{}')
+        await self.client.mirrors.update("aptly-mirror", ignore_signatures=True)
+        self.assertEqual(self.mock.last_json, {"IgnoreSignatures": True})
+        await self.client.mirrors.edit(
+            "aptly-mirror", newname="b", archiveurl="http://x/", filter="f", architectures=["amd64"],
+            components=["main"], keyrings=["k"], filter_with_deps=True, skip_existing_packages=True,
+            download_sources=True, download_udebs=True, skip_component_check=True, ignore_checksums=True,
+            ignore_signatures=True, force_update=True,
+        )
+        self.assertEqual(len(self.mock.last_json), 14)
+        self.mock.add("GET", "/api/mirrors/aptly-mirror/packages", '["%s"]' % _pkgkey)
+        self.assertEqual((await self.client.mirrors.list_packages("aptly-mirror", query="authserver",
+                                                                  with_deps=True, detailed=True))[0].key, _pkgkey)
+        self.assertEqual(self.mock.last_params, {"q": "authserver", "withDeps": "1", "format": "details"})
+        self.mock.add("DELETE", "/api/mirrors/aptly-mirror", '{}')
+        await self.client.mirrors.delete("aptly-mirror")
+        self.mock.add("POST", "/api/mirrors", _mirror)
+        await self.client.mirrors.create(
+            "aptly-mirror", "https://deb.example.com/", distribution="stretch", filter="f", components=["main"],
+            architectures=["amd64"], keyrings=["k"], download_sources=True, download_udebs=True,
+            download_installer=True, filter_with_deps=True, skip_component_check=True,
+            skip_architecture_check=True, ignore_signatures=True,
+        )
+        self.assertEqual(len(self.mock.last_json), 14)
+
+    async def test_retry(self) -> None:
+        responses = [httpx.Response(503, text="locked"), httpx.ConnectError("reset"),
+                     httpx.Response(200, text='{"Version": "1.0.0"}')]
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            item = responses.pop(0)
+            if isinstance(item, Exception):
+                raise item
+            return item
+
+        section = AsyncMiscAPISection("http://test/", retry=RetryPolicy(),
+                                      http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        with mock.patch("asyncio.sleep") as sleep:
+            self.assertEqual(await section.version(), "1.0.0")
+        self.assertEqual(sleep.call_count, 2)
+
+        responses.extend([httpx.ConnectError("reset")] * 3)
+        with mock.patch("asyncio.sleep"):
+            with self.assertRaises(httpx.ConnectError):
+                await section.version()
+        self.assertEqual(responses, [])
+
+        responses.extend([httpx.Response(503, text="locked")] * 3)
+        with mock.patch("asyncio.sleep"):
+            with self.assertRaises(AptlyAPIException):
+                await section.version()
+        self.assertEqual(responses, [])
+
+    async def test_iter_packages(self) -> None:
+        for path in ("/api/repos/aptly-repo/packages", "/api/snapshots/aptly-repo-1/packages",
+                     "/api/mirrors/aptly-mirror/packages"):
+            self.mock.add("GET", path, '["%s", {"Key": "%s"}]' % (_pkgkey, _pkgkey))
+        for packages in (self.client.repos.iter_packages("aptly-repo", query="authserver", with_deps=True,
+                                                         detailed=True),
+                         self.client.snapshots.iter_packages("aptly-repo-1", detailed=True),
+                         self.client.mirrors.iter_packages("aptly-mirror", detailed=True)):
+            self.assertEqual([pkg.key async for pkg in packages], [_pkgkey, _pkgkey])
+        self.assertEqual(self.mock.last_params, {"format": "details"})
+
+        self.mock.add("GET", "/api/snapshots/aptly-repo-1/packages", '{"error": "not found"}', status_code=404)
+        with self.assertRaisesRegex(AptlyAPIException, "not found"):
+            async for pkg in self.client.snapshots.iter_packages("aptly-repo-1"):
+                pass  # pragma: no cover
+
+    async def test_instrumentation(self) -> None:
+        received = []  # type: List[RequestRecord]
+        instrumentation = RequestInstrumentation(sinks=[received.append])
+        for section in (self.client.repos, self.client.snapshots):
+            section.instrumentation = instrumentation
+        self.mock.add("GET", "/api/repos/aptly-repo", _repo)
+        self.mock.add("POST", "/api/repos", '{"error": "exists"}', status_code=400)
+        self.mock.add("GET", "/api/snapshots/aptly-repo-1/packages", '["%s"]' % _pkgkey)
+        await self.client.repos.show("aptly-repo")
+        with self.assertRaises(AptlyAPIException):
+            await self.client.repos.create("aptly-repo")
+        self.assertEqual([pkg.key async for pkg in self.client.snapshots.iter_packages("aptly-repo-1")],
+                         [_pkgkey])
+
+        self.assertEqual([(r.method, r.url_template, r.status_code) for r in received], [
+            ("GET", "api/repos/{name}", 200),
+            ("POST", "api/repos", 400),
+            ("GET", "api/snapshots/{name}/packages", 200),
+        ])
+        self.assertEqual(received[0].response_bytes, len(_repo))
+        self.assertEqual(received[1].request_bytes, len('{"Name":"aptly-repo"}'))
+        self.assertEqual(received[2].response_bytes, len('["%s"]' % _pkgkey))
+        self.assertIsNotNone(received[0].time_to_first_byte)
+        self.assertIn("exists", cast(str, received[1].error))
+        self.assertEqual(instrumentation.stats()["GET api/repos/{name}"].count, 1)
+        self.assertEqual(self.client.stats(), {})
+
+    async def test_instrumentation_transport_error(self) -> None:
+        received = []  # type: List[RequestRecord]
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            raise httpx.ConnectError("reset")
+
+        section = AsyncMiscAPISection("http://test/", instrumentation=RequestInstrumentation(sinks=[received.append]),
+                                      http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        with self.assertRaises(httpx.ConnectError):
+            await section.version()
+        self.assertEqual((received[0].status_code, received[0].time_to_first_byte, received[0].error),
+                         (None, None, "ConnectError: reset"))
+
+    async def test_streamed_without_length(self) -> None:
+        received = []  # type: List[RequestRecord]
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            resp = httpx.Response(200, content=b"[]")
+            del resp.headers["Content-Length"]
+            return resp
+
+        section = AsyncMirrorsAPISection("http://test/", instrumentation=RequestInstrumentation(
+            sinks=[received.append]), http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        self.assertEqual([pkg async for pkg in section.iter_packages("aptly-mirror")], [])
+        self.assertIsNone(received[0].response_bytes)
+
+    async def test_cache(self) -> None:
+        cache = ResponseCache()
+        for section in (self.client.repos, self.client.snapshots):
+            section.cache = cache
+        self.mock.add("GET", "/api/repos/aptly-repo", _repo)
+        self.mock.add("PUT", "/api/repos/aptly-repo", _repo)
+        self.mock.add("GET", "/api/snapshots/aptly-repo-1/packages", "[]")
+        await self.client.repos.show("aptly-repo")
+        await self.client.repos.show("aptly-repo")
+        self.assertEqual(len(self.mock.requests), 1)
+        await self.client.repos.edit("aptly-repo", comment="comment")
+        await self.client.repos.show("aptly-repo")
+        self.assertEqual(len(self.mock.requests), 3)
+        self.assertEqual([pkg async for pkg in self.client.snapshots.iter_packages("aptly-repo-1")], [])
+        self.assertEqual(len(cache), 1)
+
+    async def test_snapshot_package_cache(self) -> None:
+        self.client.snapshots.package_cache = SnapshotPackageCache()
+        self.mock.add("GET", "/api/snapshots/aptly-repo-1", _snapshot)
+        self.mock.add("GET", "/api/snapshots/aptly-repo-1/packages", '["%s"]' % _pkgkey)
+        for _ in range(2):
+            self.assertEqual([pkg.key for pkg in await self.client.snapshots.list_packages("aptly-repo-1")],
+                             [_pkgkey])
+        self.assertEqual([r.url.path for r in self.mock.requests], [
+            "/api/snapshots/aptly-repo-1", "/api/snapshots/aptly-repo-1/packages", "/api/snapshots/aptly-repo-1",
+        ])
+        self.mock.add("GET", "/api/snapshots/aptly-repo-2", '{"Name": "aptly-repo-2"}')
+        self.mock.add("GET", "/api/snapshots/aptly-repo-2/packages", '[]')
+        await self.client.snapshots.list_packages("aptly-repo-2")
+        self.assertEqual(len(self.mock.requests), 5)
+
+    async def test_package_store(self) -> None:
+        store = PackageStore()
+        for section in (self.client.packages, self.client.repos, self.client.snapshots):
+            section.package_store = store
+        details = '[{"Key": "%s", "Package": "authserver"}]' % _pkgkey
+        self.mock.add("GET", "/api/packages/%s" % _pkgkey, details[1:-1])
+        self.assertEqual((await self.client.packages.show(_pkgkey)).fields, {"Key": _pkgkey, "Package": "authserver"})
+        await self.client.packages.show(_pkgkey)
+        self.assertEqual(len(self.mock.requests), 1)
+
+        self.mock.add("GET", "/api/repos/aptly-repo/packages", '["Pall other 1.0 abc"]')
+        self.mock.add("GET", "/api/snapshots/aptly-repo-1/packages", '["%s"]' % _pkgkey)
+        # "Pall other 1.0 abc" isn't in the store, the mock returns the keys listing in place of the details
+        self.assertEqual((await self.client.repos.search_packages("aptly-repo", detailed=True))[0].fields, None)
+        self.assertEqual(self.mock.last_params, {"format": "details"})
+        pkgs = await self.client.snapshots.list_packages("aptly-repo-1", detailed=True)
+        self.assertEqual(pkgs[0].fields, {"Key": _pkgkey, "Package": "authserver"})
+        self.assertEqual(self.mock.last_params, {})
+
+    async def test_show_many(self) -> None:
+        store = PackageStore()
+        store.put("Pall a 1.0 aaa", {"Key": "Pall a 1.0 aaa"})
+        self.client.packages.package_store = store
+        self.mock.add("GET", "/api/packages/%s" % _pkgkey, '{"Key": "%s"}' % _pkgkey)
+        self.mock.add("GET", "/api/packages/Pall missing 1.0 ccc", '{"error": "key not found"}', status_code=404)
+        with mock.patch.object(store, "put_many", wraps=store.put_many) as put_many, \
+                mock.patch.object(store, "put", wraps=store.put) as put:
+            result = await self.client.packages.show_many(
+                [_pkgkey, "Pall missing 1.0 ccc", "Pall a 1.0 aaa", _pkgkey], concurrency=2)
+        self.assertEqual([pkg.key for pkg in result.packages], [_pkgkey, "Pall a 1.0 aaa"])
+        self.assertEqual(result.missing, ["Pall missing 1.0 ccc"])
+        self.assertEqual(len(self.mock.requests), 2)
+        put.assert_not_called()
+        put_many.assert_called_once()
+        self.assertEqual(store.get(_pkgkey), {"Key": _pkgkey})
+        self.mock.add("GET", "/api/packages/Pall broken 1.0 ddd", '{"error": "internal"}', status_code=500)
+        with self.assertRaises(AptlyAPIException):
+            await self.client.packages.show_many(["Pall broken 1.0 ddd"])
@@ -0,0 +1,192 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import os
+import tempfile
+from typing import List
+from unittest import mock
+from unittest.case import TestCase
+
+import requests_mock
+
+from aptly_api import Client
+from aptly_api.base import AptlyAPIException
+from aptly_api.cache import ResponseCache, SnapshotPackageCache
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self) -> None:
+        self.now = 0.0
+        self.cache = ResponseCache(ttl=10.0, maxsize=3, clock=lambda: self.now)
+
+    def _cached(self) -> List[str]:
+        return sorted(path for path, params in self.cache._entries.keys())
+
+    def test_ttl(self) -> None:
+        self.cache.put("api/repos", None, "repos")
+        self.assertEqual(self.cache.get("/api/repos/"), "repos")
+        self.now = 10.5
+        self.assertIsNone(self.cache.get("api/repos"))
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_params(self) -> None:
+        self.cache.put("api/snapshots", {"sort": "name"}, "by name")
+        self.assertEqual(self.cache.get("api/snapshots", {"sort": "name"}), "by name")
+        self.assertIsNone(self.cache.get("api/snapshots", {"sort": "time"}))
+        self.assertIsNone(self.cache.get("api/snapshots"))
+
+    def test_lru(self) -> None:
+        for path in ("api/repos/a", "api/repos/b", "api/repos/c"):
+            self.cache.put(path, None, path)
+        self.cache.get("api/repos/a")
+        self.cache.put("api/repos/d", None, "api/repos/d")
+        self.assertEqual(self._cached(), ["api/repos/a", "api/repos/c", "api/repos/d"])
+
+    def test_invalidate_item(self) -> None:
+        cache = ResponseCache()
+        for path in ("api/repos", "api/repos/x", "api/repos/x/packages", "api/repos/xy", "api/repos/y",
+                     "api/snapshots", "api/files/x"):
+            cache.put(path, None, path)
+        cache.invalidate("api/repos/x")
+        self.assertEqual(sorted(p for p, _ in cache._entries.keys()),
+                         ["api/files/x", "api/repos/xy", "api/repos/y", "api/snapshots"])
+
+    def test_invalidate_collection(self) -> None:
+        cache = ResponseCache()
+        for path in ("api/repos", "api/repos/x", "api/snapshots"):
+            cache.put(path, None, path)
+        cache.invalidate("api/repos")
+        self.assertEqual(sorted(p for p, _ in cache._entries.keys()), ["api/repos/x", "api/snapshots"])
+
+    def test_invalidate_related(self) -> None:
+        cache = ResponseCache()
+        for path in ("api/snapshots", "api/snapshots/x-1", "api/snapshots/a/diff/b", "api/files", "api/files/dir",
+                     "api/files/other", "api/repos/y"):
+            cache.put(path, None, path)
+        cache.invalidate("api/repos/x/snapshots")
+        cache.invalidate("api/repos/x/file/dir/a.deb")
+        cache.invalidate("api/snapshots/b")
+        self.assertEqual(sorted(p for p, _ in cache._entries.keys()),
+                         ["api/files/other", "api/repos/y", "api/snapshots/x-1"])
+
+    def test_clear(self) -> None:
+        self.cache.put("api/repos", None, "repos")
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+
+
+@requests_mock.Mocker(kw='rmock')
+class ClientCacheTests(TestCase):
+    def setUp(self) -> None:
+        self.client = Client("http://test/", cache=ResponseCache())
+
+    def test_read_through(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/repos/aptly-repo", text='{"Name": "aptly-repo", "Comment": "a"}')
+        rmock.get("http://test/api/repos", text='[{"Name": "aptly-repo"}]')
+        rmock.put("http://test/api/repos/aptly-repo", text='{"Name": "aptly-repo", "Comment": "b"}')
+        self.assertEqual(self.client.repos.show("aptly-repo").comment, "a")
+        self.assertEqual(self.client.repos.show("aptly-repo").comment, "a")
+        self.client.repos.list()
+        self.client.repos.list()
+        self.assertEqual(rmock.call_count, 2)
+
+        self.client.repos.edit("aptly-repo", comment="b")
+        self.client.repos.show("aptly-repo")
+        self.client.repos.list()
+        self.assertEqual(rmock.call_count, 5)
+
+    def test_cross_section(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/snapshots", text='[]')
+        rmock.post("http://test/api/repos/aptly-repo/snapshots",
+                   text='{"Name": "aptly-repo-1", "CreatedAt": "2017-06-03T23:43:40.275605639Z"}')
+        self.client.snapshots.list()
+        self.client.snapshots.create_from_repo("aptly-repo", "aptly-repo-1")
+        self.client.snapshots.list()
+        self.assertEqual(rmock.call_count, 3)
+
+    def test_failed_mutation_invalidates(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/repos", text='[]')
+        rmock.post("http://test/api/repos", status_code=400, text='{"error": "exists"}')
+        self.client.repos.list()
+        with self.assertRaises(AptlyAPIException):
+            self.client.repos.create("aptly-repo")
+        self.client.repos.list()
+        self.assertEqual(rmock.call_count, 3)
+
+    def test_errors_not_cached(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/repos/aptly-repo", status_code=404, text='{"error": "not found"}')
+        for _ in range(2):
+            with self.assertRaises(AptlyAPIException):
+                self.client.repos.show("aptly-repo")
+        self.assertEqual(rmock.call_count, 2)
+
+    def test_stream_bypasses(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/repos/aptly-repo/packages", text='[]')
+        list(self.client.repos.iter_packages("aptly-repo"))
+        list(self.client.repos.iter_packages("aptly-repo"))
+        self.assertEqual(rmock.call_count, 2)
+        self.assertEqual(len(self.client.repos.cache or []), 0)
+
+
+class SnapshotPackageCacheTests(TestCase):
+    def test_memory(self) -> None:
+        cache = SnapshotPackageCache(maxsize=2)
+        cache.put("a", "2017-06-03T23:43:40+00:00", None, ["Pall a 1 x"])
+        cache.put("b", "2017-06-03T23:43:40+00:00", {"q": "x"}, ["Pall b 1 x"])
+        self.assertEqual(cache.get("a", "2017-06-03T23:43:40+00:00"), ["Pall a 1 x"])
+        self.assertIsNone(cache.get("a", "2017-06-04T00:00:00+00:00"))
+        self.assertIsNone(cache.get("b", "2017-06-03T23:43:40+00:00"))
+        cache.put("c", "2017-06-03T23:43:40+00:00", None, ["Pall c 1 x"])
+        # "b" was least recently used
+        self.assertIsNone(cache.get("b", "2017-06-03T23:43:40+00:00", {"q": "x"}))
+        self.assertIsNotNone(cache.get("a", "2017-06-03T23:43:40+00:00"))
+        cache.clear()
+        self.assertIsNone(cache.get("a", "2017-06-03T23:43:40+00:00"))
+
+    def test_disk(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = SnapshotPackageCache(directory=os.path.join(tmpdir, "cache"))
+            cache.put("a", "ts", None, ["decoded"], raw_items=["Pall a 1 x"])
+            cache.put("memory-only", "ts", None, ["decoded"])
+            self.assertEqual(len(os.listdir(os.path.join(tmpdir, "cache"))), 1)
+
+            other = SnapshotPackageCache(directory=os.path.join(tmpdir, "cache"))
+            self.assertEqual(other.get("a", "ts", decode=lambda item: item.upper()), ["PALL A 1 X"])
+            self.assertIsNone(other.get("a", "other-ts"))
+            # now served from memory
+            self.assertEqual(other.get("a", "ts"), ["PALL A 1 X"])
+
+            with open(other._filename(other.make_key("b", "ts")), "wt") as f:
+                f.write('{"key": "something else", "items": []}')
+            self.assertIsNone(other.get("b", "ts"))
+            with open(other._filename(other.make_key("c", "ts")), "wt") as f:
+                f.write('{"key": ')
+            self.assertIsNone(other.get("c", "ts"))
+
+            other.clear()
+            self.assertEqual(os.listdir(os.path.join(tmpdir, "cache")), [])
+
+    def test_clear_shared_directory(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = SnapshotPackageCache(directory=tmpdir)
+            cache.put("a", "ts", None, ["decoded"], raw_items=["Pall a 1 x"])
+            interrupted = os.path.basename(cache._filename(cache.make_key("b", "ts"))) + ".x1y2.tmp"
+            foreign = ["other.json", "notes.tmp", "%s.json" % ("0" * 63), "%s.json.bak" % ("0" * 64)]
+            for fn in foreign + [interrupted]:
+                with open(os.path.join(tmpdir, fn), "wt") as f:
+                    f.write("{}")
+            with mock.patch("os.unlink", side_effect=[FileNotFoundError, None]):
+                cache.clear()
+            cache.clear()
+            # only the cache's own listings and temporary files are removed
+            self.assertEqual(sorted(os.listdir(tmpdir)), sorted(foreign))
+
+    def test_put_during_clear(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = SnapshotPackageCache(directory=tmpdir)
+            with mock.patch("os.replace", side_effect=FileNotFoundError):
+                cache.put("a", "ts", None, ["decoded"], raw_items=["Pall a 1 x"])
+            self.assertEqual(cache.get("a", "ts"), ["decoded"])
@@ -3,7 +3,9 @@
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
-from typing import Any, cast
+import json
+from typing import Any, List, cast  # noqa: F401
+from unittest import mock
 from unittest.case import TestCase
 
 import requests
@@ -14,6 +16,7 @@ from aptly_api import Client as AptlyClient
 
 # as we're testing the individual parts, this is rather simple
 from aptly_api.base import AptlyAPIException
+from aptly_api.cache import SnapshotPackageCache
 
 
 class ClientTests(TestCase):
@@ -115,3 +118,57 @@ class ClientTests(TestCase):
                            reason="test")
         with self.assertRaises(AptlyAPIException):
             self.client.files.do_delete("mock://test/api")
+
+    def test_shared_session(self) -> None:
+        cl = AptlyClient("http://test/")
+        for section in (cl.files, cl.misc, cl.packages, cl.publish, cl.repos, cl.snapshots, cl.mirrors):
+            self.assertIs(section.session, cl.session)
+
+    def test_pool_size(self) -> None:
+        cl = AptlyClient("http://test/", pool_size=32)
+        adapter = cl.session.get_adapter("https://test/")
+        self.assertEqual(cast(Any, adapter)._pool_maxsize, 32)
+
+    def test_context_manager(self) -> None:
+        cl = AptlyClient("http://test/")
+        with mock.patch.object(cl.session, "close") as close:
+            with cl as entered:
+                self.assertIs(entered, cl)
+            close.assert_called_once_with()
+
+    @requests_mock.Mocker(kw='rmock')
+    def test_session_reused(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/version", text='{"Version": "1.0.0"}')
+        rmock.get("http://test/api/repos", text='[]')
+        self.client.misc.version()
+        self.client.repos.list()
+        self.assertEqual(rmock.call_count, 2)
+
+    def test_snapshot_cache(self) -> None:
+        cache = SnapshotPackageCache()
+        self.assertIs(AptlyClient("http://test/", snapshot_cache=cache).snapshots.package_cache, cache)
+
+    @requests_mock.Mocker(kw='rmock')
+    def test_json_decoder(self, *, rmock: requests_mock.Mocker) -> None:
+        decoded = []  # type: List[bytes]
+
+        def decoder(data: bytes) -> Any:
+            decoded.append(data)
+            return json.loads(data)
+
+        cl = AptlyClient("http://test/", json_decoder=decoder)
+        for section in (cl.files, cl.misc, cl.packages, cl.publish, cl.repos, cl.snapshots, cl.mirrors):
+            self.assertIs(section.json_decoder, decoder)
+        rmock.get("http://test/api/repos", text='[]')
+        self.assertEqual(cl.repos.list(), [])
+        rmock.get("http://test/api/repos/x/packages", text='[{"Key": "Pamd64 x 1.0 a1", "Version": "1.0"}]')
+        fields = cl.repos.search_packages("x", lazy=True)[0].fields
+        self.assertEqual(fields, {"Key": "Pamd64 x 1.0 a1", "Version": "1.0"})
+        rmock.get("http://test/api/version", status_code=400, text='{"error": "broken"}')
+        with self.assertRaisesRegex(AptlyAPIException, "broken"):
+            cl.misc.version()
+        # lazy listings only split the array and decode each package's details when they're accessed
+        self.assertEqual(decoded, [b'[]', b'{"Key": "Pamd64 x 1.0 a1", "Version": "1.0"}', b'{"error": "broken"}'])
+        # streamed listings decode their elements with it, too
+        self.assertEqual([pkg.key for pkg in cl.repos.iter_packages("x")], ["Pamd64 x 1.0 a1"])
+        self.assertEqual(decoded[-1], b'[{"Key": "Pamd64 x 1.0 a1", "Version": "1.0"}]')
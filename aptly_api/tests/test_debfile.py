@@ -0,0 +1,180 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import hashlib
+import io
+import os
+import sys
+import tarfile
+import tempfile
+import types
+import unittest
+from typing import Optional, Any, cast
+from unittest import mock
+from unittest.case import TestCase
+
+from aptly_api.base import AptlyAPIException
+from aptly_api.debfile import parse_control, read_deb_control, short_key, file_digest, package_keys, \
+    read_control_file, strip_signature
+
+CONTROL = """Package: authserver
+Version: 1:0.1.14~dev0-1
+Architecture: amd64
+Maintainer: Jonas Maurus
+Description: an example
+ with a continuation line
+ .
+ and another one
+"""
+
+DSC = """-----BEGIN PGP SIGNED MESSAGE-----
+Hash: SHA256
+
+Format: 3.0 (quilt)
+Source: authserver
+Binary: authserver, authserver-doc
+Version: 1:0.1.14~dev0-1
+-----BEGIN PGP SIGNATURE-----
+
+iQIzBAEBCAAdFiEE
+-----END PGP SIGNATURE-----
+"""
+
+CHANGES = """Format: 1.8
+Source: authserver
+Binary: authserver authserver-doc
+Architecture: source amd64 all
+Version: 1:0.1.14~dev0-1
+Files:
+ 0c8b8d6e8a5e0f34d6c2c87bb9fd7cb1 1234 python optional authserver_0.1.14~dev0-1.dsc
+ 5b7d16c28dab5b8ae1f1eed4d2e7e4a0 4321 python optional authserver_0.1.14~dev0-1.debian.tar.xz
+ d41d8cd98f00b204e9800998ecf8427e 100 python optional authserver_0.1.14~dev0-1_amd64.deb
+ d41d8cd98f00b204e9800998ecf8427e 100 doc optional authserver-doc_0.1.14~dev0-1+b1_all.deb
+"""
+
+
+def _ar_member(name: str, data: bytes) -> bytes:
+    header = "%-16s%-12s%-6s%-6s%-8s%-10s`\n" % (name, 0, 0, 0, 100644, len(data))
+    return header.encode("ascii") + data + (b"\n" if len(data) % 2 else b"")
+
+
+def make_deb(path: str, control: str = CONTROL, compression: str = "gz", data: bytes = b"payload",
+             control_name: Optional[str] = "./control") -> None:
+    """
+    Writes a minimal Debian binary package to ``path``.
+    """
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode=cast(Any, "w:%s" % compression)) as tar:
+        if control_name is not None:
+            encoded = control.encode("utf-8")
+            info = tarfile.TarInfo(control_name)
+            info.size = len(encoded)
+            tar.addfile(info, io.BytesIO(encoded))
+    with open(path, "wb") as f:
+        f.write(b"!<arch>\n")
+        f.write(_ar_member("debian-binary", b"2.0\n"))
+        # an odd-sized member before the control member exercises the ar padding
+        f.write(_ar_member("_extra", b"x"))
+        f.write(_ar_member("control.tar.%s" % compression, buf.getvalue()))
+        f.write(_ar_member("data.tar.%s" % compression, data))
+
+
+class DebFileTests(TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.tmpdir.name, name)
+
+    def test_parse_control(self) -> None:
+        fields = parse_control("\n" + CONTROL + "\nPackage: second paragraph\n")
+        self.assertEqual(fields["Package"], "authserver")
+        self.assertEqual(fields["Description"], "an example\n with a continuation line\n .\n and another one")
+        self.assertEqual(short_key(fields), "Pamd64 authserver 1:0.1.14~dev0-1")
+        with self.assertRaises(AptlyAPIException):
+            parse_control("Package: a\ninvalid line\n")
+        self.assertEqual(parse_control(" stray continuation\nPackage: a"), {"Package": "a"})
+
+    def test_read_deb_control(self) -> None:
+        for compression in ("gz", "xz", "bz2"):
+            make_deb(self._path("pkg.deb"), compression=compression)
+            self.assertEqual(short_key(read_deb_control(self._path("pkg.deb"))), "Pamd64 authserver 1:0.1.14~dev0-1")
+        make_deb(self._path("pkg.deb"), control_name="control")
+        self.assertEqual(read_deb_control(self._path("pkg.deb"))["Architecture"], "amd64")
+
+    def test_invalid_debs(self) -> None:
+        with open(self._path("empty.deb"), "wb"):
+            pass
+        with self.assertRaises(AptlyAPIException):
+            read_deb_control(self._path("empty.deb"))
+        with open(self._path("truncated.deb"), "wb") as f:
+            f.write(b"!<arch>\n" + _ar_member("debian-binary", b"2.0\n"))
+        with self.assertRaises(AptlyAPIException):
+            read_deb_control(self._path("truncated.deb"))
+        make_deb(self._path("nocontrol.deb"), control_name="./md5sums")
+        with self.assertRaises(AptlyAPIException):
+            read_deb_control(self._path("nocontrol.deb"))
+        with open(self._path("zstd.deb"), "wb") as f:
+            f.write(b"!<arch>\n" + _ar_member("control.tar.zst", b"zstd"))
+        with mock.patch.dict(sys.modules, {"compression": None, "zstandard": None}), \
+                self.assertRaisesRegex(AptlyAPIException, "requires Python 3.14 or the zstandard module"):
+            read_deb_control(self._path("zstd.deb"))
+
+    def test_read_deb_control_zstd(self) -> None:
+        # stand-ins for both zstd implementations that pass the (uncompressed) member through
+        buf = io.BytesIO()
+        with tarfile.open(fileobj=buf, mode="w") as tar:
+            info = tarfile.TarInfo("./control")
+            info.size = len(CONTROL.encode("utf-8"))
+            tar.addfile(info, io.BytesIO(CONTROL.encode("utf-8")))
+        with open(self._path("zstd.deb"), "wb") as f:
+            f.write(b"!<arch>\n" + _ar_member("control.tar.zst", buf.getvalue()))
+        compression = types.ModuleType("compression")
+        setattr(compression, "zstd", types.SimpleNamespace(ZstdFile=lambda fileobj: fileobj))
+        with mock.patch.dict(sys.modules, {"compression": compression}):
+            self.assertEqual(read_deb_control(self._path("zstd.deb"))["Package"], "authserver")
+        zstandard = types.ModuleType("zstandard")
+        setattr(zstandard, "ZstdDecompressor", lambda: types.SimpleNamespace(stream_reader=lambda fileobj: fileobj))
+        with mock.patch.dict(sys.modules, {"compression": None, "zstandard": zstandard}):
+            self.assertEqual(read_deb_control(self._path("zstd.deb"))["Package"], "authserver")
+
+    @unittest.skipUnless(sys.version_info >= (3, 14), "tarfile supports zstd since Python 3.14")
+    def test_read_deb_control_zstd_native(self) -> None:  # pragma: no cover
+        make_deb(self._path("zstd.deb"), compression="zst")
+        self.assertEqual(read_deb_control(self._path("zstd.deb"))["Package"], "authserver")
+
+    def test_strip_signature(self) -> None:
+        self.assertEqual(parse_control(strip_signature(DSC))["Source"], "authserver")
+        self.assertEqual(strip_signature(CHANGES), CHANGES)
+        self.assertEqual(strip_signature("-----BEGIN PGP SIGNED MESSAGE-----\nSource: a"), "Source: a")
+
+    def test_package_keys(self) -> None:
+        make_deb(self._path("pkg.deb"))
+        make_deb(self._path("pkg.udeb"))
+        for name, content in (("pkg.dsc", DSC), ("pkg.changes", CHANGES), ("noepoch.changes",
+                              CHANGES.replace("1:0.1", "0.1")), ("empty.changes", "Source: a\nVersion: 1.0\n")):
+            with open(self._path(name), "wt") as f:
+                f.write(content)
+        self.assertEqual(package_keys(self._path("pkg.deb")), ["Pamd64 authserver 1:0.1.14~dev0-1"])
+        self.assertEqual(package_keys(self._path("pkg.udeb")), ["Pamd64 authserver 1:0.1.14~dev0-1"])
+        self.assertEqual(package_keys(self._path("pkg.dsc")), ["Psource authserver 1:0.1.14~dev0-1"])
+        self.assertEqual(read_control_file(self._path("pkg.dsc"))["Binary"], "authserver, authserver-doc")
+        self.assertEqual(package_keys(self._path("pkg.changes")), [
+            "Psource authserver 1:0.1.14~dev0-1",
+            "Pamd64 authserver 1:0.1.14~dev0-1",
+            "Pall authserver-doc 1:0.1.14~dev0-1+b1",
+        ])
+        self.assertEqual(package_keys(self._path("noepoch.changes"))[2], "Pall authserver-doc 0.1.14~dev0-1+b1")
+        self.assertEqual(package_keys(self._path("empty.changes")), [])
+        with self.assertRaises(AptlyAPIException):
+            package_keys(self._path("pkg.tar.gz"))
+
+    def test_file_digest(self) -> None:
+        with open(self._path("file"), "wb") as f:
+            f.write(b"x" * 100000)
+        self.assertEqual(file_digest(self._path("file")), (100000, hashlib.sha256(b"x" * 100000).hexdigest()))
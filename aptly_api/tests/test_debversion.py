@@ -0,0 +1,81 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import functools
+import random
+from unittest.case import TestCase
+
+from aptly_api.base import AptlyAPIException
+from aptly_api.debversion import compare_versions, version_key, split_version, package_version, \
+    package_key_sort_key, newest_packages, outdated_packages
+
+# every version sorts strictly before the next one, according to dpkg --compare-versions
+_ORDERED = [
+    "~~", "~~a", "~", "0~rc1", "0", "0.1", "1.0~rc1", "1.0~rc1-1", "1.0", "1.0-1~bpo1", "1.0-1",
+    "1.0-1+b1", "1.0-1.1", "1.0-2", "1.0-10", "1.0a", "1.0+dfsg", "1.0.0", "1.0.1", "1.00.2", "1.1", "1.10",
+    "1.10a", "1.a", "2:", "2:0.1", "10:0.1",
+]
+
+
+class DebianVersionTests(TestCase):
+    def test_split(self) -> None:
+        self.assertEqual(split_version("1:2.3-4-5"), (1, "2.3-4", "5"))
+        self.assertEqual(split_version(" 2.3 "), (0, "2.3", ""))
+        with self.assertRaises(AptlyAPIException):
+            split_version("x:1.0")
+
+    def test_compare(self) -> None:
+        for ix, a in enumerate(_ORDERED):
+            for b in _ORDERED[ix + 1:]:
+                self.assertLess(compare_versions(a, b), 0, (a, b))
+                self.assertGreater(compare_versions(b, a), 0, (b, a))
+            self.assertEqual(compare_versions(a, a), 0)
+        self.assertEqual(compare_versions("1.01", "1.1"), 0)
+        self.assertEqual(compare_versions("0:1.0", "1.0-"), 0)
+        self.assertEqual(compare_versions("1.0", "1.0-0"), 0)
+        self.assertGreater(compare_versions("1.012", "1.2"), 0)
+        self.assertGreater(compare_versions("1.21", "1.3a"), 0)
+
+    def test_key(self) -> None:
+        shuffled = list(_ORDERED)
+        random.Random(42).shuffle(shuffled)
+        self.assertEqual(sorted(shuffled, key=version_key), _ORDERED)
+        self.assertEqual(version_key("1.01"), version_key("1.1"))
+        self.assertEqual(version_key("a"), version_key("a0"))
+        self.assertEqual(version_key(""), version_key("0"))
+
+    def test_key_matches_compare(self) -> None:
+        rnd = random.Random(1)
+        alphabet = "0129.~+-ab:"
+        versions = ["".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 6))).lstrip(":")
+                    for _ in range(2000)]
+        versions = [v for v in versions if ":" not in v or v.split(":", 1)[0].isdigit()]
+        by_compare = sorted(versions, key=functools.cmp_to_key(compare_versions))
+        by_key = sorted(versions, key=version_key)
+        self.assertEqual([version_key(v) for v in by_compare], [version_key(v) for v in by_key])
+        for a, b in zip(by_key, by_key[1:]):
+            self.assertEqual(version_key(a) < version_key(b), compare_versions(a, b) < 0, (a, b))
+
+    def test_memoized(self) -> None:
+        version_key.cache_clear()
+        version_key("1.0-1")
+        version_key("1.0-1")
+        self.assertEqual(version_key.cache_info().hits, 1)
+
+    def test_package_keys(self) -> None:
+        keys = [
+            "Pamd64 nginx 1.10.0-1 a1", "Pamd64 nginx 1.9.15-1 a2", "Pi386 nginx 1.9.15-1 a3",
+            "Pamd64 nginx 1:1.2-1 a4", "Pamd64 curl 7.50~rc1 b1", "Pamd64 curl 7.50 b2",
+        ]
+        self.assertEqual(package_version(keys[0]), "1.10.0-1")
+        with self.assertRaises(AptlyAPIException):
+            package_version("nginx 1.0")
+        self.assertEqual(sorted(keys, key=package_key_sort_key),
+                         [keys[4], keys[5], keys[1], keys[0], keys[3], keys[2]])
+        self.assertEqual(newest_packages(keys), [keys[5], keys[3], keys[2]])
+        self.assertEqual(newest_packages(keys, keep=2), [keys[4], keys[5], keys[0], keys[3], keys[2]])
+        self.assertEqual(newest_packages(keys, keep=0), [])
+        self.assertEqual(outdated_packages(keys), [keys[4], keys[1], keys[0]])
+        self.assertEqual(outdated_packages(keys, keep=0), [keys[4], keys[5], keys[1], keys[0], keys[3], keys[2]])
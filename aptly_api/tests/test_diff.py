@@ -0,0 +1,75 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import random
+from typing import List, Dict, Optional, Union  # noqa: F401
+from unittest.case import TestCase
+
+from aptly_api.diff import DiffSummary, diff_packages, diff_summary, diff_matrix
+from aptly_api.parts.packages import Package
+
+
+def _aptly_diff(left: List[str], right: List[str]) -> List[Dict[str, Optional[str]]]:
+    # a straight port of aptly's PackageRefList.Diff
+    lrefs, rrefs = sorted(set(left)), sorted(set(right))
+    il, ir, ret = 0, 0, []  # type: int, int, List[Dict[str, Optional[str]]]
+    while il < len(lrefs) or ir < len(rrefs):
+        lkey = lrefs[il] if il < len(lrefs) else None
+        rkey = rrefs[ir] if ir < len(rrefs) else None
+        if lkey == rkey:
+            il += 1
+            ir += 1
+        elif lkey is not None and rkey is not None and lkey.split(" ")[:2] == rkey.split(" ")[:2]:
+            ret.append({"Left": lkey, "Right": rkey})
+            il += 1
+            ir += 1
+        elif rkey is None or (lkey is not None and lkey < rkey):
+            ret.append({"Left": lkey, "Right": None})
+            il += 1
+        else:
+            ret.append({"Left": None, "Right": rkey})
+            ir += 1
+    return ret
+
+
+def _snapshot(rnd: random.Random, versions: int = 1) -> List[str]:
+    keys = []
+    for name in ("a", "a-b", "lib", "z"):
+        for arch in ("amd64", "i386"):
+            for version in rnd.sample(["1.0", "1.1", "2.0", "10.0"], rnd.randint(0, versions)):
+                keys.append("P%s %s %s %s" % (arch, name, version, name))
+    return keys
+
+
+class DiffTests(TestCase):
+    def test_diff(self) -> None:
+        left = ["Pamd64 nginx 1.10 a1", "Pamd64 curl 7.50 b1", "Pi386 curl 7.50 b2", "Pamd64 zsh 5.0 c1"]
+        right = [Package(key="Pamd64 nginx 1.12 a2", short_key=None, files_hash=None, fields=None),
+                 "Pamd64 curl 7.50 b1", "Pamd64 bash 5.0 d1", "Pamd64 zsh 5.0 c1"]  # type: List[Union[str, Package]]
+        self.assertEqual(diff_packages(left, right), [
+            {"Left": None, "Right": "Pamd64 bash 5.0 d1"},
+            {"Left": "Pamd64 nginx 1.10 a1", "Right": "Pamd64 nginx 1.12 a2"},
+            {"Left": "Pi386 curl 7.50 b2", "Right": None},
+        ])
+        self.assertEqual(diff_packages(left, right, only_matching=True),
+                         [{"Left": "Pamd64 nginx 1.10 a1", "Right": "Pamd64 nginx 1.12 a2"}])
+        self.assertEqual(diff_summary(left, right), DiffSummary(removed=1, added=1, changed=1))
+        self.assertEqual(diff_summary(right, right), DiffSummary(0, 0, 0))
+
+    def test_matches_aptly(self) -> None:
+        rnd = random.Random(3)
+        for _ in range(300):
+            left, right = _snapshot(rnd), _snapshot(rnd)
+            self.assertEqual(diff_packages(left, right), _aptly_diff(left, right))
+
+    def test_matrix(self) -> None:
+        rnd = random.Random(7)
+        snapshots = [_snapshot(rnd, versions=3) for _ in range(6)] + [[]]
+        matrix = diff_matrix(snapshots)
+        for i, left in enumerate(snapshots):
+            for j, right in enumerate(snapshots):
+                self.assertEqual(matrix[i][j], diff_summary(left, right), (i, j))
+        self.assertEqual(diff_matrix([snapshots[0], snapshots[0]]), [[DiffSummary(0, 0, 0)] * 2] * 2)
+        self.assertEqual(diff_matrix([]), [])
@@ -3,15 +3,33 @@
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
-from typing import Any
+from typing import Any, List, Iterator, cast
 
+import io
+import json
 import os
+import re
+import tempfile
+from unittest import mock
 from unittest.case import TestCase
 
+import requests
 import requests_mock
 
 from aptly_api.base import AptlyAPIException
-from aptly_api.parts.files import FilesAPISection
+from aptly_api.debfile import file_digest
+from aptly_api.multipart import MultipartEncoder
+from aptly_api.parts.files import FilesAPISection, UploadError, balanced_batches
+from aptly_api.tests.test_debfile import make_deb, CONTROL
+from aptly_api.transfer import TransferMeter, UploadProgress  # noqa: F401
+
+
+def _uploaded_names(request: Any, context: Any) -> str:
+    names = re.findall(rb'filename="([^"]+)"', request.body.read())
+    if any(b"bad" in name for name in names):
+        context.status_code = 500
+        return '{"error": "upload failed"}'
+    return "[%s]" % ", ".join('"test/%s"' % name.decode() for name in names)
 
 
 @requests_mock.Mocker(kw='rmock')
@@ -35,6 +53,16 @@ class FilesAPISectionTests(TestCase):
             ['test/testpkg.deb'],
         )
 
+    def test_upload_streamed(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.post("http://test/api/files/test", text='["test/testpkg.deb"]')
+        fn = os.path.join(os.path.dirname(__file__), "testpkg.deb")
+        self.fapi.upload("test", fn)
+        request = rmock.request_history[0]
+        self.assertEqual(int(request.headers["Content-Length"]), len(request.body))
+        self.assertTrue(request.headers["Content-Type"].startswith("multipart/form-data; boundary="))
+        with open(fn, "rb") as f:
+            self.assertIn(f.read(), request.body.read())
+
     def test_upload_invalid(self, *, rmock: requests_mock.Mocker) -> None:
         with self.assertRaises(AptlyAPIException):
             self.fapi.upload("test", "noexistant")
@@ -45,6 +73,178 @@ class FilesAPISectionTests(TestCase):
         with self.assertRaises(AptlyAPIException):
             self.fapi.upload("test", os.path.join(os.path.dirname(__file__), "testpkg.deb"))
 
+    def _make_files(self, tmpdir: str, sizes: List[int], prefix: str = "pkg") -> List[str]:
+        files = []
+        for ix, size in enumerate(sizes):
+            files.append(os.path.join(tmpdir, "%s%s.deb" % (prefix, ix)))
+            with open(files[-1], "wb") as f:
+                f.write(b"x" * size)
+        return files
+
+    def test_balanced_batches(self, *, rmock: requests_mock.Mocker) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            files = self._make_files(tmpdir, [10, 60, 30, 40, 20])
+            batches = cast(List[List[str]], balanced_batches(files, 2))
+            self.assertEqual(sorted(sum(os.path.getsize(f) for f in batch) for batch in batches), [80, 80])
+            for batch in batches:
+                self.assertEqual(batch, sorted(batch))
+            self.assertEqual(balanced_batches(files[:1], 4), [files[:1]])
+
+    def test_upload_parallel(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.post("http://test/api/files/test", text=_uploaded_names)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            files = self._make_files(tmpdir, [10, 60, 30, 40, 20])
+            uploaded = self.fapi.upload("test", *files, concurrency=3)
+        self.assertEqual(rmock.call_count, 3)
+        self.assertEqual(sorted(uploaded), ["test/pkg%s.deb" % ix for ix in range(5)])
+
+    def test_upload_in_memory(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.post("http://test/api/files/test", text=_uploaded_names)
+        uploaded = self.fapi.upload("test", ("a.deb", b"A" * 10), ("b.deb", io.BytesIO(b"B" * 20)),
+                                    ("c.deb", memoryview(b"C" * 30)), concurrency=2)
+        self.assertEqual(rmock.call_count, 2)
+        self.assertEqual(sorted(uploaded), ["test/a.deb", "test/b.deb", "test/c.deb"])
+        # the bodies were read by _uploaded_names already, but in-memory contents can be sent again
+        self.assertIn(b"B" * 20, b"".join(b"".join(request.body) for request in rmock.request_history))
+
+    def test_upload_chunked(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.post("http://test/api/files/test", text='["test/a.deb"]')
+        self.assertEqual(self.fapi.upload("test", ("a.deb", iter([b"A" * 10, b"A" * 5]))), ["test/a.deb"])
+        request = rmock.request_history[0]
+        self.assertNotIn("Content-Length", request.headers)
+        self.assertEqual(request.headers["Transfer-Encoding"], "chunked")
+        self.assertIn(b"A" * 15, b"".join(request.body))
+
+    def test_upload_meter(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.post("http://test/api/files/test", text=_uploaded_names)
+        received = []  # type: List[UploadProgress]
+        meter = TransferMeter(callback=received.append)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            files = self._make_files(tmpdir, [10, 60, 30, 40, 20])
+            self.fapi.upload("test", *files, concurrency=2, meter=meter)
+            self.assertEqual([(t.filename, t.bytes_sent) for t in meter.summary()],
+                             list(zip(files, [10, 60, 30, 40, 20])))
+            self.assertTrue(all(p.total_bytes == 160 for p in received))
+            self.assertEqual(max(p.total_bytes_sent for p in received), 160)
+            meter.reset()
+            self.fapi.upload("test", files[0], meter=meter)
+            self.assertEqual(len(meter.summary()), 1)
+            meter.reset()
+            self.fapi.upload_directory("test", tmpdir, batch_size=2, meter=meter)
+            self.assertEqual(sum(t.bytes_sent for t in meter.summary()), 160)
+
+    def test_upload_parallel_failed(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.post("http://test/api/files/test", text=_uploaded_names)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            files = self._make_files(tmpdir, [10, 20]) + self._make_files(tmpdir, [30], prefix="bad")
+            with self.assertRaises(UploadError) as ctx:
+                self.fapi.upload("test", *files, concurrency=2)
+        self.assertEqual(list(ctx.exception.failed.keys()), [files[2]])
+        self.assertEqual(ctx.exception.status_code, 500)
+        self.assertEqual(sorted(ctx.exception.uploaded), ["test/pkg0.deb", "test/pkg1.deb"])
+        self.assertEqual(str(ctx.exception), "1 of 3 files could not be uploaded")
+
+    def test_upload_parallel_connection_error(self, *, rmock: requests_mock.Mocker) -> None:
+        def reset(request: Any, context: Any) -> str:
+            body = request.body.read()
+            if b'filename="bad' in body:
+                raise requests.ConnectionError("Connection reset by peer")
+            return "[%s]" % ", ".join('"test/%s"' % name.decode() for name in re.findall(rb'filename="([^"]+)"', body))
+
+        rmock.post("http://test/api/files/test", text=reset)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            files = self._make_files(tmpdir, [10, 20, 30]) + self._make_files(tmpdir, [40], prefix="bad")
+            with self.assertRaises(UploadError) as ctx:
+                self.fapi.upload("test", *files, concurrency=4)
+        self.assertEqual(list(ctx.exception.failed.keys()), [files[3]])
+        self.assertIsInstance(ctx.exception.failed[files[3]].__cause__, requests.ConnectionError)
+        self.assertIn("Connection reset by peer", str(ctx.exception.failed[files[3]]))
+        self.assertEqual(sorted(ctx.exception.uploaded), ["test/pkg0.deb", "test/pkg1.deb", "test/pkg2.deb"])
+
+    def test_upload_directory(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.post("http://test/api/files/test", text=_uploaded_names)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.makedirs(os.path.join(tmpdir, "sub", "deeper"))
+            self._make_files(tmpdir, [1, 1], prefix="top")
+            self._make_files(os.path.join(tmpdir, "sub"), [1])
+            self._make_files(os.path.join(tmpdir, "sub", "deeper"), [1, 1, 1], prefix="deep")
+            with open(os.path.join(tmpdir, "sub", "README"), "w") as f:
+                f.write("not a package")
+            with mock.patch("aptly_api.parts.files.MultipartEncoder", wraps=MultipartEncoder) as encoder:
+                uploaded = self.fapi.upload_directory("test", tmpdir, max_open=2, batch_size=2)
+            self.assertEqual(sorted(uploaded), ["test/deep0.deb", "test/deep1.deb", "test/deep2.deb",
+                                                "test/pkg0.deb", "test/top0.deb", "test/top1.deb"])
+            self.assertEqual(rmock.call_count, 3)
+            self.assertEqual([[os.path.basename(f) for field, f in c[0][0]] for c in encoder.call_args_list],
+                             [["top0.deb", "top1.deb"], ["pkg0.deb", "deep0.deb"], ["deep1.deb", "deep2.deb"]])
+            self.assertEqual(len(self.fapi.upload_directory("test", tmpdir, pattern="README")), 1)
+            self.assertEqual(self.fapi.upload_directory("test", tmpdir, pattern="*.dsc"), [])
+
+    def test_upload_directory_lazy(self, *, rmock: requests_mock.Mocker) -> None:
+        walked = []  # type: List[str]
+        walked_when_sent = []  # type: List[int]
+
+        def send(request: Any, context: Any) -> str:
+            walked_when_sent.append(len(walked))
+            return _uploaded_names(request, context)
+
+        rmock.post("http://test/api/files/test", text=send)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            files = self._make_files(tmpdir, [1] * 6)
+
+            def walk(path: str, pattern: str) -> Iterator[str]:
+                for f in files:
+                    walked.append(f)
+                    yield f
+
+            with mock.patch("aptly_api.parts.files.find_files", walk):
+                self.assertEqual(len(self.fapi.upload_directory("test", tmpdir, batch_size=2)), 6)
+                # the tree is walked one batch ahead of the requests at most
+                self.assertEqual(len(walked_when_sent), 3)
+                for ix, count in enumerate(walked_when_sent):
+                    self.assertLessEqual(count, (ix + 2) * 2)
+                walked.clear()
+                walked_when_sent.clear()
+                self.fapi.upload_directory("test", tmpdir, batch_size=2, meter=TransferMeter())
+                # the meter needs the total size up front
+                self.assertEqual(walked_when_sent, [6, 6, 6])
+
+    def test_upload_skip_existing(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.post("http://test/api/files/test", text=_uploaded_names)
+        rmock.get("http://test/api/files/test", text='["pkg0.deb", "test/pkg2.deb"]')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            files = self._make_files(tmpdir, [1, 1, 1])
+            self.assertEqual(self.fapi.upload("test", *files, skip_existing=True), ["test/pkg1.deb"])
+            self.assertEqual(self.fapi.upload("test", files[0], files[2], skip_existing=True), [])
+            self.assertEqual(rmock.call_count, 3)
+            self.assertEqual(self.fapi.upload_directory("test", tmpdir, skip_existing=True), ["test/pkg1.deb"])
+
+            rmock.get("http://test/api/files/test", status_code=404, text='{"error": "not found"}')
+            self.assertEqual(len(self.fapi.upload("test", *files, skip_existing=True)), 3)
+            rmock.get("http://test/api/files/test", status_code=500, text='{"error": "broken"}')
+            with self.assertRaises(AptlyAPIException):
+                self.fapi.upload("test", *files, skip_existing=True)
+
+    def test_upload_skip_in_repo(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.post("http://test/api/files/test", text=_uploaded_names)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            make_deb(os.path.join(tmpdir, "same.deb"))
+            make_deb(os.path.join(tmpdir, "changed.deb"), data=b"changed payload")
+            make_deb(os.path.join(tmpdir, "other.deb"), control=CONTROL.replace("authserver", "other"))
+            with open(os.path.join(tmpdir, "broken.deb"), "wb") as f:
+                f.write(b"not a package")
+            with open(os.path.join(tmpdir, "source.dsc"), "wb") as f:
+                f.write(b"Source: authserver\n")
+            size, sha256 = file_digest(os.path.join(tmpdir, "same.deb"))
+            rmock.get("http://test/api/repos/aptly%20repo/packages?format=details", complete_qs=True, text=json.dumps([
+                {"Key": "Pamd64 authserver 1:0.1.14~dev0-1 abc", "ShortKey": "Pamd64 authserver 1:0.1.14~dev0-1",
+                 "Size": str(size), "SHA256": sha256},
+                {"Key": "Pamd64 incomplete 1.0 abc", "ShortKey": "Pamd64 incomplete 1.0"},
+            ]))
+            uploaded = self.fapi.upload_directory("test", tmpdir, pattern=None, skip_in_repo="aptly repo")
+        self.assertEqual(sorted(uploaded), ["test/broken.deb", "test/changed.deb", "test/other.deb",
+                                            "test/source.dsc"])
+
     def test_delete(self, *, rmock: requests_mock.Mocker) -> None:
         rmock.delete("http://test/api/files/test",
                      text='{}')
@@ -0,0 +1,74 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+from typing import List, Optional, Dict  # noqa: F401
+from unittest.case import TestCase
+
+from aptly_api.index import PackageIndex, source_name
+from aptly_api.parts.packages import Package
+
+
+def _pkg(key: str, source: Optional[str] = None) -> Package:
+    fields = None  # type: Optional[Dict[str, str]]
+    if source is not None:
+        fields = {"Key": key, "Source": source}
+    return Package(key=key, short_key=None, files_hash=None, fields=fields)
+
+
+class PackageIndexTests(TestCase):
+    def setUp(self) -> None:
+        self.packages = [
+            _pkg("Pamd64 libssl3 3.0.9-1 a1", source="openssl"),
+            _pkg("Pamd64 libssl3 3.0.11-1 a2", source="openssl (3.0.11-1)"),
+            _pkg("Pi386 libssl3 3.0.9-1 a3", source="openssl"),
+            _pkg("Psource openssl 3.0.11-1 a4"),
+            _pkg("Pamd64 curl 8.0~rc1-1 b1"),
+            _pkg("Pamd64 curl 7.88-1 b2"),
+        ]
+        self.index = PackageIndex(self.packages + self.packages[:1])
+
+    def test_lookups(self) -> None:
+        self.assertEqual(len(self.index), 6)
+        self.assertEqual(list(self.index), self.packages)
+        self.assertEqual(repr(self.index), "PackageIndex(<6 packages>)")
+        self.assertIn("Pamd64 curl 7.88-1 b2", self.index)
+        self.assertIn(self.packages[0], self.index)
+        self.assertNotIn("Pamd64 curl 7.88-1 b3", self.index)
+        self.assertEqual(self.index.get("Pamd64 curl 7.88-1 b2"), self.packages[5])
+        self.assertIsNone(self.index.get("Pamd64 curl 7.88-1 b3"))
+        self.assertEqual(self.index.names(), ["libssl3", "openssl", "curl"])
+        self.assertEqual(self.index.by_name("libssl3"), self.packages[:3])
+        self.assertEqual(self.index.by_name("nginx"), [])
+        self.assertEqual(self.index.by_name_arch("libssl3", "amd64"), self.packages[:2])
+        self.assertEqual(self.index.by_source("openssl"), self.packages[:4])
+        self.assertEqual(self.index.by_source("curl"), self.packages[4:])
+
+    def test_source_name(self) -> None:
+        self.assertEqual(source_name(self.packages[1]), "openssl")
+        self.assertEqual(source_name(self.packages[4]), "curl")
+        self.assertEqual(source_name(Package(key="Pamd64 curl 7.88-1 b2", short_key=None, files_hash=None,
+                                             fields={"Source": ""})), "curl")
+
+    def test_latest(self) -> None:
+        self.assertEqual(self.index.latest("libssl3", "amd64"), self.packages[1])
+        self.assertEqual(self.index.latest("curl", "amd64"), self.packages[4])
+        self.assertIsNone(self.index.latest("curl", "i386"))
+        self.assertEqual(self.index.latest_per_package(), [self.packages[1], self.packages[2], self.packages[3],
+                                                           self.packages[4]])
+
+    def test_set_operations(self) -> None:
+        a = PackageIndex(self.packages[:4])
+        b = PackageIndex(self.packages[2:])
+        self.assertEqual(list(a | b), self.packages)
+        self.assertEqual(list(a & b), self.packages[2:4])
+        self.assertEqual(list(a - b), self.packages[:2])
+        self.assertEqual(list(a ^ b), self.packages[:2] + self.packages[4:])
+        self.assertEqual(a.union(b), self.index)
+        self.assertEqual(a.intersection(b).keys(), {"Pi386 libssl3 3.0.9-1 a3", "Psource openssl 3.0.11-1 a4"})
+        self.assertEqual(a.difference(b), PackageIndex(self.packages[:2]))
+        self.assertEqual(a.symmetric_difference(b), b.symmetric_difference(a))
+        self.assertNotEqual(a, b)
+        self.assertNotEqual(a, self.packages[:4])
+        self.assertEqual((a - b).by_source("openssl"), self.packages[:2])
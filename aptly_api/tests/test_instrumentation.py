@@ -0,0 +1,140 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import os
+from typing import Any, List, cast  # noqa: F401
+from unittest import mock
+from unittest.case import TestCase
+
+import requests
+import requests_mock
+
+from aptly_api import Client, RetryPolicy
+from aptly_api.base import AptlyAPIException
+from aptly_api.instrumentation import RequestInstrumentation, RequestRecord, url_template
+
+
+def _record(duration: float, method: str = "GET", template: str = "api/repos", retries: int = 0,
+            error: Any = None) -> RequestRecord:
+    return RequestRecord(method=method, url_template=template, url="http://test/%s" % template, status_code=200,
+                         duration=duration, time_to_first_byte=duration, request_bytes=0, response_bytes=2,
+                         retries=retries, error=error)
+
+
+class URLTemplateTests(TestCase):
+    def test_templates(self) -> None:
+        for path, template in (
+            ("api/version", "api/version"),
+            ("api/repos", "api/repos"),
+            ("api/repos/packages", "api/repos/{name}"),
+            ("api/repos/aptly-repo/packages", "api/repos/{name}/packages"),
+            ("api/repos/aptly-repo/file/dir/a.deb", "api/repos/{name}/file/{dir}/{file}"),
+            ("api/snapshots/a/diff/b", "api/snapshots/{name}/diff/{other}"),
+            ("api/publish/s3:maurusnet:nightly_stretch/mn-nightly", "api/publish/{prefix}/{distribution}"),
+            ("api/packages/Pamd64%20authserver%200.1.14~dev0-1%201cc572a93625a9c9", "api/packages/{key}"),
+            ("/api/files/dir/", "api/files/{dir}"),
+            ("api/unknown/thing", "api/unknown/thing"),
+            ("mock://test/api", "mock://test/api"),
+        ):
+            self.assertEqual(url_template(path), template, path)
+
+
+class RequestInstrumentationTests(TestCase):
+    def test_stats(self) -> None:
+        instrumentation = RequestInstrumentation()
+        for i in range(1, 101):
+            instrumentation.record(_record(i / 100.0, retries=1 if i == 100 else 0,
+                                           error="AptlyAPIException: 503" if i > 98 else None))
+        instrumentation.record(_record(0.001, method="POST"))
+
+        stats = instrumentation.stats()
+        self.assertEqual(set(stats.keys()), {"GET api/repos", "POST api/repos"})
+        get = stats["GET api/repos"]
+        self.assertEqual((get.count, get.errors, get.retries), (100, 2, 1))
+        self.assertAlmostEqual(get.total_time, 50.5)
+        self.assertEqual((get.p50, get.p95, get.p99), (0.50, 0.95, 0.99))
+        self.assertEqual(get.histogram[0], (0.005, 0))
+        self.assertEqual(dict(get.histogram)[0.1], 10)
+        self.assertEqual(get.histogram[-1], (float("inf"), 100))
+        self.assertEqual(stats["POST api/repos"].p99, 0.001)
+
+        instrumentation.reset()
+        self.assertEqual(instrumentation.stats(), {})
+
+    def test_sample_size(self) -> None:
+        instrumentation = RequestInstrumentation(sample_size=2)
+        for duration in (10.0, 1.0, 2.0):
+            instrumentation.record(_record(duration))
+        stats = instrumentation.stats()["GET api/repos"]
+        self.assertEqual((stats.count, stats.p50, stats.p99), (3, 1.0, 2.0))
+
+    def test_sinks(self) -> None:
+        received = []  # type: List[RequestRecord]
+        other = []  # type: List[RequestRecord]
+        instrumentation = RequestInstrumentation(sinks=[received.append])
+        instrumentation.add_sink(other.append)
+        instrumentation.record(_record(1.0))
+        self.assertEqual(received, [_record(1.0)])
+        self.assertEqual(other, received)
+
+
+@requests_mock.Mocker(kw='rmock')
+class ClientInstrumentationTests(TestCase):
+    def test_records(self, *, rmock: requests_mock.Mocker) -> None:
+        received = []  # type: List[RequestRecord]
+        client = Client("http://test/", instrumentation=RequestInstrumentation(sinks=[received.append]))
+        rmock.get("http://test/api/repos/aptly-repo", text='{"Name": "aptly-repo"}')
+        rmock.get("http://test/api/snapshots/aptly-repo-1/packages", text='["Pall a 1 a"]',
+                  headers={"Content-Length": "14"})
+        rmock.post("http://test/api/files/test", text='["test/testpkg.deb"]')
+        rmock.delete("http://test/api/repos/aptly-repo", status_code=404, text='{"error": "not found"}')
+
+        client.repos.show("aptly-repo")
+        self.assertEqual(list(client.snapshots.iter_packages("aptly-repo-1"))[0].key, "Pall a 1 a")
+        client.files.upload("test", os.path.join(os.path.dirname(__file__), "testpkg.deb"))
+        with self.assertRaises(AptlyAPIException):
+            client.repos.delete("aptly-repo")
+
+        self.assertEqual([(r.method, r.url_template, r.status_code) for r in received], [
+            ("GET", "api/repos/{name}", 200),
+            ("GET", "api/snapshots/{name}/packages", 200),
+            ("POST", "api/files/{dir}", 200),
+            ("DELETE", "api/repos/{name}", 404),
+        ])
+        self.assertEqual(received[0].url, "http://test/api/repos/aptly-repo")
+        self.assertEqual((received[0].request_bytes, received[0].response_bytes), (0, 22))
+        self.assertIsNone(received[0].error)
+        self.assertEqual(received[1].response_bytes, 14)
+        self.assertGreater(cast(int, received[2].request_bytes),
+                           os.path.getsize(os.path.join(os.path.dirname(__file__), "testpkg.deb")))
+        self.assertIn("not found", cast(str, received[3].error))
+        self.assertTrue(all(r.duration >= 0 and r.time_to_first_byte is not None for r in received))
+
+        stats = client.stats()
+        self.assertEqual(stats["GET api/repos/{name}"].count, 1)
+        self.assertEqual(stats["DELETE api/repos/{name}"].errors, 1)
+
+    def test_streamed_without_length(self, *, rmock: requests_mock.Mocker) -> None:
+        client = Client("http://test/")
+        rmock.get("http://test/api/mirrors/aptly-mirror/packages", text='[]')
+        list(client.mirrors.iter_packages("aptly-mirror"))
+        self.assertEqual(client.stats()["GET api/mirrors/{name}/packages"].count, 1)
+
+    @mock.patch("time.sleep")
+    def test_retries_and_exceptions(self, sleep: mock.Mock, *, rmock: requests_mock.Mocker) -> None:
+        received = []  # type: List[RequestRecord]
+        client = Client("http://test/", retry=RetryPolicy(max_attempts=2),
+                        instrumentation=RequestInstrumentation(sinks=[received.append]))
+        rmock.get("http://test/api/version", [{"status_code": 503, "text": "locked"},
+                                              {"status_code": 200, "text": '{"Version": "1.0.0"}'}])
+        client.misc.version()
+        rmock.get("http://test/api/repos", exc=requests.ConnectionError("reset"))
+        with self.assertRaises(requests.ConnectionError):
+            client.repos.list()
+
+        self.assertEqual((received[0].retries, received[0].status_code), (1, 200))
+        self.assertEqual((received[1].retries, received[1].status_code), (1, None))
+        self.assertEqual(received[1].error, "ConnectionError: reset")
+        self.assertIsNone(received[1].time_to_first_byte)
@@ -0,0 +1,91 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import json
+import sys
+from typing import List
+from unittest import mock
+from unittest.case import TestCase
+
+from aptly_api.jsonutil import iter_json_array, JSONArrayParser, iter_raw_array, default_json_decoder
+
+
+def _chunked(data: bytes, size: int) -> List[bytes]:
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class JSONArrayParserTests(TestCase):
+    def test_chunk_boundaries(self) -> None:
+        elements = [{"Key": "Pamd64 pkg%s 1.0 1cc572a93625a9c9" % i, "Description": " Ünïcödé ✓ \\\"%s\"" % i}
+                    for i in range(50)] + [1234, -1.5e-3, "Pall x 1 a", None, True, [1, [2]]]
+        data = json.dumps(elements).encode("utf-8")
+        for size in (1, 2, 3, 7, 64, len(data)):
+            self.assertEqual(list(iter_json_array(_chunked(data, size))), elements)
+
+    def test_empty(self) -> None:
+        self.assertEqual(list(iter_json_array([b" [ ", b"] \n"])), [])
+        self.assertEqual(list(iter_json_array([b"[]"])), [])
+
+    def test_numbers_across_chunks(self) -> None:
+        self.assertEqual(list(iter_json_array([b"[1", b"2", b".", b"5e", b"1]"])), [125.0])
+
+    def test_incremental(self) -> None:
+        parser = JSONArrayParser()
+        self.assertEqual(parser.feed(b'["a", "b'), ["a"])
+        # objects, arrays and strings are returned as soon as they're closed, numbers only once they're followed by
+        # a separator
+        self.assertEqual(parser.feed(b'", {"c": 1}, 1'), ["b", {"c": 1}])
+        self.assertEqual(parser.feed(b'2]'), [12])
+        parser.close()
+
+    def test_large_element(self) -> None:
+        element = {"Description": "x" * 100000, "Depends": [["a", "b\\\""] * 100, {"c": None}]}
+        data = json.dumps([element, element]).encode("utf-8")
+        parser = JSONArrayParser()
+        with mock.patch.object(parser, "_decoder", wraps=json.loads) as decoder:
+            items = [item for chunk in _chunked(data, 7) for item in parser.feed(chunk)]
+        parser.close()
+        self.assertEqual(items, [element, element])
+        # every element is decoded once, not on every chunk
+        self.assertEqual(decoder.call_count, 2)
+
+    def test_decoder(self) -> None:
+        decoder = mock.Mock(side_effect=json.loads)
+        self.assertEqual(list(iter_json_array([b'[{"a": 1}, "b', b'", 2]'], decoder=decoder)), [{"a": 1}, "b", 2])
+        # the elements that are complete within a chunk are decoded together
+        self.assertEqual([c.args[0] for c in decoder.call_args_list], [b'[{"a": 1}]', b'"b"', b"2"])
+
+    def test_invalid(self) -> None:
+        for invalid in (b"{}", b"[1 2]", b"[1,", b"[1]x", b"[", b"", b"[1,]", b'["a" "b"]', b'[{"a": 1]', b"[}]",
+                        b"[,1]", b'["a\\"]', b"[nul]"):
+            for size in (1, len(invalid) or 1):
+                with self.assertRaises(ValueError, msg=invalid):
+                    list(iter_json_array(_chunked(invalid, size)))
+
+
+class RawArrayTests(TestCase):
+    def test_elements(self) -> None:
+        elements = [{"Key": "Pamd64 pkg 1.0 1cc5", "Description": " {[\\\"]} ✓"}, {"nested": [1, {"a": "]"}]},
+                    "s,t", -1.5e3, None, True, [], {}]
+        for data in (json.dumps(elements).encode("utf-8"), json.dumps(elements, indent=4).encode("utf-8")):
+            raw = list(iter_raw_array(data))
+            self.assertEqual([json.loads(r) for r in raw], elements)
+        self.assertEqual(list(iter_raw_array(b" [ ] ")), [])
+
+    def test_invalid(self) -> None:
+        for invalid in (b"{}", b"[1 2]", b"[1,", b"[1]x", b"[", b"", b"[1,]", b'["a" "b"]', b'[{"a": [1'):
+            with self.assertRaises(ValueError, msg=invalid):
+                list(iter_raw_array(invalid))
+
+
+class DefaultDecoderTests(TestCase):
+    def test_orjson(self) -> None:
+        import orjson
+        self.assertIs(default_json_decoder(), orjson.loads)
+        self.assertEqual(default_json_decoder()(b'{"a": ["\\u2713"]}'), {"a": ["\u2713"]})
+
+    def test_fallback(self) -> None:
+        with mock.patch.dict(sys.modules, {"orjson": None}):
+            self.assertIs(default_json_decoder(), json.loads)
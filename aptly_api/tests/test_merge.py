@@ -0,0 +1,49 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+from typing import List, Sequence  # noqa: F401
+from unittest.case import TestCase
+
+from aptly_api.merge import merge_packages, pull_packages
+from aptly_api.parts.packages import Package
+
+
+def _packages(*keys: str) -> List[Package]:
+    return [Package(key=key, short_key=None, files_hash=None, fields=None) for key in keys]
+
+
+def _keys(packages: Sequence[Package]) -> List[str]:
+    return sorted(pkg.key for pkg in packages)
+
+
+class MergeTests(TestCase):
+    def test_merge(self) -> None:
+        stable = _packages("Pamd64 nginx 1.10 a1", "Pamd64 nginx 1.9 a0", "Pi386 nginx 1.10 a2", "Pamd64 curl 7.50 b1")
+        backports = _packages("Pamd64 nginx 1.12~bpo1 a3", "Pamd64 zsh 5.0 c1")
+        security = _packages("Pamd64 nginx 1.10-1+deb1 a4")
+        self.assertEqual(_keys(merge_packages([stable, backports, security])), [
+            "Pamd64 curl 7.50 b1", "Pamd64 nginx 1.10-1+deb1 a4", "Pamd64 zsh 5.0 c1", "Pi386 nginx 1.10 a2",
+        ])
+        self.assertEqual(_keys(merge_packages([stable, backports, security], latest=True)), [
+            "Pamd64 curl 7.50 b1", "Pamd64 nginx 1.12~bpo1 a3", "Pamd64 zsh 5.0 c1", "Pi386 nginx 1.10 a2",
+        ])
+        self.assertEqual(_keys(merge_packages([stable, backports, stable], no_remove=True)),
+                         _keys(stable + backports))
+        self.assertEqual(_keys(merge_packages([stable])), _keys(stable))
+        self.assertEqual(merge_packages([]), [])
+
+    def test_pull(self) -> None:
+        base = _packages("Pamd64 nginx 1.9 a0", "Pamd64 nginx 1.10 a1", "Pi386 nginx 1.10 a2", "Pamd64 curl 7.50 b1")
+        pulled = _packages("Pamd64 nginx 1.12~bpo1 a3", "Pamd64 nginx 1.11~bpo1 a5", "Pamd64 libssl 3.0 d1")
+        self.assertEqual(_keys(pull_packages(base, pulled)), [
+            "Pamd64 curl 7.50 b1", "Pamd64 libssl 3.0 d1", "Pamd64 nginx 1.12~bpo1 a3", "Pi386 nginx 1.10 a2",
+        ])
+        self.assertEqual(_keys(pull_packages(base, pulled, all_matches=True)), [
+            "Pamd64 curl 7.50 b1", "Pamd64 libssl 3.0 d1", "Pamd64 nginx 1.11~bpo1 a5", "Pamd64 nginx 1.12~bpo1 a3",
+            "Pi386 nginx 1.10 a2",
+        ])
+        self.assertEqual(_keys(pull_packages(base, pulled, no_remove=True)),
+                         _keys(base + [pulled[0], pulled[2]]))
+        self.assertEqual(_keys(pull_packages(base, [])), _keys(base))
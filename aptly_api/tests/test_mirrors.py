@@ -331,3 +331,12 @@ class MirrorsAPISectionTests(TestCase):
         rmock.put("http://test/api/mirrors/aptly-mirror",
                   text='{"Name":"aptly-mirror-bla", "IgnoreSignatures": true}')
         self.miapi.edit(name="aptly-mirror", newname="aptly-mirror-renamed")
+
+    def test_iter_packages(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/mirrors/aptly-mirror/packages?format=details",
+                  text='[{"Key": "Pamd64 nodejs 10.24.1-1nodesource1 1f74a6abf6acc572", "Package": "nodejs"}]')
+        packages = list(self.miapi.iter_packages("aptly-mirror", detailed=True))
+        self.assertEqual(len(packages), 1)
+        self.assertEqual(packages[0].key, "Pamd64 nodejs 10.24.1-1nodesource1 1f74a6abf6acc572")
+        self.assertEqual(packages[0].fields, {"Key": "Pamd64 nodejs 10.24.1-1nodesource1 1f74a6abf6acc572",
+                                              "Package": "nodejs"})
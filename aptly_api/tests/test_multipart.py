@@ -0,0 +1,177 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import io
+import os
+import tempfile
+from typing import List, BinaryIO, Iterator, cast  # noqa: F401
+from unittest.case import TestCase
+
+from aptly_api.multipart import MultipartEncoder, ChunkedBody, _FileSource, _IterSource, upload_name, upload_size
+
+
+class MultipartEncoderTests(TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.files = []  # type: List[str]
+        for name, content in (("a.deb", b"A" * 1000), ("empty.deb", b""), ('b "quoted".deb', b"B" * 10)):
+            self.files.append(os.path.join(self.tmpdir.name, name))
+            with open(self.files[-1], "wb") as f:
+                f.write(content)
+        self.expected = (
+            b'--xyz\r\nContent-Disposition: form-data; name="a"; filename="a.deb"\r\n\r\n' + b"A" * 1000 + b"\r\n"
+            b'--xyz\r\nContent-Disposition: form-data; name="empty"; filename="empty.deb"\r\n\r\n\r\n'
+            b'--xyz\r\nContent-Disposition: form-data; name="b"; filename="b %22quoted%22.deb"\r\n\r\n' +
+            b"B" * 10 + b"\r\n--xyz--\r\n"
+        )
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def _encoder(self, chunk_size: int = 7) -> MultipartEncoder:
+        return MultipartEncoder(list(zip(["a", "empty", "b"], self.files)), boundary="xyz", chunk_size=chunk_size)
+
+    def test_read(self) -> None:
+        encoder = self._encoder()
+        self.assertEqual(len(encoder), len(self.expected))
+        self.assertEqual(encoder.content_type, "multipart/form-data; boundary=xyz")
+        self.assertEqual(encoder.read(), self.expected)
+        self.assertEqual(encoder.tell(), len(self.expected))
+        self.assertEqual(encoder.read(10), b"")
+
+    def test_read_chunks(self) -> None:
+        encoder = self._encoder()
+        for size in (1, 13, 64, 4096):
+            encoder.seek(0)
+            chunks = []
+            while True:
+                chunk = encoder.read(size)
+                if not chunk:
+                    break
+                self.assertLessEqual(len(chunk), size)
+                chunks.append(chunk)
+            self.assertEqual(b"".join(chunks), self.expected)
+
+    def test_iter(self) -> None:
+        encoder = self._encoder()
+        encoder.read(100)
+        chunks = list(encoder)
+        self.assertEqual(b"".join(chunks), self.expected)
+        self.assertEqual(max(len(chunk) for chunk in chunks), 7)
+        self.assertEqual(list(encoder)[0], self.expected[:7])
+
+    def _open_files(self, encoder: MultipartEncoder) -> List[BinaryIO]:
+        return [p.fh for p in encoder._parts if isinstance(p, _FileSource) and p.fh is not None]
+
+    def test_only_one_file_open(self) -> None:
+        encoder = self._encoder()
+        encoder.read(100)
+        open_files = self._open_files(encoder)
+        self.assertEqual(len(open_files), 1)
+        encoder.read(2000)
+        self.assertEqual(self._open_files(encoder), [])
+        self.assertTrue(open_files[0].closed)
+
+    def test_seek(self) -> None:
+        encoder = self._encoder()
+        with self.assertRaises(ValueError):
+            encoder.seek(10)
+        with self.assertRaises(ValueError):
+            encoder.seek(0, os.SEEK_END)
+
+    def test_truncated(self) -> None:
+        encoder = self._encoder()
+        with open(self.files[0], "wb") as f:
+            f.write(b"A" * 10)
+        with self.assertRaises(IOError):
+            encoder.read()
+
+
+class _Unseekable:
+    def __init__(self, data: bytes) -> None:
+        self.data = io.BytesIO(data)
+
+    def seekable(self) -> bool:
+        return False
+
+    def read(self, size: int = -1) -> bytes:
+        return self.data.read(size)
+
+
+class InMemorySourceTests(TestCase):
+    expected = (
+        b'--xyz\r\nContent-Disposition: form-data; name="a"; filename="a.deb"\r\n\r\n' + b"A" * 100 +
+        b"\r\n--xyz--\r\n"
+    )
+
+    def _encoder(self, contents: object) -> MultipartEncoder:
+        return MultipartEncoder([("a", ("dir/a.deb", cast(bytes, contents)))], boundary="xyz", chunk_size=7)
+
+    def test_upload_name_size(self) -> None:
+        self.assertEqual(upload_name(("a.deb", b"abc")), "a.deb")
+        self.assertEqual(upload_size(("a.deb", b"abc")), 3)
+        self.assertEqual(upload_size(("a.deb", memoryview(b"abcd"))), 4)
+        self.assertIsNone(upload_size(("a.deb", iter([b"abc"]))))
+
+    def test_buffers(self) -> None:
+        for contents in (b"A" * 100, bytearray(b"A" * 100), memoryview(b"A" * 100)):
+            encoder = self._encoder(contents)
+            self.assertEqual(len(encoder), len(self.expected))
+            self.assertEqual(b"".join(encoder), self.expected)
+            # buffers can be sent again
+            self.assertEqual(b"".join(encoder), self.expected)
+
+    def test_seekable_stream(self) -> None:
+        stream = io.BytesIO(b"xx" + b"A" * 100)
+        stream.read(2)
+        encoder = self._encoder(stream)
+        self.assertEqual(len(encoder), len(self.expected))
+        self.assertEqual(b"".join(encoder), self.expected)
+        # rewinding goes back to where the stream was positioned initially
+        self.assertEqual(b"".join(encoder), self.expected)
+
+    def test_unseekable_stream(self) -> None:
+        encoder = self._encoder(_Unseekable(b"A" * 100))
+        self.assertIsNone(encoder.length)
+        with self.assertRaises(TypeError):
+            len(encoder)
+        self.assertEqual(encoder.read(), self.expected)
+        with self.assertRaises(io.UnsupportedOperation):
+            encoder.seek(0)
+
+    def test_iterator(self) -> None:
+        def chunks() -> Iterator[bytes]:
+            yield b"A" * 30
+            yield b""
+            yield b"A" * 70
+
+        encoder = self._encoder(chunks())
+        self.assertIsNone(encoder.length)
+        self.assertEqual(b"".join(encoder), self.expected)
+        with self.assertRaises(io.UnsupportedOperation):
+            encoder.seek(0)
+
+    def test_iterator_large_chunk(self) -> None:
+        chunk = b"A" * 100000 + b"B"
+        source = _IterSource([chunk, b"CD"])
+        parts = [source.read(64) for _ in range(1563)]
+        self.assertEqual(b"".join(parts), chunk)
+        # the rest of the chunk is read through a view of it, not a copy
+        self.assertIs(source.pending.obj, chunk)
+        self.assertEqual([source.read(64), source.read(64)], [b"CD", b""])
+
+    def test_chunked_body(self) -> None:
+        body = ChunkedBody(self._encoder(iter([b"A" * 100])))
+        self.assertFalse(hasattr(body, "__len__"))
+        self.assertEqual(b"".join(body), self.expected)
+        with self.assertRaises(io.UnsupportedOperation):
+            body.seek(0)
+
+    def test_truncated_stream(self) -> None:
+        stream = io.BytesIO(b"A" * 100)
+        encoder = self._encoder(stream)
+        stream.truncate(10)
+        with self.assertRaises(IOError):
+            encoder.read()
@@ -3,12 +3,19 @@
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import copy
+import json
+import pickle
 from typing import Any
+from unittest import mock
 from unittest.case import TestCase
 
 import requests_mock
 
-from aptly_api.parts.packages import PackageAPISection, Package
+from aptly_api.base import AptlyAPIException
+from aptly_api.parts.packages import PackageAPISection, Package, PackageKey, LazyFields, project_fields, \
+    project_packages
+from aptly_api.store import PackageStore
 
 
 @requests_mock.Mocker(kw='rmock')
@@ -78,3 +85,133 @@ class PackageAPISectionTests(TestCase):
                 }
             )
         )
+
+    def test_show_many(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/packages/Pall%20a%201.0%20aaa", text='{"Key": "Pall a 1.0 aaa"}')
+        rmock.get("http://test/api/packages/Pall%20b%201.0%20bbb", text='{"Key": "Pall b 1.0 bbb"}')
+        rmock.get("http://test/api/packages/Pall%20c%201.0%20ccc", status_code=404,
+                  text='{"error": "key not found"}')
+        result = self.papi.show_many(["Pall b 1.0 bbb", "Pall c 1.0 ccc", "Pall a 1.0 aaa", "Pall b 1.0 bbb"],
+                                     concurrency=4)
+        self.assertEqual([pkg.key for pkg in result.packages], ["Pall b 1.0 bbb", "Pall a 1.0 aaa"])
+        self.assertEqual(result.missing, ["Pall c 1.0 ccc"])
+        self.assertEqual(rmock.call_count, 3)
+        self.assertEqual(self.papi.show_many([]), ([], []))
+
+    def test_show_many_error(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/packages/Pall%20a%201.0%20aaa", status_code=500,
+                  text='{"error": "internal error"}')
+        with self.assertRaises(AptlyAPIException):
+            self.papi.show_many(["Pall a 1.0 aaa"])
+
+    def test_show_many_store(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/packages/Pall%20b%201.0%20bbb", text='{"Key": "Pall b 1.0 bbb"}')
+        store = PackageStore()
+        store.put("Pall a 1.0 aaa", {"Key": "Pall a 1.0 aaa"})
+        papi = PackageAPISection("http://test/", package_store=store)
+        rmock.get("http://test/api/packages/Pall%20c%201.0%20ccc", text='{"Key": "Pall c 1.0 ccc"}')
+        rmock.get("http://test/api/packages/Pall%20d%201.0%20ddd", status_code=404, text='{"error": "not found"}')
+        with mock.patch.object(store, "put_many", wraps=store.put_many) as put_many, \
+                mock.patch.object(store, "put", wraps=store.put) as put:
+            result = papi.show_many(["Pall a 1.0 aaa", "Pall b 1.0 bbb", "Pall c 1.0 ccc", "Pall d 1.0 ddd"])
+        self.assertEqual([pkg.key for pkg in result.packages], ["Pall a 1.0 aaa", "Pall b 1.0 bbb", "Pall c 1.0 ccc"])
+        self.assertEqual(rmock.call_count, 3)
+        # the fetched packages are stored together
+        put.assert_not_called()
+        put_many.assert_called_once()
+        self.assertEqual(store.get_many(["Pall b 1.0 bbb", "Pall c 1.0 ccc"]),
+                         {"Pall b 1.0 bbb": {"Key": "Pall b 1.0 bbb"}, "Pall c 1.0 ccc": {"Key": "Pall c 1.0 ccc"}})
+
+
+class PackageKeyTests(TestCase):
+    def test_parse(self) -> None:
+        key = PackageKey.parse("Pamd64 authserver 0.1.14~dev0-1 1cc572a93625a9c9")
+        self.assertEqual((key.arch, key.name, key.version, key.files_hash),
+                         ("amd64", "authserver", "0.1.14~dev0-1", "1cc572a93625a9c9"))
+        self.assertEqual(key.short_key, "Pamd64 authserver 0.1.14~dev0-1")
+        self.assertEqual(str(key), "Pamd64 authserver 0.1.14~dev0-1 1cc572a93625a9c9")
+        self.assertEqual(repr(key), "PackageKey('Pamd64 authserver 0.1.14~dev0-1 1cc572a93625a9c9')")
+        short = PackageKey.parse("Psource authserver 0.1.14~dev0-1")
+        self.assertIsNone(short.files_hash)
+        self.assertEqual(str(short), "Psource authserver 0.1.14~dev0-1")
+        for invalid in ("authserver 0.1", "Xamd64 authserver 0.1 abc", "Pamd64  0.1 abc", "Pamd64 a 0.1 abc d"):
+            with self.assertRaises(AptlyAPIException):
+                PackageKey.parse(invalid)
+
+    def test_compact(self) -> None:
+        a = PackageKey.parse("Pamd64 authserver 0.1-1 1cc572a93625a9c9")
+        b = PackageKey.parse("Pamd64 authserver 0.2-1 2cc572a93625a9c9")
+        self.assertIs(a.arch, b.arch)
+        self.assertIs(a.name, b.name)
+        self.assertFalse(hasattr(a, "__dict__"))
+
+    def test_equality(self) -> None:
+        a = PackageKey("amd64", "authserver", "0.1-1", "1cc5")
+        self.assertEqual(a, PackageKey.parse("Pamd64 authserver 0.1-1 1cc5"))
+        self.assertNotEqual(a, PackageKey.parse("Pamd64 authserver 0.1-1"))
+        self.assertNotEqual(a, "Pamd64 authserver 0.1-1 1cc5")
+        self.assertEqual(len({a, PackageKey.parse("Pamd64 authserver 0.1-1 1cc5")}), 1)
+
+    def test_parsed_with_package(self) -> None:
+        with mock.patch.object(PackageKey, "parse", wraps=PackageKey.parse) as parse:
+            pkg = PackageAPISection.package_from_response("Pamd64 authserver 0.1-1 1cc5")
+            self.assertEqual(pkg.parsed_key, PackageKey("amd64", "authserver", "0.1-1", "1cc5"))
+            self.assertEqual((pkg.short_key, pkg.files_hash), ("Pamd64 authserver 0.1-1", "1cc5"))
+            projected = pkg._replace(fields={"Version": "0.1-1"})
+            # the key is parsed once, when the package is created
+            self.assertEqual(parse.call_count, 1)
+        self.assertIs(projected.parsed_key, pkg.parsed_key)
+        self.assertEqual(pkg._asdict().keys(), {"key", "parsed_key", "fields"})
+        with self.assertRaises(AptlyAPIException):
+            Package("not a key", None, None, None)
+
+    def test_package_compatibility(self) -> None:
+        pkg = Package("Pamd64 authserver 0.1-1 1cc5", "Pamd64 authserver 0.1-1", "1cc5", {"Version": "0.1-1"})
+        self.assertEqual(pkg, Package(key="Pamd64 authserver 0.1-1 1cc5", short_key=None, files_hash=None,
+                                      fields={"Version": "0.1-1"}))
+        self.assertEqual(pkg.fields, {"Version": "0.1-1"})
+        self.assertEqual(pickle.loads(pickle.dumps(pkg)), pkg)
+        self.assertEqual(copy.copy(pkg), pkg)
+        self.assertEqual(repr(Package("Pall a 1 b")),
+                         "Package(key='Pall a 1 b', parsed_key=PackageKey('Pall a 1 b'), fields=None)")
+
+
+class LazyFieldsTests(TestCase):
+    raw = (b'{"Key": "Pamd64 authserver 0.1-1 1cc5", "ShortKey":"Pamd64 authserver 0.1-1", '
+           b'"FilesHash" : "1cc5", "Description": " \\"Key\\": \\"x\\"", "Version": "0.1-1"}')
+
+    def test_decode_on_access(self) -> None:
+        fields = LazyFields(self.raw)
+        self.assertFalse(fields.decoded)
+        self.assertEqual(repr(fields), "LazyFields(<%s bytes>)" % len(self.raw))
+        self.assertEqual(fields["Version"], "0.1-1")
+        self.assertTrue(fields.decoded)
+        self.assertEqual(len(fields), 5)
+        self.assertEqual(dict(fields), json.loads(self.raw))
+        self.assertEqual(repr(fields), "LazyFields(%r)" % json.loads(self.raw))
+
+    def test_projection(self) -> None:
+        fields = LazyFields(self.raw, only=["Version", "Depends"])
+        self.assertEqual(list(fields), ["Version"])
+        self.assertEqual(fields, {"Version": "0.1-1"})
+        self.assertEqual(project_fields({"a": "1", "b": "2"}, ["b", "c"]), {"b": "2"})
+
+    def test_package_from_raw(self) -> None:
+        pkg = PackageAPISection.package_from_raw(self.raw, fields=["Version"])
+        self.assertEqual((pkg.key, pkg.short_key, pkg.files_hash),
+                         ("Pamd64 authserver 0.1-1 1cc5", "Pamd64 authserver 0.1-1", "1cc5"))
+        self.assertIsInstance(pkg.fields, LazyFields)
+        self.assertEqual(pkg.fields, {"Version": "0.1-1"})
+        pkg = PackageAPISection.package_from_raw(b'{"Key": "Pamd64 a 1 \\u0041"}')
+        self.assertEqual(pkg.key, "Pamd64 a 1 A")
+        self.assertEqual(pkg.short_key, "Pamd64 a 1")
+        pkg = PackageAPISection.package_from_raw(b'{"Description": "a \\"Key", "Key": "Pamd64 a 1 b"}')
+        self.assertEqual(pkg.key, "Pamd64 a 1 b")
+        with self.assertRaises(AptlyAPIException):
+            PackageAPISection.package_from_raw(b'{"Description": "no key"}')
+
+    def test_project_packages(self) -> None:
+        packages = [PackageAPISection.package_from_response("Pamd64 a 1 1cc5"),
+                    PackageAPISection.package_from_response({"Key": "Pamd64 b 1 2cc5", "Version": "1"})]
+        self.assertEqual(project_packages(packages, None), packages)
+        self.assertEqual([pkg.fields for pkg in project_packages(packages, ["Version"])], [None, {"Version": "1"}])
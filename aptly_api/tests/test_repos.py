@@ -3,14 +3,17 @@
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
-from typing import Any
+import os
+import tempfile
+from typing import Any, cast
 from unittest.case import TestCase
 
 import requests_mock
 
 from aptly_api.base import AptlyAPIException
-from aptly_api.parts.packages import Package
+from aptly_api.parts.packages import Package, LazyFields
 from aptly_api.parts.repos import ReposAPISection, Repo, FileReport
+from aptly_api.tests.test_debfile import make_deb, CONTROL, DSC
 
 
 @requests_mock.Mocker(kw='rmock')
@@ -226,3 +229,62 @@ class ReposAPISectionTests(TestCase):
     def test_search_invalid_params(self, *, rmock: requests_mock.Mocker) -> None:
         with self.assertRaises(AptlyAPIException):
             self.rapi.search_packages("aptly-repo", with_deps=True)
+
+    def test_search_fields(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/repos/aptly-repo/packages?format=details",
+                  text='[{"Key": "Pamd64 authserver 0.1.14~dev0-1 1cc572a93625a9c9", "Version": "0.1.14~dev0-1", '
+                       '"Depends": "python3", "Description": " long"}]')
+        pkg = self.rapi.search_packages("aptly-repo", fields=["Depends", "Version", "Source"])[0]
+        self.assertEqual(pkg.key, "Pamd64 authserver 0.1.14~dev0-1 1cc572a93625a9c9")
+        self.assertEqual(pkg.fields, {"Depends": "python3", "Version": "0.1.14~dev0-1"})
+        self.assertEqual(rmock.request_history[0].qs, {"format": ["details"]})
+
+        pkg = self.rapi.search_packages("aptly-repo", lazy=True)[0]
+        self.assertIsInstance(pkg.fields, LazyFields)
+        self.assertEqual(pkg.key, "Pamd64 authserver 0.1.14~dev0-1 1cc572a93625a9c9")
+        self.assertEqual(cast(LazyFields, pkg.fields)["Description"], " long")
+        pkg = self.rapi.search_packages("aptly-repo", lazy=True, fields=["Version"])[0]
+        self.assertEqual(pkg.fields, {"Version": "0.1.14~dev0-1"})
+        pkg = next(self.rapi.iter_packages("aptly-repo", fields=["Version"]))
+        self.assertEqual(pkg.fields, {"Version": "0.1.14~dev0-1"})
+
+    def test_iter_packages(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/repos/aptly-repo/packages?q=authserver&format=details",
+                  text='[{"Key": "Pamd64 authserver 0.1.14~dev0-1 1cc572a93625a9c9", '
+                       '"ShortKey": "Pamd64 authserver 0.1.14~dev0-1", "FilesHash": "1cc572a93625a9c9"}]')
+        packages = self.rapi.iter_packages("aptly-repo", query="authserver", detailed=True)
+        self.assertNotIsInstance(packages, list)
+        self.assertSequenceEqual(
+            list(packages),
+            [
+                Package(
+                    key="Pamd64 authserver 0.1.14~dev0-1 1cc572a93625a9c9",
+                    short_key="Pamd64 authserver 0.1.14~dev0-1",
+                    files_hash="1cc572a93625a9c9",
+                    fields={"Key": "Pamd64 authserver 0.1.14~dev0-1 1cc572a93625a9c9",
+                            "ShortKey": "Pamd64 authserver 0.1.14~dev0-1", "FilesHash": "1cc572a93625a9c9"},
+                )
+            ],
+        )
+
+    def test_iter_packages_invalid_params(self, *, rmock: requests_mock.Mocker) -> None:
+        with self.assertRaises(AptlyAPIException):
+            list(self.rapi.iter_packages("aptly-repo", with_deps=True))
+
+    def test_files_present(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/repos/aptly-repo/packages",
+                  text='["Pamd64 authserver 1:0.1.14~dev0-1 1cc572a93625a9c9", "Pall other 1.0 7b2a49e6b7fd27d2"]')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            files = [os.path.join(tmpdir, name) for name in
+                     ("present.deb", "missing.deb", "source.dsc", "broken.deb", "nothing.changes", "README")]
+            make_deb(files[0])
+            make_deb(files[1], control=CONTROL.replace("authserver", "missing"))
+            for fn, content in ((files[2], DSC), (files[3], "broken"), (files[4], "Source: a\nVersion: 1\n"),
+                                (files[5], "text")):
+                with open(fn, "wt") as f:
+                    f.write(content)
+            self.assertEqual(
+                self.rapi.files_present("aptly-repo", files),
+                dict(zip(files, [True, False, False, False, False, False])),
+            )
+        self.assertEqual(rmock.call_count, 1)
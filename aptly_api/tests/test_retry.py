@@ -0,0 +1,158 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import io
+import os
+from email.utils import format_datetime
+from datetime import datetime, timezone, timedelta
+from typing import Any
+from unittest import mock
+from unittest.case import TestCase
+
+import requests
+import requests_mock
+
+from aptly_api import Client
+from aptly_api.base import AptlyAPIException, BaseAPIClient
+from aptly_api.retry import RetryPolicy
+
+
+class RetryPolicyTests(TestCase):
+    def test_defaults(self) -> None:
+        policy = RetryPolicy()
+        self.assertTrue(policy.allows("get", 1))
+        self.assertTrue(policy.allows("PUT", 2))
+        self.assertFalse(policy.allows("GET", 3))
+        self.assertFalse(policy.allows("POST", 1))
+        self.assertTrue(policy.retries_status(503))
+        self.assertFalse(policy.retries_status(500))
+
+    def test_post_opt_in(self) -> None:
+        self.assertTrue(RetryPolicy(methods={"GET", "POST"}).allows("POST", 1))
+
+    def test_invalid(self) -> None:
+        with self.assertRaises(ValueError):
+            RetryPolicy(max_attempts=0)
+
+    def test_exceptions(self) -> None:
+        policy = RetryPolicy()
+        self.assertTrue(policy.retries_exception(requests.ConnectionError(), (requests.ConnectionError,)))
+        self.assertFalse(policy.retries_exception(ValueError(), (requests.ConnectionError,)))
+        policy = RetryPolicy(exceptions=(ValueError,))
+        self.assertTrue(policy.retries_exception(ValueError(), (requests.ConnectionError,)))
+
+    def test_backoff(self) -> None:
+        policy = RetryPolicy(backoff_factor=1.0, max_backoff=5.0)
+        with mock.patch("random.uniform", side_effect=lambda a, b: b):
+            self.assertEqual([policy.delay(attempt) for attempt in range(1, 6)], [1.0, 2.0, 4.0, 5.0, 5.0])
+        for _ in range(50):
+            self.assertTrue(0 <= policy.delay(2) <= 2.0)
+
+    def test_retry_after(self) -> None:
+        policy = RetryPolicy(max_retry_after=30.0)
+        self.assertEqual(policy.delay(1, "3"), 3.0)
+        self.assertEqual(policy.delay(1, "300"), 30.0)
+        in_ten = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=10), usegmt=True)
+        self.assertTrue(8.0 < policy.delay(1, in_ten) <= 10.0)
+        self.assertEqual(policy.parse_retry_after("Wed, 21 Oct 2015 07:28:00"), 0.0)
+        self.assertIsNone(policy.parse_retry_after("soon"))
+        self.assertTrue(policy.delay(1, "soon") <= 0.2)
+        self.assertTrue(RetryPolicy(respect_retry_after=False).delay(1, "100") <= 0.2)
+
+
+@requests_mock.Mocker(kw='rmock')
+@mock.patch("time.sleep")
+class RetryingClientTests(TestCase):
+    def __init__(self, *args: Any) -> None:
+        super().__init__(*args)
+        self.client = Client("http://test/", retry=RetryPolicy(max_attempts=3))
+
+    def test_retry_status(self, sleep: mock.Mock, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/version", [
+            {"status_code": 503, "text": "locked"},
+            {"status_code": 502, "text": "bad gateway", "headers": {"Retry-After": "2"}},
+            {"status_code": 200, "text": '{"Version": "1.0.0"}'},
+        ])
+        self.assertEqual(self.client.misc.version(), "1.0.0")
+        self.assertEqual(rmock.call_count, 3)
+        self.assertEqual(sleep.call_count, 2)
+        self.assertEqual(sleep.call_args[0][0], 2.0)
+
+    def test_retry_exhausted(self, sleep: mock.Mock, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/version", status_code=503, text="locked")
+        with self.assertRaises(AptlyAPIException) as ctx:
+            self.client.misc.version()
+        self.assertEqual(ctx.exception.status_code, 503)
+        self.assertEqual(rmock.call_count, 3)
+
+    def test_no_retry_on_other_status(self, sleep: mock.Mock, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/version", status_code=500, text="broken")
+        with self.assertRaises(AptlyAPIException):
+            self.client.misc.version()
+        self.assertEqual(rmock.call_count, 1)
+
+    def test_retry_exception(self, sleep: mock.Mock, *, rmock: requests_mock.Mocker) -> None:
+        rmock.delete("http://test/api/files/test", [
+            {"exc": requests.ConnectionError},
+            {"exc": requests.Timeout},
+            {"status_code": 200, "text": "{}"},
+        ])
+        self.client.files.delete("test")
+        self.assertEqual(rmock.call_count, 3)
+
+    def test_exception_exhausted(self, sleep: mock.Mock, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/version", exc=requests.ConnectionError)
+        with self.assertRaises(requests.ConnectionError):
+            self.client.misc.version()
+        self.assertEqual(rmock.call_count, 3)
+
+    def test_post_not_retried(self, sleep: mock.Mock, *, rmock: requests_mock.Mocker) -> None:
+        rmock.post("http://test/api/repos/aptly-repo/snapshots", status_code=503, text="locked")
+        with self.assertRaises(AptlyAPIException):
+            self.client.snapshots.create_from_repo("aptly-repo", "aptly-repo-1")
+        self.assertEqual(rmock.call_count, 1)
+        sleep.assert_not_called()
+
+    def test_post_opt_in(self, sleep: mock.Mock, *, rmock: requests_mock.Mocker) -> None:
+        client = Client("http://test/", retry=RetryPolicy(methods={"GET", "PUT", "DELETE", "POST"}))
+        rmock.post("http://test/api/files/test", [
+            {"status_code": 503, "text": "locked"},
+            {"status_code": 200, "text": '["test/testpkg.deb"]'},
+        ])
+        self.assertSequenceEqual(
+            client.files.upload("test", os.path.join(os.path.dirname(__file__), "testpkg.deb")),
+            ["test/testpkg.deb"],
+        )
+        # the file must have been re-sent in full
+        self.assertEqual(len(rmock.request_history[0].body), len(rmock.request_history[1].body))
+        self.assertGreater(len(rmock.request_history[1].body),
+                           os.path.getsize(os.path.join(os.path.dirname(__file__), "testpkg.deb")))
+
+    def test_rewind_files(self, sleep: mock.Mock, *, rmock: requests_mock.Mocker) -> None:
+        client = BaseAPIClient("http://test/", retry=RetryPolicy(methods={"POST"}))
+        rmock.post("http://test/api/test", [
+            {"status_code": 504, "text": "timeout"},
+            {"status_code": 200, "text": "{}"},
+        ])
+        client.do_post("api/test", files=[("a", io.BytesIO(b"payload a")), ("b", ("b.txt", io.BytesIO(b"payload b")))])
+        self.assertIn(b"payload a", rmock.request_history[1].body)
+        self.assertIn(b"payload b", rmock.request_history[1].body)
+
+    def test_rewind_data(self, sleep: mock.Mock, *, rmock: requests_mock.Mocker) -> None:
+        client = BaseAPIClient("http://test/", retry=RetryPolicy(methods={"PUT"}))
+        rmock.put("http://test/api/test", [
+            {"status_code": 504, "text": "timeout"},
+            {"status_code": 200, "text": "{}"},
+        ])
+        body = io.BytesIO(b"payload")
+        client.do_put("api/test", data=body)
+        self.assertEqual(rmock.call_count, 2)
+        self.assertEqual(body.tell(), 0)
+
+    def test_no_policy(self, sleep: mock.Mock, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/version", exc=requests.ConnectionError)
+        with self.assertRaises(requests.ConnectionError):
+            Client("http://test/").misc.version()
+        self.assertEqual(rmock.call_count, 1)
@@ -1,15 +1,21 @@
 # This Source Code Form is subject to the terms of the Mozilla Public
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
-from typing import Any
+import json
+import operator
+from typing import Any, cast
+from unittest import mock
 from unittest.case import TestCase
 
 import iso8601
 import requests_mock
 
 from aptly_api.base import AptlyAPIException
+from aptly_api.cache import SnapshotPackageCache
+from aptly_api.diff import DiffSummary
 from aptly_api.parts.packages import Package
 from aptly_api.parts.snapshots import SnapshotAPISection, Snapshot
+from aptly_api.timeutil import parse_timestamp
 
 
 @requests_mock.Mocker(kw='rmock')
@@ -189,6 +195,75 @@ class SnapshotAPISectionTests(TestCase):
             ]
         )
 
+    def test_local_diff(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/snapshots/aptly-repo-1/packages",
+                  text='["Pamd64 radicale 1.1.1 fbc974fa526f14e9", "Pamd64 authserver 0.1.13-1 1cc572a93625a9c8"]')
+        rmock.get("http://test/api/snapshots/aptly-repo-2/packages",
+                  text='["Pamd64 authserver 0.1.14~dev0-1 1cc572a93625a9c9"]')
+        self.assertSequenceEqual(
+            self.sapi.local_diff("aptly-repo-1", "aptly-repo-2"),
+            [
+                {'Left': 'Pamd64 authserver 0.1.13-1 1cc572a93625a9c8',
+                 'Right': 'Pamd64 authserver 0.1.14~dev0-1 1cc572a93625a9c9'},
+                {'Left': 'Pamd64 radicale 1.1.1 fbc974fa526f14e9', 'Right': None}
+            ]
+        )
+        self.assertEqual(self.sapi.diff_summary("aptly-repo-2", "aptly-repo-1"), DiffSummary(0, 1, 1))
+        self.assertEqual(self.sapi.diff_matrix(["aptly-repo-1", "aptly-repo-2"]), [
+            [DiffSummary(0, 0, 0), DiffSummary(1, 0, 1)],
+            [DiffSummary(0, 1, 1), DiffSummary(0, 0, 0)],
+        ])
+
+    def test_merge(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/snapshots/stable/packages",
+                  text='["Pamd64 nginx 1.10 a1", "Pamd64 curl 7.50 b1"]')
+        rmock.get("http://test/api/snapshots/backports/packages", text='["Pamd64 nginx 1.12~bpo1 a3"]')
+        rmock.post("http://test/api/snapshots",
+                   text='{"Name":"merged","CreatedAt":"2017-06-07T14:19:07.706408213Z","Description":"test"}')
+        self.assertEqual(self.sapi.merge("merged", ["stable", "backports"]).name, "merged")
+        self.assertEqual(rmock.request_history[-1].json(), {
+            "Name": "merged", "Description": "Merged from sources: 'stable', 'backports'",
+            "SourceSnapshots": ["stable", "backports"],
+            "PackageRefs": ["Pamd64 nginx 1.12~bpo1 a3", "Pamd64 curl 7.50 b1"],
+        })
+        self.sapi.merge("merged", ["backports", "stable"], description="test", latest=True)
+        self.assertEqual(rmock.request_history[-1].json()["PackageRefs"],
+                         ["Pamd64 nginx 1.12~bpo1 a3", "Pamd64 curl 7.50 b1"])
+        self.assertEqual(rmock.request_history[-1].json()["Description"], "test")
+        with self.assertRaises(AptlyAPIException):
+            self.sapi.merge("merged", [])
+
+    def test_pull_filter(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/snapshots/stable/packages",
+                  text='["Pamd64 nginx 1.10 a1", "Pamd64 curl 7.50 b1"]')
+        rmock.get("http://test/api/snapshots/backports/packages?q=nginx",
+                  text='["Pamd64 nginx 1.12~bpo1 a3", "Pamd64 nginx 1.11~bpo1 a2", "Pamd64 libssl 3.0 d1"]')
+        rmock.get("http://test/api/snapshots/backports/packages?q=zsh", text='["Pamd64 zsh 5.0 c1"]')
+        rmock.post("http://test/api/snapshots",
+                   text='{"Name":"pulled","CreatedAt":"2017-06-07T14:19:07.706408213Z","Description":"test"}')
+        self.sapi.pull("stable", "backports", "pulled", ["nginx", "zsh"])
+        self.assertEqual(rmock.request_history[-1].json(), {
+            "Name": "pulled",
+            "Description": "Pulled into 'stable' with 'backports' as source, pull request was: 'nginx zsh'",
+            "SourceSnapshots": ["stable", "backports"],
+            "PackageRefs": ["Pamd64 curl 7.50 b1", "Pamd64 nginx 1.12~bpo1 a3", "Pamd64 libssl 3.0 d1",
+                            "Pamd64 zsh 5.0 c1"],
+        })
+        self.assertEqual([req.qs for req in rmock.request_history[-4:-1]],
+                         [{"q": ["nginx"], "withdeps": ["1"]}, {"q": ["zsh"], "withdeps": ["1"]}, {}])
+        with self.assertRaises(AptlyAPIException):
+            self.sapi.pull("stable", "backports", "pulled", [])
+
+        self.sapi.filter("backports", "filtered", ["nginx", "zsh"], with_deps=True)
+        self.assertEqual(rmock.request_history[-1].json(), {
+            "Name": "filtered", "Description": "Filtered 'backports', query was: 'nginx zsh'",
+            "SourceSnapshots": ["backports"],
+            "PackageRefs": ["Pamd64 nginx 1.12~bpo1 a3", "Pamd64 nginx 1.11~bpo1 a2", "Pamd64 libssl 3.0 d1",
+                            "Pamd64 zsh 5.0 c1"],
+        })
+        with self.assertRaises(AptlyAPIException):
+            self.sapi.filter("backports", "filtered", [])
+
     def test_create_from_packages(self, *, rmock: requests_mock.Mocker) -> None:
         rmock.post("http://test/api/snapshots",
                    text='{"Name":"aptly-repo-2","CreatedAt":"2017-06-07T14:19:07.706408213Z","Description":"test"}')
@@ -221,3 +296,108 @@ class SnapshotAPISectionTests(TestCase):
             )
         )
         self.assertEqual(rmock.request_history[0].json(), expected)
+
+    def test_iter_packages(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/snapshots/aptly-repo-1/packages?q=postgresql&withDeps=1",
+                  text='["Pall postgresql-9.6-postgis-scripts 2.3.2+dfsg-1~exp2.pgdg90+1 5f70af798690300d",'
+                       '"Pall postgresql-common 181.pgdg90+1 78d3400c0ed2e470"]')
+        self.assertEqual(
+            [pkg.key for pkg in self.sapi.iter_packages("aptly-repo-1", query="postgresql", with_deps=True)],
+            ["Pall postgresql-9.6-postgis-scripts 2.3.2+dfsg-1~exp2.pgdg90+1 5f70af798690300d",
+             "Pall postgresql-common 181.pgdg90+1 78d3400c0ed2e470"],
+        )
+
+    def test_iter_packages_error(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/snapshots/aptly-repo-1/packages", status_code=404,
+                  text='{"error": "snapshot with name aptly-repo-1 not found"}')
+        with self.assertRaises(AptlyAPIException):
+            list(self.sapi.iter_packages("aptly-repo-1"))
+
+    def test_lazy_created_at(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/snapshots",
+                  text='[{"Name":"a","CreatedAt":"2017-06-03T21:36:22.2692213Z"},{"Name":"b","Description":"d"}]')
+        with mock.patch("aptly_api.parts.snapshots.parse_timestamp", wraps=parse_timestamp) as parse:
+            a, b = self.sapi.list()
+            self.assertEqual(parse.call_count, 0)
+            self.assertEqual(a.created_at_raw, "2017-06-03T21:36:22.2692213Z")
+            self.assertEqual(a.created_at, iso8601.parse_date("2017-06-03T21:36:22.2692213Z"))
+            self.assertIs(a.created_at, a.created_at)
+            self.assertIsNone(b.created_at)
+            self.assertEqual(parse.call_count, 1)
+
+    def test_snapshot_tuple(self, *, rmock: requests_mock.Mocker) -> None:
+        created_at = iso8601.parse_date("2017-06-03T21:36:22.2692213Z")
+        snapshot = Snapshot(name="a", description=None, created_at_raw="2017-06-03T21:36:22.2692213Z")
+        name, description, created = snapshot
+        self.assertEqual((name, description, created), ("a", None, created_at))
+        self.assertEqual((snapshot[0], snapshot[-1], snapshot[:2], len(snapshot)), ("a", created_at, ("a", None), 3))
+        self.assertEqual(snapshot, Snapshot("a", None, created_at))
+        self.assertEqual(snapshot, ("a", None, created_at))
+        self.assertNotEqual(snapshot, Snapshot("b", None, created_at))
+        self.assertNotEqual(snapshot, "a")
+        self.assertEqual(hash(snapshot), hash(("a", None, created_at)))
+        self.assertEqual(snapshot._asdict(), {"name": "a", "description": None, "created_at": created_at})
+        self.assertEqual(snapshot._replace(description="d"), ("a", "d", created_at))
+        self.assertEqual(repr(Snapshot("a", "d", None)), "Snapshot(name='a', description='d', created_at=None)")
+
+    def test_snapshot_ordering(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/snapshots",
+                  text='[{"Name":"b","CreatedAt":"2017-06-03T21:36:22Z"},'
+                       '{"Name":"a","CreatedAt":"2017-06-04T00:00:00Z"},'
+                       '{"Name":"a","CreatedAt":"2017-06-03T00:00:00Z"}]')
+        snapshots = self.sapi.list()
+        self.assertEqual([s.created_at_raw for s in sorted(snapshots)],
+                         ["2017-06-03T00:00:00Z", "2017-06-04T00:00:00Z", "2017-06-03T21:36:22Z"])
+        a, b = Snapshot("a", None), Snapshot("b", None)
+        self.assertTrue(a < b and a <= b and b > a and b >= a and a <= a and a >= a)
+        self.assertFalse(a > b or a >= b or b < a or b <= a or a < a or a > a)
+        self.assertTrue(a < ("b",) and ("b",) > a and a <= ("a", None, None) and a >= ("a",))
+        for op in (operator.lt, operator.le, operator.gt, operator.ge):
+            with self.assertRaises(TypeError):
+                op(a, "a")
+        self.assertEqual(json.dumps(tuple(b)), '["b", null, null]')
+        self.assertNotIsInstance(a, tuple)
+
+    def test_list_packages_cached(self, *, rmock: requests_mock.Mocker) -> None:
+        sapi = SnapshotAPISection("http://test/", package_cache=SnapshotPackageCache())
+        rmock.get("http://test/api/snapshots/aptly-repo-1", [
+            {"text": '{"Name":"aptly-repo-1","CreatedAt":"2017-06-03T23:43:40.275605639Z"}'},
+            {"text": '{"Name":"aptly-repo-1","CreatedAt":"2017-06-03T23:43:40.275605639Z"}'},
+            {"text": '{"Name":"aptly-repo-1","CreatedAt":"2017-06-04T10:00:00Z"}'},
+        ])
+        rmock.get("http://test/api/snapshots/aptly-repo-1/packages",
+                  text='["Pall postgresql-common 181.pgdg90+1 78d3400c0ed2e470"]')
+        for _ in range(3):
+            self.assertEqual([pkg.key for pkg in sapi.list_packages("aptly-repo-1")],
+                             ["Pall postgresql-common 181.pgdg90+1 78d3400c0ed2e470"])
+        # the cache is keyed by the raw timestamp
+        self.assertIsNotNone(cast(SnapshotPackageCache, sapi.package_cache).get("aptly-repo-1", "2017-06-04T10:00:00Z"))
+        # the second listing was served from the cache, the third one was refetched as the snapshot was recreated
+        self.assertEqual([r.path for r in rmock.request_history], [
+            "/api/snapshots/aptly-repo-1", "/api/snapshots/aptly-repo-1/packages",
+            "/api/snapshots/aptly-repo-1",
+            "/api/snapshots/aptly-repo-1", "/api/snapshots/aptly-repo-1/packages",
+        ])
+
+    def test_list_packages_cached_fields(self, *, rmock: requests_mock.Mocker) -> None:
+        sapi = SnapshotAPISection("http://test/", package_cache=SnapshotPackageCache())
+        rmock.get("http://test/api/snapshots/aptly-repo-1",
+                  text='{"Name":"aptly-repo-1","CreatedAt":"2017-06-03T23:43:40.275605639Z"}')
+        rmock.get("http://test/api/snapshots/aptly-repo-1/packages",
+                  text='[{"Key": "Pall postgresql-common 181.pgdg90+1 78d3400c0ed2e470", "Version": "181.pgdg90+1", '
+                       '"Description": " long"}]')
+        self.assertEqual(sapi.list_packages("aptly-repo-1", fields=["Version"], lazy=True)[0].fields,
+                         {"Version": "181.pgdg90+1"})
+        # the cache holds the complete listing, so another projection is served from it, too
+        self.assertEqual(sapi.list_packages("aptly-repo-1", fields=["Description"])[0].fields,
+                         {"Description": " long"})
+        self.assertEqual(len(sapi.list_packages("aptly-repo-1", detailed=True)[0].fields or {}), 3)
+        self.assertEqual(rmock.call_count, 4)
+
+    def test_list_packages_cache_no_timestamp(self, *, rmock: requests_mock.Mocker) -> None:
+        sapi = SnapshotAPISection("http://test/", package_cache=SnapshotPackageCache())
+        rmock.get("http://test/api/snapshots/aptly-repo-1", text='{"Name":"aptly-repo-1"}')
+        rmock.get("http://test/api/snapshots/aptly-repo-1/packages", text='[]')
+        sapi.list_packages("aptly-repo-1")
+        sapi.list_packages("aptly-repo-1")
+        self.assertEqual(rmock.call_count, 4)
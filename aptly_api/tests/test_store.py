@@ -0,0 +1,158 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from unittest import mock
+from unittest.case import TestCase
+
+import requests_mock
+
+from aptly_api import Client
+from aptly_api.store import PackageStore
+
+_key1 = "Pamd64 authserver 0.1.14~dev0-1 1cc572a93625a9c9"
+_key2 = "Pall python-pip 9.0.1-2 7b2a49e6b7fd27d2"
+_fields1 = {"Key": _key1, "ShortKey": "Pamd64 authserver 0.1.14~dev0-1", "FilesHash": "1cc572a93625a9c9",
+            "Package": "authserver"}
+_fields2 = {"Key": _key2, "ShortKey": "Pall python-pip 9.0.1-2", "FilesHash": "7b2a49e6b7fd27d2",
+            "Package": "python-pip"}
+
+
+class PackageStoreTests(TestCase):
+    def test_get_put(self) -> None:
+        store = PackageStore()
+        self.assertIsNone(store.get(_key1))
+        store.put(_key1, _fields1)
+        self.assertEqual(store.get(_key1), _fields1)
+        self.assertIn(_key1, store)
+        self.assertNotIn(_key2, store)
+        self.assertEqual(len(store), 1)
+        store.clear()
+        self.assertEqual(len(store), 0)
+        store.close()
+
+    def test_get_many(self) -> None:
+        store = PackageStore()
+        store.put_many(("key %s" % ix, {"Key": "key %s" % ix}) for ix in range(1200))
+        found = store.get_many(["key 5", "key 1100", "key 5", "missing"])
+        self.assertEqual(sorted(found.keys()), ["key 1100", "key 5"])
+        self.assertEqual(len(store.get_many("key %s" % ix for ix in range(1200))), 1200)
+        self.assertEqual(store.get_many([]), {})
+
+    @mock.patch("time.time", return_value=1000.0)
+    def test_eviction(self, now: mock.Mock) -> None:
+        store = PackageStore(max_entries=2, touch_interval=60)
+        store.put("a", {"Key": "a"})
+        store.put("b", {"Key": "b"})
+        now.return_value += 61
+        # touching "a" makes "b" the least recently used entry
+        store.get("a")
+        store.put("c", {"Key": "c"})
+        self.assertEqual(sorted(store.get_many(["a", "b", "c"]).keys()), ["a", "c"])
+        self.assertEqual(len(store), 2)
+
+    @mock.patch("time.time", return_value=1000.0)
+    def test_touch_interval(self, now: mock.Mock) -> None:
+        store = PackageStore(touch_interval=60)
+        store.put("a", {"Key": "a"})
+        with mock.patch.object(store, "_db", wraps=store._db) as db:
+            now.return_value += 30
+            self.assertEqual(store.get_many(["a", "b"]), {"a": {"Key": "a"}})
+            # a recently used entry isn't written back
+            self.assertEqual(len(db.execute.call_args_list), 1)
+            now.return_value += 31
+            store.get("a")
+            self.assertIn("UPDATE", db.execute.call_args_list[-1].args[0])
+        self.assertEqual(store._db.execute("SELECT last_used FROM packages").fetchone()[0], 1061.0)
+
+    def test_eviction_check_interval(self) -> None:
+        store = PackageStore(max_entries=1000)
+        with mock.patch.object(store, "_evict") as evict:
+            for ix in range(25):
+                store.put("key %s" % ix, {"Key": "key %s" % ix})
+            # the size is checked once per 10 stored packages, not on every put
+            self.assertEqual(evict.call_count, 2)
+            store.put_many(("key %s" % ix, {"Key": "key %s" % ix}) for ix in range(100, 110))
+            self.assertEqual(evict.call_count, 3)
+
+    def test_shared_file(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "packages.sqlite")
+            first, second = PackageStore(path, timeout=0.05), PackageStore(path, timeout=0.05)
+            self.assertEqual(first._db.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            first.put(_key1, _fields1)
+            second.put(_key2, _fields2)
+            self.assertEqual(first.get_many([_key1, _key2]), {_key1: _fields1, _key2: _fields2})
+            self.assertEqual(second.get(_key1), _fields1)
+
+            # another process holding a write lock for too long makes reads miss and skips writes
+            locker = sqlite3.connect(path, isolation_level=None)
+            locker.execute("BEGIN EXCLUSIVE")
+            second.put("Pall other 1.0 abc", {"Key": "Pall other 1.0 abc"})
+            with mock.patch("time.time", return_value=time.time() + 7200):
+                # the read still succeeds, only writing back the time it was used is skipped
+                self.assertEqual(first.get_many([_key1]), {_key1: _fields1})
+            locker.execute("ROLLBACK")
+            locker.close()
+            self.assertEqual(first.get_many([_key1, "Pall other 1.0 abc"]), {_key1: _fields1})
+            with mock.patch.object(first, "_db") as db:
+                db.execute.side_effect = sqlite3.OperationalError("database is locked")
+                self.assertEqual(first.get_many([_key1]), {})
+            first.close()
+            second.close()
+
+    def test_persistent(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "packages.sqlite")
+            store = PackageStore(path)
+            store.put(_key1, _fields1)
+            store.close()
+            store = PackageStore(path)
+            self.assertEqual(store.get(_key1), _fields1)
+            store.close()
+
+
+@requests_mock.Mocker(kw='rmock')
+class PackageStoreClientTests(TestCase):
+    def setUp(self) -> None:
+        self.store = PackageStore()
+        self.client = Client("http://test/", package_store=self.store)
+
+    def test_show(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/packages/Pamd64%20authserver%200.1.14~dev0-1%201cc572a93625a9c9",
+                  text=json.dumps(_fields1))
+        self.assertEqual(self.client.packages.show(_key1).fields, _fields1)
+        self.assertEqual(self.client.packages.show(_key1).short_key, "Pamd64 authserver 0.1.14~dev0-1")
+        self.assertEqual(rmock.call_count, 1)
+
+    def test_detailed_listing(self, *, rmock: requests_mock.Mocker) -> None:
+        rmock.get("http://test/api/repos/aptly-repo/packages?format=details", complete_qs=True,
+                  text=json.dumps([_fields1, _fields2]))
+        rmock.get("http://test/api/repos/aptly-repo/packages", complete_qs=True,
+                  text=json.dumps([_key2, _key1]))
+        # the first listing only has a partial hit, so the details are fetched and stored
+        self.store.put(_key1, _fields1)
+        self.assertEqual([pkg.key for pkg in self.client.repos.search_packages("aptly-repo", detailed=True)],
+                         [_key1, _key2])
+        self.assertEqual(rmock.call_count, 2)
+        # the second listing only needs the keys
+        pkgs = self.client.repos.search_packages("aptly-repo", detailed=True)
+        self.assertEqual([pkg.fields for pkg in pkgs], [_fields2, _fields1])
+        self.assertEqual(rmock.call_count, 3)
+        # listings without details don't touch the store
+        self.assertEqual([pkg.fields for pkg in self.client.repos.search_packages("aptly-repo")], [None, None])
+        self.assertEqual(rmock.call_count, 4)
+
+    def test_snapshot_and_mirror_listing(self, *, rmock: requests_mock.Mocker) -> None:
+        self.store.put_many([(_key1, _fields1)])
+        rmock.get("http://test/api/snapshots/snap/packages", text=json.dumps([_key1]))
+        rmock.get("http://test/api/mirrors/mirror/packages", text=json.dumps([_key1]))
+        self.assertEqual(self.client.snapshots.list_packages("snap", detailed=True)[0].fields, _fields1)
+        self.assertEqual(self.client.mirrors.list_packages("mirror", detailed=True)[0].fields, _fields1)
+        self.assertEqual([r.qs for r in rmock.request_history], [{}, {}])
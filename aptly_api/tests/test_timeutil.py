@@ -0,0 +1,36 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import subprocess
+import sys
+from unittest.case import TestCase
+
+import iso8601
+
+from aptly_api.timeutil import parse_timestamp
+
+
+class TimestampTests(TestCase):
+    def test_aptly_format(self) -> None:
+        for value in ("2017-06-03T21:36:22.2692213Z", "2017-06-03T23:43:40.275605639+02:00", "2017-06-04T10:00:00Z",
+                      "2022-11-29T21:43:45.5-05:30", "1999-12-31T23:59:59.123456+00:00", "2020-02-29T00:00:00.0001Z",
+                      "2017-06-03T21:36:22.1234569-00:30"):
+            expected = iso8601.parse_date(value)
+            parsed = parse_timestamp(value)
+            self.assertEqual(parsed, expected, value)
+            self.assertEqual((parsed.microsecond, parsed.tzname()), (expected.microsecond, expected.tzname()), value)
+        self.assertIs(parse_timestamp("2017-06-03T23:43:40+02:00").tzinfo,
+                      parse_timestamp("2018-01-01T00:00:00+02:00").tzinfo)
+
+    def test_other_formats(self) -> None:
+        for value in ("2017-06-03", "20170603T2136Z", "2017-06-03 21:36:22,5", "2017-06-03T21:36:22+0200"):
+            self.assertEqual(parse_timestamp(value), iso8601.parse_date(value), value)
+        for invalid in ("2017-02-30T00:00:00Z", "yesterday", ""):
+            with self.assertRaises(ValueError, msg=invalid):
+                parse_timestamp(invalid)
+
+    def test_lazy_import(self) -> None:
+        code = "import sys, aptly_api; aptly_api.Client('http://test/'); sys.exit('iso8601' in sys.modules)"
+        self.assertEqual(subprocess.run([sys.executable, "-c", code]).returncode, 0)
@@ -0,0 +1,143 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import os
+import tempfile
+from typing import List  # noqa: F401
+from unittest import mock
+from unittest.case import TestCase
+
+import requests_mock
+
+from aptly_api import Client
+from aptly_api.multipart import MultipartEncoder
+from aptly_api.transfer import TransferMeter, UploadProgress, FileTiming, RateLimiter
+
+
+class TransferMeterTests(TestCase):
+    def setUp(self) -> None:
+        self.now = 0.0
+        self.received = []  # type: List[UploadProgress]
+        self.meter = TransferMeter(callback=self.received.append, clock=lambda: self.now)
+
+    def test_progress(self) -> None:
+        self.meter.expect("a.deb", 100)
+        self.meter.expect("b.deb", 300)
+        self.meter.expect("a.deb", 999)
+        self.assertEqual(self.meter.throughput, 0.0)
+        self.meter.update("a.deb", 50)
+        self.now = 1.0
+        self.meter.update("a.deb", 50)
+        self.now = 2.0
+        self.meter.update("b.deb", 300)
+        self.assertEqual(self.received, [
+            UploadProgress("a.deb", 50, 100, 50, 400, 0.0),
+            UploadProgress("a.deb", 100, 100, 100, 400, 100.0),
+            UploadProgress("b.deb", 300, 300, 400, 400, 200.0),
+        ])
+        self.assertEqual(self.meter.throughput, 200.0)
+        self.assertEqual(self.meter.summary(), [
+            FileTiming("a.deb", 100, 100, 1.0, 100.0),
+            FileTiming("b.deb", 300, 300, 0.0, None),
+        ])
+        self.meter.reset()
+        self.assertEqual(self.meter.summary(), [])
+
+    def test_unfinished_and_unexpected(self) -> None:
+        self.meter.expect("a.deb", 100)
+        self.meter.update("unexpected.deb", 10)
+        self.assertEqual(self.meter.summary(), [
+            FileTiming("a.deb", 100, 0, None, None),
+            FileTiming("unexpected.deb", 10, 10, 0.0, None),
+        ])
+
+    def test_rewind(self) -> None:
+        self.meter.expect("a.deb", 100)
+        self.meter.rewind("a.deb")
+        self.meter.update("a.deb", 60)
+        self.meter.rewind("a.deb")
+        self.meter.rewind("unknown.deb")
+        self.assertEqual(self.meter.summary(), [FileTiming("a.deb", 100, 0, None, None)])
+
+    def test_running_totals(self) -> None:
+        for ix in range(1000):
+            self.meter.expect("%s.deb" % ix, 10)
+        # updates don't walk the expected files
+        with mock.patch.object(self.meter._files, "values", side_effect=AssertionError):
+            self.meter.update("0.deb", 10)
+            self.meter.update("1.deb", 4)
+            self.meter.rewind("1.deb")
+            self.meter.update("1.deb", 6)
+            self.meter.update("extra.deb", 5)
+        self.assertEqual([(p.total_bytes_sent, p.total_bytes) for p in self.received],
+                         [(10, 10000), (14, 10000), (16, 10000), (21, 10005)])
+        self.meter.reset()
+        self.meter.expect("a.deb", 100)
+        self.meter.update("a.deb", 50)
+        self.assertEqual(self.received[-1], UploadProgress("a.deb", 50, 100, 50, 100, 0.0))
+
+    def test_encoder(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            files = []
+            for name, size in (("a.deb", 1000), ("empty.deb", 0)):
+                files.append(os.path.join(tmpdir, name))
+                with open(files[-1], "wb") as f:
+                    f.write(b"x" * size)
+            encoder = MultipartEncoder([(f, f) for f in files], chunk_size=300, meter=self.meter)
+            encoder.read(500)
+            # a retry starts over
+            encoder.seek(0)
+            self.assertEqual(self.meter.summary()[0].bytes_sent, 0)
+            list(encoder)
+        self.assertEqual([(t.filename, t.bytes_sent) for t in self.meter.summary()], [(files[0], 1000), (files[1], 0)])
+        self.assertEqual(self.received[-1].total_bytes_sent, 1000)
+        self.assertTrue(all(p.total_bytes == 1000 for p in self.received))
+
+
+class RateLimiterTests(TestCase):
+    def setUp(self) -> None:
+        self.now = 0.0
+        self.limiter = RateLimiter(100.0, clock=lambda: self.now)
+
+    def test_reserve(self) -> None:
+        # the first second's worth is available right away
+        self.assertEqual(self.limiter.reserve(100), 0.0)
+        self.assertEqual(self.limiter.reserve(50), 0.5)
+        self.assertEqual(self.limiter.reserve(50), 1.0)
+        self.now = 1.0
+        self.assertEqual(self.limiter.reserve(0), 0.0)
+        # idle time doesn't accumulate more than the burst size
+        self.now = 100.0
+        self.assertEqual(self.limiter.reserve(200), 1.0)
+
+    def test_invalid(self) -> None:
+        with self.assertRaises(ValueError):
+            RateLimiter(0)
+
+    @mock.patch("aptly_api.multipart.time.sleep")
+    def test_encoder(self, sleep: mock.Mock) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fn = os.path.join(tmpdir, "a.deb")
+            with open(fn, "wb") as f:
+                f.write(b"x" * 1000)
+            # with a clock that never advances, every chunk after the first adds to the debt
+            limiter = RateLimiter(100.0, burst=100.0, clock=lambda: 0.0)
+            encoder = MultipartEncoder([(fn, fn)], chunk_size=100, rate_limiter=limiter)
+            total = len(list(encoder))
+        self.assertEqual(sleep.call_args[0][0], (len(encoder) - 100) / 100.0)
+        self.assertEqual(total, sleep.call_count + 1)
+
+    @mock.patch("aptly_api.multipart.time.sleep")
+    def test_shared_by_client(self, sleep: mock.Mock) -> None:
+        client = Client("http://test/", upload_rate_limit=1000.0)
+        self.assertIs(client.files.rate_limiter, client.upload_rate_limiter)
+        self.assertIsNone(Client("http://test/").files.rate_limiter)
+        with tempfile.TemporaryDirectory() as tmpdir, requests_mock.Mocker() as rmock:
+            rmock.post("http://test/api/files/test", text=lambda request, context: str(len(request.body.read())))
+            fn = os.path.join(tmpdir, "a.deb")
+            with open(fn, "wb") as f:
+                f.write(b"x" * 5000)
+            client.files.upload("test", fn)
+        self.assertGreater(sum(call[0][0] for call in sleep.call_args_list), 4.0)
@@ -0,0 +1,49 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Dict  # noqa: F401
+
+# the RFC 3339 timestamps that aptly's JSON encoder emits, e.g. "2017-06-03T21:36:22.2692213Z"
+_timestamp = re.compile(
+    r"(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})(?:\.(\d+))?(?:(Z)|([-+])(\d{2}):(\d{2}))\Z"
+)
+_offsets = {}  # type: Dict[str, timezone]
+
+
+def _offset(sign: str, hours: str, minutes: str) -> timezone:
+    name = "%s%s:%s" % (sign, hours, minutes)
+    tz = _offsets.get(name)
+    if tz is None:
+        delta = timedelta(hours=int(hours), minutes=int(minutes))
+        # named like iso8601 names them
+        tz = _offsets[name] = timezone(-delta if sign == "-" else delta, name)
+    return tz
+
+
+def parse_timestamp(value: str) -> datetime:
+    """
+    Parses an ISO 8601 timestamp into the same ``datetime`` that ``iso8601.parse_date`` returns. The format that
+    aptly emits is parsed directly, anything else is handed to ``iso8601``, which is only imported then.
+
+    :raises iso8601.ParseError: (a ``ValueError``) if ``value`` isn't a valid timestamp
+    """
+    m = _timestamp.match(value)
+    if m is not None:
+        year, month, day, hour, minute, second, fraction, utc, sign, tzhours, tzminutes = m.groups()
+        try:
+            return datetime(
+                int(year), int(month), int(day), int(hour), int(minute), int(second),
+                # truncated to microseconds, like iso8601 does
+                int(fraction[:6].ljust(6, "0")) if fraction else 0,
+                timezone.utc if utc else _offset(sign, tzhours, tzminutes),
+            )
+        except ValueError:
+            # e.g. a day that's out of range, let iso8601 report it
+            pass
+
+    import iso8601
+    return iso8601.parse_date(value)
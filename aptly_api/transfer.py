@@ -0,0 +1,176 @@
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Callable, List, Dict  # noqa: F401
+
+UploadProgress = NamedTuple('UploadProgress', [
+    ('filename', str),
+    ('file_bytes_sent', int),
+    ('file_size', int),
+    ('total_bytes_sent', int),
+    ('total_bytes', int),
+    # bytes per second over all files since the first byte was sent
+    ('throughput', float),
+])
+
+FileTiming = NamedTuple('FileTiming', [
+    ('filename', str),
+    ('size', int),
+    ('bytes_sent', int),
+    # seconds from the first to the last byte, None if the file hasn't been sent completely
+    ('duration', Optional[float]),
+    ('throughput', Optional[float]),
+])
+
+
+class _FileState:
+    __slots__ = ("size", "sent", "started", "finished")
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.sent = 0
+        self.started = None  # type: Optional[float]
+        self.finished = None  # type: Optional[float]
+
+
+class TransferMeter:
+    """
+    Tracks the progress of uploads. Pass it to ``files.upload(..., meter=meter)``: ``callback`` is then invoked
+    with an ``UploadProgress`` every time a chunk of a file has been handed to the connection, from whichever
+    thread is sending it. ``summary()`` returns the per-file timings once the upload has finished.
+
+    A meter can be shared by parallel uploads and reused for several uploads in a row.
+    """
+    def __init__(self, callback: Optional[Callable[[UploadProgress], None]] = None,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.callback = callback
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._files = OrderedDict()  # type: Dict[str, _FileState]
+        # running totals over all files, so every update is O(1) no matter how many files are expected
+        self._total_sent = 0
+        self._total_bytes = 0
+        self._started = None  # type: Optional[float]
+        self._last = None  # type: Optional[float]
+
+    def expect(self, filename: str, size: int) -> None:
+        """
+        Announces that ``filename`` with ``size`` bytes is going to be sent, so the total is known up front.
+        """
+        with self._lock:
+            if filename not in self._files:
+                self._files[filename] = _FileState(size)
+                self._total_bytes += size
+
+    def rewind(self, filename: str) -> None:
+        """
+        Resets the progress of ``filename`` when it's sent again, e.g. when a request is retried.
+        """
+        with self._lock:
+            state = self._files.get(filename)
+            if state is not None and state.started is not None:
+                self._total_sent -= state.sent
+                state.sent = 0
+                state.started = None
+                state.finished = None
+
+    def update(self, filename: str, nbytes: int) -> None:
+        now = self.clock()
+        with self._lock:
+            state = self._files.get(filename)
+            if state is None:
+                state = self._files[filename] = _FileState(nbytes)
+                self._total_bytes += nbytes
+            if self._started is None:
+                self._started = now
+            self._last = now
+            if state.started is None:
+                state.started = now
+            state.sent += nbytes
+            self._total_sent += nbytes
+            if state.sent >= state.size:
+                state.finished = now
+            progress = self._progress(filename, state, now)
+        if self.callback is not None:
+            self.callback(progress)
+
+    def _progress(self, filename: str, state: _FileState, now: float) -> UploadProgress:
+        elapsed = now - self._started if self._started is not None else 0.0
+        return UploadProgress(
+            filename=filename,
+            file_bytes_sent=state.sent,
+            file_size=state.size,
+            total_bytes_sent=self._total_sent,
+            total_bytes=self._total_bytes,
+            throughput=self._total_sent / elapsed if elapsed > 0 else 0.0,
+        )
+
+    @property
+    def throughput(self) -> float:
+        """
+        :return: the overall throughput in bytes per second from the first to the last byte sent so far
+        """
+        with self._lock:
+            if self._started is None or self._last is None or self._last <= self._started:
+                return 0.0
+            return self._total_sent / (self._last - self._started)
+
+    def summary(self) -> List[FileTiming]:
+        ret = []
+        with self._lock:
+            for filename, state in self._files.items():
+                duration = None  # type: Optional[float]
+                if state.started is not None and state.finished is not None:
+                    duration = state.finished - state.started
+                ret.append(FileTiming(
+                    filename=filename,
+                    size=state.size,
+                    bytes_sent=state.sent,
+                    duration=duration,
+                    throughput=state.sent / duration if duration else None,
+                ))
+        return ret
+
+    def reset(self) -> None:
+        with self._lock:
+            self._files.clear()
+            self._total_sent = self._total_bytes = 0
+            self._started = self._last = None
+
+
+class RateLimiter:
+    """
+    A token bucket limiting the bandwidth of uploads to ``rate`` bytes per second on average, with bursts of up to
+    ``burst`` bytes (one second's worth by default). It's thread-safe, so one limiter can be shared by all
+    concurrent uploads of a client, which then share the bandwidth.
+
+    ``reserve()`` doesn't sleep itself, it returns how long the caller has to wait, so it can be used from
+    threads and coroutines alike.
+    """
+    def __init__(self, rate: float, burst: Optional[float] = None, clock: Callable[[], float] = time.monotonic) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._last = clock()
+
+    def reserve(self, nbytes: int) -> float:
+        """
+        Takes ``nbytes`` from the bucket, going into debt if there aren't enough tokens.
+
+        :return: the number of seconds to wait before sending ``nbytes``
+        """
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= nbytes
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
@@ -0,0 +1,60 @@
+#!/usr/bin/python
+# -* encoding: utf-8 *-
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+Compares sorting Debian versions with cached sort keys against sorting them with pairwise dpkg comparisons.
+
+    python benchmarks/bench_debversion.py [--count 100000] [--distinct 20000]
+"""
+import argparse
+import functools
+import random
+import time
+from typing import List, Callable, Any  # noqa: F401
+
+from aptly_api.debversion import compare_versions, version_key
+
+
+def make_versions(count: int, distinct: int, seed: int = 0) -> List[str]:
+    rnd = random.Random(seed)
+    pool = []  # type: List[str]
+    for _ in range(distinct):
+        version = ".".join(str(rnd.randint(0, 30)) for _ in range(rnd.randint(1, 4)))
+        if rnd.random() < 0.2:
+            version += rnd.choice(["~rc%s" % rnd.randint(1, 5), "+dfsg", "a", "~bpo9"])
+        if rnd.random() < 0.1:
+            version = "%s:%s" % (rnd.randint(1, 3), version)
+        if rnd.random() < 0.8:
+            version += "-%s" % rnd.choice([str(rnd.randint(0, 12)), "1ubuntu%s" % rnd.randint(1, 5), "1+b1"])
+        pool.append(version)
+    return [rnd.choice(pool) for _ in range(count)]
+
+
+def timed(label: str, func: Callable[[], Any]) -> float:
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print("%-40s %8.3fs" % (label, elapsed))
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=100000, help="number of versions to sort")
+    parser.add_argument("--distinct", type=int, default=20000, help="number of distinct versions among them")
+    args = parser.parse_args()
+
+    versions = make_versions(args.count, args.distinct)
+    naive = timed("pairwise compare_versions", lambda: sorted(versions, key=functools.cmp_to_key(compare_versions)))
+    version_key.cache_clear()
+    cold = timed("version_key, cold cache", lambda: sorted(versions, key=version_key))
+    warm = timed("version_key, warm cache", lambda: sorted(versions, key=version_key))
+    print("speedup: %.1fx cold, %.1fx warm" % (naive / cold, naive / warm))
+    assert sorted(versions, key=version_key) == sorted(versions, key=functools.cmp_to_key(compare_versions))
+
+
+if __name__ == "__main__":
+    main()
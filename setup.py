@@ -44,6 +44,14 @@ setup(
         '': _package_root,
     },
     install_requires=_requirements,
+    extras_require={
+        # AsyncClient (aptly_api.aio) is built on httpx
+        'async': ['httpx'],
+        # decodes large JSON responses about twice as fast as the standard library
+        'speedups': ['orjson'],
+        # reads zstd compressed .deb control members, which Python's tarfile only supports since 3.14
+        'zstd': ['zstandard; python_version < "3.14"'],
+    },
     classifiers=[
         "Development Status :: 4 - Beta",
         "Intended Audience :: Developers",